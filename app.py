@@ -1,5 +1,7 @@
 import streamlit as st
+import collections.abc
 import io
+import typing
 
 # --- Page Configuration (MUST be first) ---
 st.set_page_config(
@@ -9,15 +11,62 @@ st.set_page_config(
 )
 
 # Import after page config to avoid conflicts
-from backend import generate_all_content, translate_content
+from backend import (
+    generate_all_content, generate_image_variants, stream_all_content, translate_fields_multi,
+    MAX_IMAGE_VARIANTS, MODEL_WARM_UP, cancel_image_analysis, configure_credentials, get_scheduler_stats,
+    get_single_flight_stats, start_image_analysis, warm_up_models
+)
+from session_store import SessionArtifactStore, input_fingerprint
+from image_store import get_image_store
+from translation_prefetch import get_translation_prefetcher
+import instrumentation
+
+# Streamlit Cloud keeps the service account in secrets; locally the default credentials are used
+if hasattr(st.secrets, "gcp_service_account"):
+    configure_credentials(st.secrets["gcp_service_account"])
+
+def show_message(level: str, text: str):
+    """
+    Shows an error or warning from the backend on the page.
+    """
+    if level == "error":
+        st.error(text)
+    else:
+        st.warning(text)
+
+def download_data_can_be_callable() -> bool:
+    """
+    Returns True if st.download_button's data parameter accepts a callable, which newer Streamlit
+    versions call only when the button is clicked.
+    """
+    try:
+        data_type = typing.get_type_hints(st.download_button).get("data")
+    except Exception:
+        return False
+    return any(typing.get_origin(option) is collections.abc.Callable for option in typing.get_args(data_type))
+
+# Optionally build the models before the first request, without holding up the first render
+if MODEL_WARM_UP:
+    warm_up_models(background=True)
+
+# Initialize the per-session store; every rerun renders the current kit from it
+if 'kit_store' not in st.session_state:
+    st.session_state.kit_store = SessionArtifactStore(store_images=True)
+kit_store = st.session_state.kit_store
 
-# Initialize session state for storing regenerated content
-if 'regenerated_image' not in st.session_state:
-    st.session_state.regenerated_image = None
-if 'regenerated_description' not in st.session_state:
-    st.session_state.regenerated_description = None
-if 'regenerated_social_posts' not in st.session_state:
-    st.session_state.regenerated_social_posts = None
+# Images live in the process-wide image store; the session only keeps references to them
+image_store = get_image_store()
+# Newer Streamlit versions read download data from a callable only when the button is clicked
+DEFERRED_DOWNLOADS = download_data_can_be_callable()
+# Shown when a regeneration needs the uploaded photo after the image store has deleted it
+MISSING_UPLOAD_MESSAGE = "Sorry, your uploaded photo is no longer available. Please upload it again and generate a new kit."
+
+# Optional background translation of the current kit into likely languages (None unless enabled)
+prefetcher = get_translation_prefetcher()
+
+# Trace ids of the last user action (generation or regeneration plus the translations it caused)
+if 'debug_traces' not in st.session_state:
+    st.session_state.debug_traces = []
 
 # --- Header Section ---
 st.title("🎨 KalaConnect - The Artisan's Digital Storyteller")
@@ -53,12 +102,21 @@ selected_language = st.sidebar.selectbox(
     help="Select the language for generated content translation"
 )
 
+additional_languages = st.sidebar.multiselect(
+    "Also translate into:",
+    options=[language for language in ["English", "Hindi", "Bengali", "Tamil", "Kannada", "Urdu"] if language != selected_language],
+    help="Translate the same marketing kit into more languages at once"
+)
+
 # Display selected language info
 if selected_language != "English":
     st.sidebar.success(f"📝 Content will be translated to **{selected_language}**")
 else:
     st.sidebar.info("📝 Content will be generated in **English**")
 
+st.sidebar.markdown("---")
+show_debug_panel = st.sidebar.checkbox("🐞 Show debug panel", help="Step timings, tokens and cache hits of the last request")
+
 st.write("---")
 
 # --- Improved Single-Column UI ---
@@ -67,6 +125,18 @@ st.info("Upload a product image or provide a text description to generate your m
 
 # Single column layout with clearer hierarchy
 uploaded_file = st.file_uploader("📸 Upload a product image (recommended)", type=["jpg", "jpeg", "png"])
+
+# Start analysing a new upload right away, so the analysis is ready (or under way) by the time the
+# user clicks Generate; a replaced or removed upload cancels its analysis if it has not started yet
+upload_id = uploaded_file.file_id if uploaded_file is not None else None
+speculation = st.session_state.get("speculative_analysis")
+if speculation is not None and speculation[0] != upload_id:
+    cancel_image_analysis(speculation[1])
+    speculation = None
+if speculation is None and uploaded_file is not None:
+    speculation = (upload_id, start_image_analysis(uploaded_file.getvalue()))
+st.session_state.speculative_analysis = speculation
+
 product_input = st.text_area("📝 Or, add a text description (optional)", height=100, key="text_input")
 
 # Image style selector
@@ -76,6 +146,13 @@ image_style = st.radio(
     options=["Artistic Lifestyle", "Clean Studio Background"],
     horizontal=True
 )
+image_variants = st.slider(
+    "Image candidates per request:",
+    min_value=1,
+    max_value=MAX_IMAGE_VARIANTS,
+    value=1,
+    help="Get several images in one request and pick your favourite from the gallery"
+)
 
 # --- Main Form and Submission Logic ---
 with st.form("main_form"):
@@ -95,57 +172,129 @@ if submitted:
             # Read the image file into bytes, which the AI model needs
             image_data = uploaded_file.getvalue()
 
-        with st.spinner("Generating a full marketing kit... This may take a moment."):
-            # Pass both the text and image data to the backend, along with the selected image style
-            results = generate_all_content(product_input, image_data, image_style=image_style)
-            
-            # Translate content if a non-English language is selected
-            if selected_language != "English":
-                with st.spinner(f"Translating content to {selected_language}..."):
-                    results = translate_content(results, selected_language)
-                
-            # --- Display Results ---
-            st.write("---")
-            if selected_language != "English":
-                st.header(f"Your AI-Generated Marketing Kit (in {selected_language})")
-            else:
-                st.header("Your AI-Generated Marketing Kit")
+        # Stream the description and posts into placeholders while the image is still being generated
+        stream_area = st.empty()
+        with stream_area.container():
+            stream_col1, stream_col2 = st.columns(2)
+            with stream_col1:
+                st.subheader("📸 AI-Generated Image")
+                image_slot = st.empty()
+                image_slot.info("🎨 Generating your product image... This may take a moment.")
+            with stream_col2:
+                st.subheader("✍️ Product Description")
+                description_slot = st.empty()
+                st.subheader("📱 Social Media Posts")
+                posts_slot = st.empty()
+
+        streamed_text = {"description": "", "social_posts": ""}
+        with instrumentation.span("request.generate") as request_span:
+            for event in stream_all_content(product_input, image_data, image_style=image_style, number_of_images=image_variants):
+                if event["type"] == "chunk":
+                    streamed_text[event["field"]] += event["text"]
+                    if event["field"] == "description":
+                        description_slot.markdown(f"> {streamed_text['description'].strip()}")
+                    else:
+                        posts_slot.markdown(streamed_text["social_posts"])
+                elif event["type"] == "artifact" and event["field"] == "image" and event["value"]:
+                    image_slot.image(image_store.preview(image_store.put(event["value"])),
+                                     caption="Generated Product Image", use_column_width=True)
+                elif event["type"] == "message":
+                    show_message(event["level"], event["text"])
+                elif event["type"] == "done":
+                    results = event["results"]
+        st.session_state.debug_traces = [request_span.trace.trace_id]
+        # The results section below takes over from the streaming placeholders
+        stream_area.empty()
+
+        # Keep the kit, its inputs and the final image prompt for later reruns and regenerations
+        kit_store.put_kit(
+            input_fingerprint(product_input, image_data, image_style),
+            results,
+            inputs={"product_input": product_input, "image_data": image_data, "image_style": image_style}
+        )
     else:
         # Error if neither input is provided
         st.error("Please describe your product OR upload an image to begin.")
-            
-# Results section (outside the form)
-if 'results' in locals():
+
+# Results section, rendered from the session store on every rerun
+kit = kit_store.current_kit()
+if kit is not None:
+    # Translate only the fields that are not cached for the wanted languages yet
+    wanted_languages = [language for language in [selected_language] + additional_languages if language != "English"]
+    pending_languages = [language for language in wanted_languages if kit.missing_translations(language)]
+    if pending_languages:
+        missing_fields = {field for language in pending_languages for field in kit.missing_translations(language)}
+        english_results = kit.results()
+        partial_kit = {field: english_results[field] if field in missing_fields else "Not regenerated"
+                       for field in ("description", "social_posts")}
+        with st.spinner(f"Translating content to {', '.join(pending_languages)}..."), \
+                instrumentation.span("request.translate") as request_span:
+            translated, failed = translate_fields_multi(partial_kit, pending_languages)
+        st.session_state.debug_traces.append(request_span.trace.trace_id)
+        # Failed languages are not stored, so the next rerun tries them again
+        for language, error in failed.items():
+            print(f"Translation failed: {error}")
+            st.warning(f"Translation to {language} failed. Showing original text.")
+        for language in translated:
+            kit_store.set_translations(kit.fingerprint, language, {
+                field: translated[language][field] for field in kit.missing_translations(language)
+                if field in missing_fields
+            })
+    if prefetcher is not None:
+        # Count prefetch hits and misses, then translate the rest of the kit in the background
+        prefetcher.note_shown(kit_store, kit.fingerprint, wanted_languages, pending_languages)
+        prefetcher.ensure(kit_store, kit.fingerprint)
+
+    results = kit.translated_results(selected_language)
+
+    # --- Display Results ---
+    st.write("---")
+    if selected_language != "English":
+        st.header(f"Your AI-Generated Marketing Kit (in {selected_language})")
+    else:
+        st.header("Your AI-Generated Marketing Kit")
+
     res_col1, res_col2 = st.columns(2)
     
     with res_col1:
         st.subheader("📸 AI-Generated Image")
-        if results["image"]:
-            st.image(results["image"], caption="Generated Product Image", use_column_width=True)
-            # Download image button - now outside the form
-            image_bytes = results["image"]
+        image_ref = results["image"]
+        preview = image_store.preview(image_ref) if image_ref else None
+        if preview:
+            st.image(preview, caption="Generated Product Image", use_column_width=True)
+            # Download image button - serves the full-resolution original with its real type
             st.download_button(
                 label="⬇️ Download Image",
-                data=image_bytes,
-                file_name="kalaconnect_product_image.png",
-                mime="image/png",
+                data=(lambda ref=image_ref: image_store.original(ref)) if DEFERRED_DOWNLOADS else image_store.original(image_ref),
+                file_name=f"kalaconnect_product_image.{image_ref.extension}",
+                mime=image_ref.mime_type,
             )
-            
-            # Create a button for regenerating the image
-            if st.button("🎲 Regenerate Image", key="regen_img"):
-                with st.spinner("Regenerating image..."):
-                    # Pass only the necessary parameters for image generation
-                    new_results = generate_all_content(product_input, image_data, image_style=image_style, regenerate_image_only=True)
-                    if new_results["image"]:
-                        # Store the regenerated image in the session state
-                        st.session_state.regenerated_image = new_results["image"]
-                        st.success("Image regenerated successfully! Refreshing page...")
-                        st.rerun()  # Refresh the page with new content
-                    else:
-                        st.error("Sorry, the image could not be regenerated.")
+        elif image_ref:
+            st.error("Sorry, this image is no longer available. Please generate a new one.")
         else:
             st.error("Sorry, the image could not be generated.")
 
+        # Only the image call is repeated; the cached prompt skips analysis and categorisation
+        if st.button(f"🎲 Generate {image_variants} More Image{'s' if image_variants > 1 else ''}", key="regen_img"):
+            generation_inputs = None if kit.image_prompt else kit.generation_inputs()
+            if not kit.image_prompt and generation_inputs is None:
+                st.error(MISSING_UPLOAD_MESSAGE)
+            else:
+                with st.spinner("Generating more images..."), instrumentation.span("request.more_images") as request_span:
+                    if kit.image_prompt:
+                        new_images = generate_image_variants(kit.image_prompt, image_variants)
+                    else:
+                        new_images = generate_all_content(
+                            **generation_inputs, regenerate_image_only=True, number_of_images=image_variants, force_fresh=True,
+                            on_message=show_message
+                        )["image_variants"]
+                st.session_state.debug_traces = [request_span.trace.trace_id]
+                if new_images:
+                    kit_store.add_images(kit.fingerprint, new_images)
+                    st.rerun()
+                else:
+                    st.error("Sorry, the image could not be regenerated.")
+
     with res_col2:
         st.subheader("✍️ Product Description")
         if results["description"] != "Not regenerated":
@@ -163,21 +312,29 @@ if 'results' in locals():
                 
             # Button for regenerating description
             if desc_buttons.button("🎲 Regenerate Description", key="regen_desc"):
-                with st.spinner("Regenerating description..."):
-                    new_results = generate_all_content(product_input, image_data, image_style=image_style, regenerate_desc_only=True)
-                    
-                    # Translate if non-English language is selected
-                    if selected_language != "English":
-                        with st.spinner(f"Translating to {selected_language}..."):
-                            new_results = translate_content(new_results, selected_language)
+                if prefetcher is not None:
+                    prefetcher.cancel(kit_store)
+                generation_inputs = kit.generation_inputs()
+                if generation_inputs is None:
+                    st.error(MISSING_UPLOAD_MESSAGE)
+                else:
+                    with st.spinner("Regenerating description..."), \
+                            instrumentation.span("request.regenerate_description") as request_span:
+                        new_results = generate_all_content(**generation_inputs, regenerate_desc_only=True, force_fresh=True,
+                                                           on_message=show_message)
+                    st.session_state.debug_traces = [request_span.trace.trace_id]
                     
-                    if "description" in new_results and new_results["description"] != "Not regenerated":
-                        # Store the regenerated description in the session state
-                        st.session_state.regenerated_description = new_results["description"]
-                        st.success("Description regenerated successfully! Refreshing page...")
+                    if not new_results["description"].startswith("Error:"):
+                        # Only the description (and its translations) is replaced in the store
+                        kit_store.replace_artifact(kit.fingerprint, "description", new_results["description"])
                         st.rerun()
                     else:
                         st.error("Sorry, the description could not be regenerated.")
+
+            if kit.previous_version("description") is not None:
+                if desc_buttons.button("↩️ Previous Description", key="undo_desc"):
+                    kit_store.restore_previous(kit.fingerprint, "description")
+                    st.rerun()
         else:
             st.error("Description was not generated during this operation.")
         
@@ -199,20 +356,130 @@ if 'results' in locals():
                 
             # Button for regenerating social media posts
             if social_buttons.button("🎲 Regenerate Social Posts", key="regen_posts"):
-                with st.spinner("Regenerating social media posts..."):
-                    new_results = generate_all_content(product_input, image_data, image_style=image_style, regenerate_posts_only=True)
-                    
-                    # Translate if non-English language is selected
-                    if selected_language != "English":
-                        with st.spinner(f"Translating to {selected_language}..."):
-                            new_results = translate_content(new_results, selected_language)
+                if prefetcher is not None:
+                    prefetcher.cancel(kit_store)
+                generation_inputs = kit.generation_inputs()
+                if generation_inputs is None:
+                    st.error(MISSING_UPLOAD_MESSAGE)
+                else:
+                    with st.spinner("Regenerating social media posts..."), \
+                            instrumentation.span("request.regenerate_social_posts") as request_span:
+                        new_results = generate_all_content(**generation_inputs, regenerate_posts_only=True, force_fresh=True,
+                                                           on_message=show_message)
+                    st.session_state.debug_traces = [request_span.trace.trace_id]
                     
-                    if "social_posts" in new_results and new_results["social_posts"] != "Not regenerated":
-                        # Store the regenerated social posts in the session state
-                        st.session_state.regenerated_social_posts = new_results["social_posts"]
-                        st.success("Social posts regenerated successfully! Refreshing page...")
+                    if not new_results["social_posts"].startswith("Error:"):
+                        # Only the posts (and their translations) are replaced in the store
+                        kit_store.replace_artifact(kit.fingerprint, "social_posts", new_results["social_posts"])
                         st.rerun()
                     else:
                         st.error("Sorry, the social posts could not be regenerated.")
+
+            if kit.previous_version("social_posts") is not None:
+                if social_buttons.button("↩️ Previous Social Posts", key="undo_posts"):
+                    kit_store.restore_previous(kit.fingerprint, "social_posts")
+                    st.rerun()
         else:
-            st.error("Social media posts were not generated during this operation.")
\ No newline at end of file
+            st.error("Social media posts were not generated during this operation.")
+
+    # --- Image Gallery ---
+    if len(kit.images) > 1:
+        st.write("---")
+        st.subheader("🖼️ Image Gallery")
+        gallery_cols = st.columns(MAX_IMAGE_VARIANTS)
+        for index, image_ref in enumerate(kit.images):
+            preview = image_store.preview(image_ref)
+            if preview is None:
+                continue
+            with gallery_cols[index % MAX_IMAGE_VARIANTS]:
+                is_selected = index == min(kit.selected_image, len(kit.images) - 1)
+                st.image(preview, caption="⭐ Selected" if is_selected else f"Option {index + 1}",
+                         use_column_width=True)
+                if not is_selected and st.button("Use this image", key=f"select_img_{index}"):
+                    kit_store.select_image(kit.fingerprint, index)
+                    st.rerun()
+
+    # Additional languages requested from the sidebar
+    other_languages = [language for language in additional_languages if language != selected_language]
+    if other_languages:
+        st.write("---")
+        st.subheader("🌐 Other Languages")
+        language_tabs = st.tabs(other_languages)
+        for language_tab, language in zip(language_tabs, other_languages):
+            translated = kit.translated_results(language)
+            with language_tab:
+                st.markdown("**✍️ Product Description**")
+                st.markdown(f"> {translated['description'].strip()}")
+                st.markdown("**📱 Social Media Posts**")
+                st.markdown(translated["social_posts"])
+
+# --- Debug Panel ---
+# Waterfall of the spans recorded for the last user action (see instrumentation.py)
+if show_debug_panel:
+    st.write("---")
+    debug_traces = [trace for trace in map(instrumentation.get_trace, st.session_state.debug_traces) if trace]
+    with st.expander("🐞 Last request", expanded=True):
+        if not debug_traces:
+            st.info("No request recorded yet in this session.")
+        else:
+            import altair as alt
+
+            rows = []
+            origin = min(trace.root.start_wall for trace in debug_traces)
+            for trace in debug_traces:
+                totals = trace.totals()
+                metric_cols = st.columns(5)
+                metric_cols[0].metric(trace.root.name, f"{totals['duration']:.2f}s")
+                metric_cols[1].metric("Tokens in / out", f"{totals['prompt_tokens']} / {totals['response_tokens']}")
+                metric_cols[2].metric("Images", f"{totals['images']} ({totals['image_bytes'] // 1024} KB)")
+                metric_cols[3].metric("Cache hits / misses", f"{totals['cache_hits']} / {totals['cache_misses']}")
+                metric_cols[4].metric("Est. cost", f"${totals['estimated_cost_usd']:.4f}")
+
+                for index, span in enumerate(trace.to_dict()["spans"]):
+                    depth, parent = 0, trace.spans[index].parent
+                    while parent is not None:
+                        depth, parent = depth + 1, parent.parent
+                    start = (span["start_time_unix_nano"] / 1e9 - origin) * 1000
+                    rows.append({
+                        "order": len(rows),
+                        "span": f"{len(rows):02d} {'· ' * depth}{span['name']}",
+                        "start_ms": round(start, 1),
+                        "end_ms": round(start + span["duration"] * 1000, 1),
+                        "duration_ms": round(span["duration"] * 1000, 1),
+                        "status": span["status"],
+                        "details": ", ".join(f"{key}={value}" for key, value in span["attributes"].items()),
+                        "error": span["error"] or ""
+                    })
+
+            waterfall = alt.Chart(alt.Data(values=rows)).mark_bar().encode(
+                x=alt.X("start_ms:Q", title="ms since request start"),
+                x2="end_ms:Q",
+                y=alt.Y("span:N", sort=None, title=None),
+                color=alt.Color("status:N", scale=alt.Scale(domain=["ok", "error"], range=["#4c78a8", "#e45756"])),
+                tooltip=["span:N", "duration_ms:Q", "details:N", "error:N"]
+            )
+            st.altair_chart(waterfall, use_container_width=True)
+            st.dataframe([{key: row[key] for key in ("span", "start_ms", "duration_ms", "status", "details", "error")}
+                          for row in rows], use_container_width=True)
+
+    # Shared by every session in this process, so other users' and batch jobs' calls show up here too
+    with st.expander("🚦 Model queues"):
+        single_flight = get_single_flight_stats()
+        st.dataframe([{
+            "model": kind,
+            "limit": f"{stats['limit']} / {stats['max_limit']}",
+            "in flight": stats["in_flight"]["interactive"] + stats["in_flight"]["batch"],
+            "queued (interactive / batch)": f"{stats['queued']['interactive']} / {stats['queued']['batch']}",
+            "wait p95 (s)": stats["wait"].get("interactive", {}).get("p95", 0.0),
+            "quota errors": stats["quota_errors"],
+            "coalesced calls": single_flight[kind]["coalesced"]
+        } for kind, stats in get_scheduler_stats().items()], use_container_width=True)
+
+    if prefetcher is not None:
+        with st.expander("🌐 Translation prefetch"):
+            prefetch_stats = prefetcher.stats()
+            prefetch_cols = st.columns(4)
+            prefetch_cols[0].metric("Hit rate", f"{prefetch_stats['hit_rate']:.0%}")
+            prefetch_cols[1].metric("Hits / misses", f"{prefetch_stats['hits']} / {prefetch_stats['misses']}")
+            prefetch_cols[2].metric("Translated / wasted", f"{prefetch_stats['translated']} / {prefetch_stats['wasted']}")
+            prefetch_cols[3].metric("Cancelled / in flight", f"{prefetch_stats['cancelled']} / {prefetch_stats['in_flight']}")
@@ -1,13 +1,21 @@
+import contextvars
 import os
 import json
+import queue
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-import streamlit as st
-import google.auth
-from google.oauth2 import service_account
-from google.cloud import translate
-import vertexai
-from vertexai.generative_models import GenerativeModel, Part
-from vertexai.preview.vision_models import ImageGenerationModel
+import instrumentation
+import resilience
+import scheduler
+import singleflight
+from category_classifier import CategoryClassifier
+from cache import BlobSQLiteCache, DiskCache, LRUCache, SQLiteCache, TieredCache, content_hash
+from pipeline import Pipeline, Step
+from image_utils import IMAGE_MAX_EDGE, IMAGE_QUALITY, preprocess_image
 
 # --- GCP Project Configuration ---
 PROJECT_ID = "kalaconnect-hackathon"
@@ -26,32 +34,351 @@ LANGUAGE_CODES = {
 # Load environment variables for local development
 load_dotenv()
 
-# Initialize Vertex AI SDK - Handle both local development and Streamlit Cloud deployment
-try:
-    # Check if running on Streamlit Cloud by looking for secrets (more specific check)
-    if hasattr(st, "secrets") and hasattr(st.secrets, "gcp_service_account"):
-        # Get service account info from Streamlit secrets
-        credentials_info = st.secrets["gcp_service_account"]
-        
-        # Create credentials object from the dictionary
-        credentials = service_account.Credentials.from_service_account_info(
-            credentials_info,
-            scopes=["https://www.googleapis.com/auth/cloud-platform"]
-        )
-        
-        # Initialize with explicit credentials
-        vertexai.init(project=PROJECT_ID, location=LOCATION, credentials=credentials)
-        print("Initialized Vertex AI with Streamlit Cloud credentials")
-    else:
-        # Local development with GOOGLE_APPLICATION_CREDENTIALS environment variable
-        vertexai.init(project=PROJECT_ID, location=LOCATION)
-        print("Initialized Vertex AI with local credentials")
-except Exception as e:
-    error_msg = f"Failed to initialize Vertex AI: {str(e)}"
-    print(error_msg)
-    if 'st' in globals():
-        st.error(error_msg)
-        st.error("Please check your Google Cloud credentials and permissions.")
+# --- Lazy Google Cloud Initialisation ---
+# The Google Cloud SDKs take seconds to import, so they are imported inside the functions that use
+# them. Credentials are built once and shared by Vertex AI and Translate, and vertexai.init runs
+# once, when the first model is built, instead of before the first page paints.
+_CLOUD_SCOPES = ["https://www.googleapis.com/auth/cloud-platform"]
+_credentials = None
+_credentials_loaded = False
+_service_account_info = None
+_vertex_initialized = False
+_init_lock = threading.RLock()
+
+def configure_credentials(service_account_info=None):
+    """
+    Sets the service account used by Vertex AI and Translate (app.py passes the one in Streamlit secrets).
+    
+    Args:
+        service_account_info: Service account key as a dict, or None for the default credentials
+    """
+    global _service_account_info, _credentials, _credentials_loaded
+    info = dict(service_account_info) if service_account_info is not None else None
+    with _init_lock:
+        if info == _service_account_info:
+            return
+        _service_account_info = info
+        _credentials = None
+        _credentials_loaded = False
+
+def get_credentials():
+    """
+    Returns the credentials for the configured service account, built once per process,
+    or None for local development (GOOGLE_APPLICATION_CREDENTIALS / default credentials).
+    """
+    global _credentials, _credentials_loaded
+    with _init_lock:
+        if not _credentials_loaded:
+            if _service_account_info is not None:
+                from google.oauth2 import service_account
+
+                # Create credentials object from the configured service account key
+                _credentials = service_account.Credentials.from_service_account_info(
+                    _service_account_info,
+                    scopes=_CLOUD_SCOPES
+                )
+            _credentials_loaded = True
+        return _credentials
+
+def ensure_vertex_initialized():
+    """
+    Initializes the Vertex AI SDK on first use - handles both local development and Streamlit Cloud deployment.
+    Raises RuntimeError if initialisation fails, so the model build (and its step) fails with the reason.
+    """
+    global _vertex_initialized
+    if _vertex_initialized:
+        return
+    with _init_lock:
+        if _vertex_initialized:
+            return
+        try:
+            import vertexai
+
+            credentials = get_credentials()
+            if credentials is not None:
+                # Initialize with explicit credentials
+                vertexai.init(project=PROJECT_ID, location=LOCATION, credentials=credentials)
+                print("Initialized Vertex AI with Streamlit Cloud credentials")
+            else:
+                # Local development with GOOGLE_APPLICATION_CREDENTIALS environment variable
+                vertexai.init(project=PROJECT_ID, location=LOCATION)
+                print("Initialized Vertex AI with local credentials")
+            _vertex_initialized = True
+        except Exception as e:
+            error_msg = f"Failed to initialize Vertex AI: {str(e)}"
+            print(error_msg)
+            raise RuntimeError(f"{error_msg}. Please check your Google Cloud credentials and permissions.") from e
+
+# --- Model Registry ---
+# Each model is built once per process on first use and shared by all sessions and threads.
+# Model names come from the environment so they can be swapped without code changes.
+MODEL_NAMES = {
+    "text": os.getenv("KALACONNECT_TEXT_MODEL", "gemini-2.5-flash"),
+    "image": os.getenv("KALACONNECT_IMAGE_MODEL", "imagen-3.0-generate-002")
+}
+MODEL_WARM_UP = os.getenv("KALACONNECT_WARM_UP_MODELS", "0") == "1"
+
+def _build_text_model(name: str):
+    ensure_vertex_initialized()
+    from vertexai.generative_models import GenerativeModel
+    return GenerativeModel(name)
+
+def _build_image_model(name: str):
+    ensure_vertex_initialized()
+    from vertexai.preview.vision_models import ImageGenerationModel
+    return ImageGenerationModel.from_pretrained(name)
+
+_model_factories = {
+    "text": _build_text_model,
+    "image": _build_image_model
+}
+_models = {}
+_models_lock = threading.Lock()
+
+def get_model(kind: str):
+    """
+    Returns the shared model instance for `kind` ("text" or "image"), building it on first use.
+    """
+    model = _models.get(kind)
+    if model is None:
+        with _models_lock:
+            model = _models.get(kind)
+            if model is None:
+                model = _model_factories[kind](MODEL_NAMES[kind])
+                _models[kind] = model
+    return model
+
+def get_text_model():
+    return get_model("text")
+
+def get_image_model():
+    return get_model("image")
+
+def configure_models(text_model_name=None, image_model_name=None, text_factory=None, image_factory=None):
+    """
+    Swaps model names and/or factories (e.g. fakes for benchmarking) and drops the built instances.
+    
+    Args:
+        text_model_name: Gemini model name used for all text and vision steps
+        image_model_name: Imagen model name
+        text_factory: Callable(model name) -> object with generate_content
+        image_factory: Callable(model name) -> object with generate_images
+    """
+    with _models_lock:
+        if text_model_name:
+            MODEL_NAMES["text"] = text_model_name
+        if image_model_name:
+            MODEL_NAMES["image"] = image_model_name
+        if text_factory:
+            _model_factories["text"] = text_factory
+        if image_factory:
+            _model_factories["image"] = image_factory
+        _models.clear()
+
+def get_model_factory(kind: str):
+    """
+    Returns the callable currently used to build the `kind` model (see configure_models).
+    """
+    with _models_lock:
+        return _model_factories[kind]
+
+_warm_up_started = False
+
+def warm_up_models(kinds=("text", "image"), background=False):
+    """
+    Builds the models ahead of the first request so setup stays off the hot path.
+    
+    Args:
+        kinds: Models to build
+        background: If True, build them on a daemon thread (started once per process) so the
+                    SDK import and Vertex AI initialisation do not delay the first page render
+    """
+    global _warm_up_started
+    if background:
+        with _models_lock:
+            if _warm_up_started:
+                return
+            _warm_up_started = True
+        threading.Thread(target=warm_up_models, args=(kinds,), name="kalaconnect-warm-up", daemon=True).start()
+        return
+    for kind in kinds:
+        try:
+            get_model(kind)
+        except Exception as e:
+            print(f"Failed to warm up {kind} model: {str(e)}")
+
+# --- Model Call Scheduler ---
+# Process-wide concurrency limit per model, shared by every session, API request and batch job.
+# Batch jobs (see batch.py) run at "batch" priority and may only use part of each limit; the limits
+# shrink when a model answers with quota errors and grow back as calls succeed (see scheduler.py).
+MODEL_CONCURRENCY = {
+    "text": int(os.getenv("KALACONNECT_TEXT_CONCURRENCY", "8")),
+    "image": int(os.getenv("KALACONNECT_IMAGE_CONCURRENCY", "4")),
+    "translate": int(os.getenv("KALACONNECT_TRANSLATE_CONCURRENCY", "8"))
+}
+SCHEDULER = scheduler.Scheduler(MODEL_CONCURRENCY, batch_share=float(os.getenv("KALACONNECT_BATCH_SHARE", "0.5")))
+
+def get_scheduler_stats() -> dict:
+    """
+    Returns the current limit, calls in flight, queue depth and queue wait times per model.
+    """
+    return SCHEDULER.stats()
+
+# --- Upstream Resilience ---
+# Every Gemini, Imagen and Translate call goes through the Upstream of its model (see resilience.py),
+# shared by all sessions: transient errors (quota, 5xx, timeouts) are retried with jittered backoff
+# within a retry budget, a circuit breaker pauses an upstream that keeps failing, and an optional
+# token bucket keeps the whole process under the quota. Each attempt also waits for a scheduler slot.
+# Non-streamed text calls can be hedged.
+def _hedge_after(value):
+    if not value:
+        return None
+    return "p95" if value == "p95" else float(value)
+
+def _build_upstream(kind: str, hedge_after=None) -> resilience.Upstream:
+    return resilience.Upstream(
+        kind,
+        retry=resilience.RetryPolicy(
+            max_attempts=int(os.getenv("KALACONNECT_MAX_ATTEMPTS", "3")),
+            base_delay=float(os.getenv("KALACONNECT_RETRY_BASE_DELAY", "0.5"))
+        ),
+        breaker=resilience.CircuitBreaker(
+            failure_threshold=int(os.getenv("KALACONNECT_BREAKER_THRESHOLD", "5")),
+            reset_timeout=float(os.getenv("KALACONNECT_BREAKER_RESET", "30"))
+        ),
+        bucket=resilience.TokenBucket(float(os.getenv(f"KALACONNECT_{kind.upper()}_RATE", "0"))),
+        hedge_after=hedge_after,
+        queue=SCHEDULER.queue(kind)
+    )
+
+UPSTREAMS = {
+    "text": _build_upstream("text", _hedge_after(os.getenv("KALACONNECT_TEXT_HEDGE_AFTER"))),
+    "image": _build_upstream("image"),
+    "translate": _build_upstream("translate")
+}
+
+def get_upstream_stats() -> dict:
+    """
+    Returns call, retry, hedge and circuit breaker counters per upstream.
+    """
+    return {kind: upstream.stats() for kind, upstream in UPSTREAMS.items()}
+
+def configure_scheduler(limits: dict = None, batch_share: float = None, adaptive: bool = True):
+    """
+    Replaces the scheduler, and the upstreams using it, with fresh limits, breakers and counters
+    (e.g. for benchmarks or after a quota change).
+    
+    Args:
+        limits: {model kind: maximum calls in flight}, merged over MODEL_CONCURRENCY
+        batch_share: Fraction of each limit batch calls may use (default KALACONNECT_BATCH_SHARE)
+        adaptive: If False, quota errors do not lower the limits
+    """
+    global SCHEDULER, UPSTREAMS
+    SCHEDULER = scheduler.Scheduler(
+        {**MODEL_CONCURRENCY, **(limits or {})},
+        batch_share=batch_share if batch_share is not None else float(os.getenv("KALACONNECT_BATCH_SHARE", "0.5"))
+    )
+    if not adaptive:
+        for queue in SCHEDULER.queues.values():
+            queue.decrease_factor = 1.0
+    UPSTREAMS = {kind: _build_upstream(kind, upstream.hedge_after) for kind, upstream in UPSTREAMS.items()}
+
+# --- Image Analysis Cache ---
+# Step 1 re-sends the full image to Gemini, so its result is cached by image hash and model name.
+# Set KALACONNECT_CACHE_DIR to also keep entries on disk across restarts.
+_cache_dir = os.getenv("KALACONNECT_CACHE_DIR")
+ANALYSIS_CACHE = TieredCache(
+    LRUCache(maxsize=int(os.getenv("KALACONNECT_ANALYSIS_CACHE_SIZE", "128"))),
+    DiskCache(os.path.join(_cache_dir, "analysis")) if _cache_dir else None
+)
+
+def get_analysis_cache_stats() -> dict:
+    """
+    Returns hit/miss counters for the image analysis cache.
+    """
+    return ANALYSIS_CACHE.stats()
+
+# --- Translation Memory ---
+# Translations are cached by (source text hash, source language, target language), in memory and,
+# with KALACONNECT_CACHE_DIR set, in a SQLite store with a TTL and a size budget.
+TRANSLATION_CACHE = TieredCache(
+    LRUCache(maxsize=int(os.getenv("KALACONNECT_TRANSLATION_CACHE_SIZE", "2048"))),
+    SQLiteCache(
+        os.path.join(_cache_dir, "translations.sqlite3"),
+        ttl=float(os.getenv("KALACONNECT_TRANSLATION_CACHE_TTL", str(30 * 24 * 3600))),
+        max_bytes=int(os.getenv("KALACONNECT_TRANSLATION_CACHE_MAX_BYTES", str(50 * 1024 * 1024)))
+    ) if _cache_dir else None
+)
+
+def get_translation_cache_stats() -> dict:
+    """
+    Returns hit/miss counters for the translation memory.
+    """
+    return TRANSLATION_CACHE.stats()
+
+# --- Kit Cache ---
+# Complete kits (description, social posts, category, image prompt and images) for repeated identical
+# requests, e.g. artisans retrying or several demos of the same sample product. Only full-kit requests
+# are served from and stored in it; pass force_fresh=True to bypass it. With KALACONNECT_CACHE_DIR set,
+# kits are also kept on disk: their text in SQLite, their images as files in a blob store.
+KIT_CACHE_VERSION = "1"  # Bump when the prompts change so kits made with the old ones are not served
+KIT_CACHE = TieredCache(
+    LRUCache(maxsize=int(os.getenv("KALACONNECT_KIT_CACHE_SIZE", "16"))),
+    BlobSQLiteCache(
+        os.path.join(_cache_dir, "kits.sqlite3"),
+        os.path.join(_cache_dir, "kit_images"),
+        max_entries=int(os.getenv("KALACONNECT_KIT_CACHE_MAX_ENTRIES", "256")),
+        max_bytes=int(os.getenv("KALACONNECT_KIT_CACHE_MAX_BYTES", str(500 * 1024 * 1024)))
+    ) if _cache_dir else None
+)
+KIT_CACHE_FIELDS = ("description", "social_posts", "category", "image_prompt", "image_variants")
+
+def normalize_product_input(product_input: str) -> str:
+    """
+    Collapses whitespace and case, so retries of the same text share one cache entry.
+    """
+    return " ".join((product_input or "").split()).casefold()
+
+def kit_cache_key(product_input: str, image_data, image_style: str) -> str:
+    """
+    Returns the kit cache key: normalised text, image hash, style and the text/image model names.
+    """
+    return content_hash(
+        KIT_CACHE_VERSION,
+        normalize_product_input(product_input),
+        content_hash(image_data) if image_data else "",
+        image_style or "",
+        MODEL_NAMES["text"],
+        MODEL_NAMES["image"]
+    )
+
+def get_kit_cache_stats() -> dict:
+    """
+    Returns hit/miss counters for the kit cache.
+    """
+    return KIT_CACHE.stats()
+
+# --- Single-Flight Coalescing ---
+# Identical model calls in flight at the same time (many sessions generating the same sample product,
+# a double-clicked regenerate button) share one upstream call; see singleflight.py. Keys cover the
+# model, the full prompt or image and the call's parameters.
+SINGLE_FLIGHT = {
+    kind: singleflight.Group(kind, enabled=os.getenv("KALACONNECT_SINGLE_FLIGHT", "1") == "1")
+    for kind in ("analysis", "text", "image", "translate")
+}
+
+def get_single_flight_stats() -> dict:
+    """
+    Returns calls, upstream executions and the coalescing ratio per kind of model call.
+    """
+    return {kind: group.stats() for kind, group in SINGLE_FLIGHT.items()}
+
+def configure_single_flight(enabled: bool = True):
+    """
+    Turns coalescing on or off for every kind of model call.
+    """
+    for group in SINGLE_FLIGHT.values():
+        group.enabled = enabled
 
 # --- Translation Functions ---
 def initialize_translate_client():
@@ -59,18 +386,11 @@ def initialize_translate_client():
     Initialize Google Cloud Translate client (v3 API)
     """
     try:
-        # Check if running on Streamlit Cloud by looking for secrets (more specific check)
-        if hasattr(st, "secrets") and hasattr(st.secrets, "gcp_service_account"):
-            # Get service account info from Streamlit secrets
-            credentials_info = st.secrets["gcp_service_account"]
-            
-            # Create credentials object from the dictionary
-            credentials = service_account.Credentials.from_service_account_info(
-                credentials_info,
-                scopes=["https://www.googleapis.com/auth/cloud-platform"]
-            )
-            
-            # Initialize translate client with explicit credentials (v3 API)
+        from google.cloud import translate
+
+        credentials = get_credentials()
+        if credentials is not None:
+            # Initialize translate client with the shared Streamlit Cloud credentials (v3 API)
             translate_client = translate.TranslationServiceClient(credentials=credentials)
             print("Initialized Translate client with Streamlit Cloud credentials")
             return translate_client
@@ -82,59 +402,310 @@ def initialize_translate_client():
     except Exception as e:
         error_msg = f"Failed to initialize Translate client: {str(e)}"
         print(error_msg)
-        if 'st' in globals():
-            st.error(error_msg)
         return None
 
-def translate_text(text: str, target_language: str) -> str:
+# --- Shared Translate Client ---
+# One TranslationServiceClient (and gRPC channel) is shared by all calls and Streamlit sessions.
+# It is created lazily, recycled after TRANSLATE_CLIENT_MAX_AGE seconds and rebuilt after channel failures.
+# A replaced client is retired rather than closed at once: other threads may still have requests in
+# flight on its channel, so it is closed when the last of them finishes.
+TRANSLATE_CLIENT_MAX_AGE = int(os.getenv("KALACONNECT_TRANSLATE_CLIENT_MAX_AGE", "3600"))
+
+def _dead_channel_states() -> set:
     """
-    Translate text to the target language using Google Translate API v3
+    Returns the gRPC connectivity states that mean the channel will not recover on its own.
+    """
+    import grpc
+    return {grpc.ChannelConnectivity.TRANSIENT_FAILURE.value[0], grpc.ChannelConnectivity.SHUTDOWN.value[0]}
+
+def _channel_errors() -> tuple:
+    """
+    Returns the errors after which the channel is assumed broken and the client is rebuilt.
+    """
+    import grpc
+    from google.api_core import exceptions as google_exceptions
+    return (google_exceptions.ServiceUnavailable, google_exceptions.DeadlineExceeded, grpc.RpcError)
+
+_translate_client = None
+_translate_client_created_at = 0.0
+_translate_client_lock = threading.Lock()
+_translate_client_factory = None  # Replaces initialize_translate_client when set (see configure_translate_client)
+_translate_client_users = {}  # id(client) -> requests in flight on it
+_retired_translate_clients = {}  # id(client) -> replaced client waiting for its requests to finish
+
+def _translate_client_is_healthy(client) -> bool:
+    """
+    Checks the shared client's age and, where the transport exposes it, its gRPC channel state.
+    """
+    if time.monotonic() - _translate_client_created_at > TRANSLATE_CLIENT_MAX_AGE:
+        return False
+    try:
+        channel = client.transport.grpc_channel
+        state = channel._channel.check_connectivity_state(False)
+    except Exception:
+        # Non-gRPC transport or no state available; rely on failure-triggered resets
+        return True
+    return state not in _dead_channel_states()
+
+def get_translate_client():
+    """
+    Returns the process-wide Translate client, creating it on first use or when it is unhealthy.
+    """
+    with _translate_client_lock:
+        return _current_translate_client()
+
+def _current_translate_client():
+    # Call with _translate_client_lock held
+    global _translate_client, _translate_client_created_at
+    if _translate_client is not None and not _translate_client_is_healthy(_translate_client):
+        print("Recycling Translate client")
+        _retire_translate_client(_translate_client)
+        _translate_client = None
+    if _translate_client is None:
+        _translate_client = (_translate_client_factory or initialize_translate_client)()
+        _translate_client_created_at = time.monotonic()
+    return _translate_client
+
+def get_translate_client_factory():
+    """
+    Returns the callable currently used to build the shared Translate client.
+    """
+    return _translate_client_factory or initialize_translate_client
+
+def configure_translate_client(factory=None):
+    """
+    Swaps the Translate client factory (e.g. a recorder or replayer, see replay.py) and drops the shared client.
     
     Args:
-        text: Text to translate
-        target_language: Target language name (e.g., "Hindi", "Bengali")
-    
-    Returns:
-        Translated text or original text if translation fails
+        factory: Callable() -> object with translate_text(request=...), or None for the real client
     """
-    if target_language == "English":
-        return text
+    global _translate_client_factory
+    reset_translate_client()
+    with _translate_client_lock:
+        _translate_client_factory = factory
+
+def reset_translate_client(failed_client=None):
+    """
+    Drops the shared Translate client so the next call builds a new one.
     
+    Args:
+        failed_client: If given, only reset when it is still the shared client, so concurrent
+                       failures on the same channel rebuild it once
+    """
+    global _translate_client
+    with _translate_client_lock:
+        if _translate_client is None or (failed_client is not None and failed_client is not _translate_client):
+            return
+        _retire_translate_client(_translate_client)
+        _translate_client = None
+
+def _retire_translate_client(client):
+    """
+    Closes a replaced client now if nothing is using it, otherwise when its last request finishes.
+    Call with _translate_client_lock held.
+    """
+    if _translate_client_users.get(id(client)):
+        _retired_translate_clients[id(client)] = client
+    else:
+        _close_translate_client(client)
+
+def _acquire_translate_client():
+    """
+    Returns the shared client (or None) and counts the caller as using it until _release_translate_client.
+    """
+    with _translate_client_lock:
+        client = _current_translate_client()
+        if client is not None:
+            _translate_client_users[id(client)] = _translate_client_users.get(id(client), 0) + 1
+    return client
+
+def _release_translate_client(client):
+    with _translate_client_lock:
+        users = _translate_client_users.pop(id(client), 0) - 1
+        if users > 0:
+            _translate_client_users[id(client)] = users
+            return
+        retired = _retired_translate_clients.pop(id(client), None)
+    if retired is not None:
+        _close_translate_client(retired)
+
+def _close_translate_client(client):
+    # Stand-in clients (replay, tests) have no transport to close
+    if getattr(client, "transport", None) is None:
+        return
     try:
-        # Get the language code
-        target_code = LANGUAGE_CODES.get(target_language, "en")
-        
-        # Initialize translate client
-        translate_client = initialize_translate_client()
+        client.transport.close()
+    except Exception as e:
+        print(f"Failed to close Translate client: {str(e)}")
+
+def _send_translate_request(request: dict):
+    """
+    Sends a translate_text request on the shared client through the Translate upstream, which retries
+    transient errors; after a channel failure the client is rebuilt before the next attempt.
+    Returns None if no client is available.
+    """
+    def attempt():
+        translate_client = _acquire_translate_client()
         if not translate_client:
-            return text
+            return None
+        try:
+            return translate_client.translate_text(request=request)
+        except _channel_errors() as e:
+            print(f"Translate channel failed, recreating client: {str(e)}")
+            reset_translate_client(translate_client)
+            raise
+        finally:
+            _release_translate_client(translate_client)
+
+    return UPSTREAMS["translate"].call(attempt)
+
+def _translate_batch(texts: list, target_language: str, source_language: str = "en") -> list:
+    """
+    Translates all `texts` to the target language, serving what it can from the translation memory
+    and sending the rest in a single v3 request. Raises on failure.
+    """
+    # Get the language code
+    target_code = LANGUAGE_CODES.get(target_language, "en")
+    
+    with instrumentation.span("translate", target_language=target_language, segments=len(texts)):
+        keys = [content_hash(text, source_language, target_code) for text in texts]
+        translated = [TRANSLATION_CACHE.get(key) for key in keys]
+        
+        # Each distinct text that missed the cache is sent once
+        missing = list(dict.fromkeys(text for text, cached in zip(texts, translated) if cached is None))
+        instrumentation.add_to_span("cache_hits", sum(1 for cached in translated if cached is not None))
+        instrumentation.add_to_span("cache_misses", len(missing))
+        if not missing:
+            return translated
         
         # Prepare the request for v3 API
         parent = f"projects/{PROJECT_ID}/locations/global"
         
-        # Perform translation using v3 API
-        response = translate_client.translate_text(
-            request={
-                "parent": parent,
-                "contents": [text],
-                "mime_type": "text/plain",
-                "source_language_code": "en",
-                "target_language_code": target_code,
-            }
-        )
-        
-        # Extract the translated text
-        if response.translations:
-            return response.translations[0].translated_text
+        request = {
+            "parent": parent,
+            "contents": missing,
+            "mime_type": "text/plain",
+            "source_language_code": source_language,
+            "target_language_code": target_code,
+        }
+
+        def send():
+            instrumentation.add_to_span("translate_characters", sum(len(text) for text in missing))
+            return _send_translate_request(request)
+
+        # Perform translation using v3 API on the shared client, once for identical concurrent requests
+        response, _ = SINGLE_FLIGHT["translate"].do(content_hash(source_language, target_code, *missing), send)
+    
+    # Without a client or a complete answer there is nothing to keep; callers decide how to fall back
+    if not response:
+        raise RuntimeError("Translate client is not available")
+    if len(response.translations) != len(missing):
+        raise RuntimeError(f"Translate returned {len(response.translations)} texts for {len(missing)}")
+    fresh = {text: translation.translated_text for text, translation in zip(missing, response.translations)}
+    for text, key in zip(texts, keys):
+        if text in fresh:
+            TRANSLATION_CACHE.set(key, fresh[text])
+    return [cached if cached is not None else fresh[text] for text, cached in zip(texts, translated)]
+
+# Leading Markdown markup kept as-is when a line is translated (headings, list bullets, quotes)
+_MARKDOWN_PREFIX = re.compile(r"^(\s*(?:#{1,6}\s+|[-*+]\s+|>\s*)?)(.*)$")
+
+def _split_markdown(text: str):
+    """
+    Splits Markdown into one segment per line so repeated lines (hashtags, headings) are cached once.
+    
+    Returns:
+        (lines, segments) where `lines` holds (prefix, segment index or None, raw line) per line
+    """
+    lines = []
+    segments = []
+    for line in text.split("\n"):
+        prefix, body = _MARKDOWN_PREFIX.match(line).groups()
+        # Blank lines and horizontal rules have nothing to translate
+        if not body.strip() or set(line.strip()) <= set("-*_"):
+            lines.append((None, None, line))
+            continue
+        lines.append((prefix, len(segments), line))
+        segments.append(body)
+    return lines, segments
+
+def _join_markdown(lines: list, translated_segments: list) -> str:
+    return "\n".join(
+        raw if index is None else prefix + translated_segments[index]
+        for prefix, index, raw in lines
+    )
+
+def _prepare_translation(content_dict: dict, fields: list):
+    """
+    Flattens the fields into one list of texts, splitting the Markdown social posts into segments.
+    
+    Returns:
+        (texts, assemble) where assemble(translated_texts) returns {field: translated text}
+    """
+    texts = []
+    layout = []
+    for field in fields:
+        if field == "social_posts":
+            lines, segments = _split_markdown(content_dict[field])
+            layout.append((field, lines, len(texts), len(segments)))
+            texts.extend(segments)
         else:
-            return text
+            layout.append((field, None, len(texts), 1))
+            texts.append(content_dict[field])
+
+    def assemble(translated_texts: list) -> dict:
+        translated = {}
+        for field, lines, start, count in layout:
+            chunk = translated_texts[start:start + count]
+            translated[field] = chunk[0] if lines is None else _join_markdown(lines, chunk)
+        return translated
+
+    return texts, assemble
+
+def translate_texts(texts: list, target_language: str) -> list:
+    """
+    Translate several texts to the target language with one Google Translate API v3 request
     
+    Args:
+        texts: Texts to translate
+        target_language: Target language name (e.g., "Hindi", "Bengali")
+    
+    Returns:
+        Translated texts in the same order, or the original texts if translation fails
+    """
+    if target_language == "English" or not texts:
+        return list(texts)
+    
+    try:
+        return _translate_batch(texts, target_language)
     except Exception as e:
-        error_msg = f"Translation failed: {str(e)}"
+        error_msg = f"Translation to {target_language} failed, showing original text: {str(e)}"
         print(error_msg)
-        if 'st' in globals():
-            st.warning(f"Translation to {target_language} failed. Showing original text.")
-        return text
+        return list(texts)
+
+def translate_text(text: str, target_language: str) -> str:
+    """
+    Translate text to the target language using Google Translate API v3
+    
+    Args:
+        text: Text to translate
+        target_language: Target language name (e.g., "Hindi", "Bengali")
+    
+    Returns:
+        Translated text or original text if translation fails
+    """
+    return translate_texts([text], target_language)[0]
+
+def _translatable_fields(content_dict: dict) -> list:
+    """
+    Returns the keys of the generated text fields that should be translated.
+    """
+    fields = []
+    for field in ("description", "social_posts"):
+        value = content_dict.get(field)
+        if value and value != "Not regenerated" and not value.startswith("Error:"):
+            fields.append(field)
+    return fields
 
 def translate_content(content_dict: dict, target_language: str) -> dict:
     """
@@ -153,15 +724,9 @@ def translate_content(content_dict: dict, target_language: str) -> dict:
     translated_content = content_dict.copy()
     
     try:
-        # Translate product description
-        if content_dict.get("description") and content_dict["description"] != "Not regenerated":
-            if not content_dict["description"].startswith("Error:"):
-                translated_content["description"] = translate_text(content_dict["description"], target_language)
-        
-        # Translate social media posts
-        if content_dict.get("social_posts") and content_dict["social_posts"] != "Not regenerated":
-            if not content_dict["social_posts"].startswith("Error:"):
-                translated_content["social_posts"] = translate_text(content_dict["social_posts"], target_language)
+        # Translate the product description and social media posts in one request
+        texts, assemble = _prepare_translation(content_dict, _translatable_fields(content_dict))
+        translated_content.update(assemble(translate_texts(texts, target_language)))
         
         # Image remains the same (no translation needed)
         translated_content["image"] = content_dict.get("image")
@@ -169,97 +734,370 @@ def translate_content(content_dict: dict, target_language: str) -> dict:
     except Exception as e:
         error_msg = f"Content translation failed: {str(e)}"
         print(error_msg)
-        if 'st' in globals():
-            st.warning(f"Some content could not be translated to {target_language}.")
         # Return original content if translation fails
         return content_dict
     
     return translated_content
 
+def translate_content_multi(content_dict: dict, target_languages: list, max_workers: int = 4) -> dict:
+    """
+    Translate the content into several languages at once, one concurrent request per language
+    
+    Args:
+        content_dict: Dictionary containing 'description', 'social_posts', and 'image'
+        target_languages: Target language names (e.g., ["Hindi", "Tamil"])
+        max_workers: Maximum number of languages translated in parallel
+    
+    Returns:
+        Dictionary keyed by language name with the translated content for each (the original
+        content for a language whose translation failed)
+    """
+    translated = {}
+    if "English" in target_languages:
+        translated["English"] = content_dict
+    succeeded, failed = translate_fields_multi(content_dict, target_languages, max_workers)
+    for language in dict.fromkeys(target_languages):
+        if language in succeeded:
+            translated[language] = succeeded[language]
+        elif language in failed:
+            print(f"Translation to {language} failed, showing original text: {failed[language]}")
+            translated[language] = content_dict.copy()
+    return translated
+
+def translate_fields_multi(content_dict: dict, target_languages: list, max_workers: int = 4):
+    """
+    Translate the text fields into several languages at once without touching the UI, one
+    concurrent request per language
+    
+    Args:
+        content_dict: Dictionary containing 'description', 'social_posts', and 'image'
+        target_languages: Target language names (English is skipped)
+        max_workers: Maximum number of languages translated in parallel
+    
+    Returns:
+        (translated, failed): {language: translated content} for the languages that succeeded and
+        {language: error message} for the others
+    """
+    texts, assemble = _prepare_translation(content_dict, _translatable_fields(content_dict))
+    translated, failed = {}, {}
+    
+    pending = [language for language in dict.fromkeys(target_languages) if language != "English"]
+    if not pending:
+        return translated, failed
+    
+    # Workers only call the API; their outcomes are collected here, on the calling thread
+    with instrumentation.span("translate_multi", languages=",".join(pending)), \
+            ThreadPoolExecutor(max_workers=min(max_workers, len(pending))) as executor:
+        futures = {language: executor.submit(contextvars.copy_context().run, _translate_batch, texts, language)
+                   for language in pending}
+        for language, future in futures.items():
+            try:
+                translated_content = content_dict.copy()
+                translated_content.update(assemble(future.result()))
+                translated[language] = translated_content
+            except Exception as e:
+                failed[language] = str(e)
+    
+    return translated, failed
+
+def translate_fields(content_dict: dict, target_language: str) -> dict:
+    """
+    Translate the text fields of the content in one request without touching the UI
+    
+    Args:
+        content_dict: Dictionary containing 'description', 'social_posts', and 'image'
+        target_language: Target language name
+    
+    Returns:
+        Copy of the dictionary with the translated fields. Raises if the translation fails.
+    """
+    translated_content = content_dict.copy()
+    if target_language == "English":
+        return translated_content
+    texts, assemble = _prepare_translation(content_dict, _translatable_fields(content_dict))
+    translated_content.update(assemble(_translate_batch(texts, target_language)))
+    return translated_content
+
+# --- Per-Step Timeouts for Parallel Generation (seconds) ---
+STEP_TIMEOUTS = {
+    "description": 60,
+    "social_posts": 60,
+    "category": 30,
+    "image": 120
+}
+
 # --- Internal Helper Function for Image Generation ---
+# Imagen returns at most this many candidates per request
+MAX_IMAGE_VARIANTS = 4
+
+def _request_product_images(full_image_prompt: str, number_of_images: int = 1, image_model=None) -> list:
+    """
+    Calls Imagen once for `number_of_images` candidates and returns their bytes; identical concurrent
+    requests share one call. Raises on failure.
+    """
+    model = image_model or get_image_model()
+    number_of_images = max(1, min(number_of_images, MAX_IMAGE_VARIANTS))
+    key = content_hash(MODEL_NAMES["image"], str(number_of_images), full_image_prompt)
+    images, _ = SINGLE_FLIGHT["image"].do(key, _call_image_model, model, full_image_prompt, number_of_images)
+    # A copy, so callers that shared the call cannot change each other's list
+    return list(images)
+
+def _call_image_model(model, full_image_prompt: str, number_of_images: int) -> list:
+    # We now pass the entire, pre-engineered prompt to this function
+    with instrumentation.span("imagen.generate_images", model=MODEL_NAMES["image"], requested=number_of_images):
+        response = UPSTREAMS["image"].call(
+            model.generate_images, prompt=full_image_prompt, number_of_images=number_of_images
+        )
+        images = [image._image_bytes for image in response]
+        instrumentation.add_to_span("images", len(images))
+        instrumentation.add_to_span("image_bytes", sum(len(image) for image in images))
+    if not images:
+        raise RuntimeError("Imagen returned no images")
+    return images
+
+def _request_product_image(full_image_prompt: str):
+    """
+    Calls Imagen with the full prompt and returns the image bytes. Raises on failure.
+    """
+    return _request_product_images(full_image_prompt)[0]
+
 def _generate_product_image(full_image_prompt: str):
     """
     Generates a product image based on a full, detailed prompt.
     """
     try:
-        model = ImageGenerationModel.from_pretrained("imagen-3.0-generate-002") 
-        
-        # We now pass the entire, pre-engineered prompt to this function
-        response = model.generate_images(prompt=full_image_prompt, number_of_images=1)
-        return response[0]._image_bytes
+        return _request_product_image(full_image_prompt)
     except Exception as e:
         error_msg = f"Image generation failed: {str(e)}"
         print(error_msg)
-        if 'st' in globals():
-            st.error(error_msg)
         return None
+
+def generate_image_variants(full_image_prompt: str, number_of_images: int = MAX_IMAGE_VARIANTS) -> list:
+    """
+    Generates several candidate images for an existing prompt in a single Imagen request.
+    
+    Use the "image_prompt" returned by generate_all_content so that extra images cost only the image call.
+    
+    Args:
+        full_image_prompt: Final image prompt from a previous generation
+        number_of_images: Number of candidates (1-4)
+    
+    Returns:
+        List of image bytes, empty if generation fails
+    """
+    try:
+        return _request_product_images(full_image_prompt, number_of_images)
     except Exception as e:
-        print(f"Image generation failed: {e}")
-        return None
+        error_msg = f"Image generation failed: {str(e)}"
+        print(error_msg)
+        return []
 
-# --- Main Orchestration Function (Now with two-step prompting for better image accuracy) ---
-def generate_all_content(product_input: str, image_data=None, image_style="Artistic Lifestyle", 
-                        regenerate_image_only=False, regenerate_desc_only=False, regenerate_posts_only=False):
+# --- Internal Helper Functions for the Generation Steps ---
+# Each helper performs a single model call and raises on failure, so the caller
+# decides how the error is reported. This keeps Streamlit calls out of worker threads.
+def _complete_text(text_model, prompt: str, on_chunk=None, generation_config=None) -> str:
     """
-    Generates all content based on text and/or an uploaded image using two-step prompting for better accuracy.
+    Runs a text prompt and returns the stripped response. With `on_chunk`, the response is
+    streamed and each partial text is passed to it as it arrives.
+    """
+    config = generation_config.to_dict() if hasattr(generation_config, "to_dict") else generation_config
+    key = content_hash(MODEL_NAMES["text"], json.dumps(config or {}, sort_keys=True, default=str), prompt)
+    text, shared = SINGLE_FLIGHT["text"].do(key, _call_text_model, text_model, prompt, on_chunk, generation_config)
+    if shared and on_chunk is not None:
+        # Joined an identical call already in flight: its text arrives as one chunk
+        on_chunk(text)
+    return text
+
+def _call_text_model(text_model, prompt: str, on_chunk=None, generation_config=None) -> str:
+    # Only pass a config when one is set, so plain calls stay exactly as before
+    config = {"generation_config": generation_config} if generation_config else {}
+    with instrumentation.span("gemini.generate_content", model=MODEL_NAMES["text"], streamed=on_chunk is not None):
+        if on_chunk is None:
+            response = UPSTREAMS["text"].call(text_model.generate_content, [prompt], hedge=True, **config)
+            instrumentation.record_usage(response)
+            return response.text.strip()
+        parts = []
+
+        def stream():
+            chunk = None
+            for chunk in text_model.generate_content([prompt], stream=True, **config):
+                parts.append(chunk.text)
+                on_chunk(chunk.text)
+            return chunk
+
+        # Once chunks have been passed on, a retry would repeat them, so only a stream that failed
+        # before its first chunk is retried
+        chunk = UPSTREAMS["text"].call(stream, can_retry=lambda error: not parts)
+        # Streamed chunks carry running totals, so only the last one is counted
+        instrumentation.record_usage(chunk)
+        return "".join(parts).strip()
+
+def _analyze_product_image(text_model, image_data) -> str:
+    """
+    Asks Gemini for a very detailed description of the uploaded product image.
+    """
+    from vertexai.generative_models import Part
+
+    # Send a right-sized, upright copy with its real MIME type instead of the raw upload
+    upload_data, mime_type = preprocess_image(image_data)
+    image_part = Part.from_data(data=upload_data, mime_type=mime_type)
     
+    # First, we ask Gemini to create a very detailed description of the uploaded image.
+    detailed_desc_prompt = [
+        "You are a meticulous product photographer's assistant. "
+        "Describe the following image of a handcrafted product in extreme detail. "
+        "Mention the exact type of product, "
+        "the precise colors, the style of any patterns or designs, the material texture, "
+        "and the overall aesthetic. Be very specific.",
+        image_part
+    ]
+    with instrumentation.span("gemini.generate_content", model=MODEL_NAMES["text"], upload_bytes=len(upload_data)):
+        response = UPSTREAMS["text"].call(text_model.generate_content, detailed_desc_prompt)
+        instrumentation.record_usage(response)
+        return response.text.strip()
+
+def _cached_image_analysis(text_model, image_data) -> str:
+    """
+    Returns the detailed image description, calling Gemini only on a cache miss.
+    """
+    cache_key = _analysis_cache_key(image_data)
+    detailed_description_from_image = ANALYSIS_CACHE.get(cache_key)
+    instrumentation.add_to_span("cache_hits" if detailed_description_from_image is not None else "cache_misses")
+    if detailed_description_from_image is None:
+        detailed_description_from_image = _join_speculative_analysis(cache_key)
+    if detailed_description_from_image is None:
+        detailed_description_from_image, _ = SINGLE_FLIGHT["analysis"].do(
+            cache_key, _analyze_and_cache, text_model, image_data, cache_key
+        )
+    return detailed_description_from_image
+
+def _analyze_and_cache(text_model, image_data, cache_key: str) -> str:
+    detailed_description_from_image = _analyze_product_image(text_model, image_data)
+    ANALYSIS_CACHE.set(cache_key, detailed_description_from_image)
+    return detailed_description_from_image
+
+def _analysis_cache_key(image_data) -> str:
+    return content_hash(MODEL_NAMES["text"], f"{IMAGE_MAX_EDGE}:{IMAGE_QUALITY}", image_data)
+
+# --- Speculative Image Analysis ---
+# The app starts analysing a photo as soon as it is uploaded, while the user is still writing a
+# description and choosing a style. A generation for the same image joins that run instead of
+# starting its own, which hides the Gemini vision round trip behind the user's think time.
+# Runs are registered process-wide by analysis cache key and leave their result in ANALYSIS_CACHE.
+SPECULATIVE_ANALYSIS = os.getenv("KALACONNECT_SPECULATIVE_ANALYSIS", "1") == "1"
+
+_speculation_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("KALACONNECT_SPECULATION_WORKERS", "4")), thread_name_prefix="kalaconnect-speculate"
+)
+_speculations = {}  # analysis cache key -> Future
+_speculations_lock = threading.Lock()
+_speculation_stats = {"started": 0, "cancelled": 0, "joined": 0, "failed": 0, "preempted": 0}
+# Longest a generation waits for a speculative analysis that is already running before analysing itself
+SPECULATION_JOIN_TIMEOUT = float(os.getenv("KALACONNECT_SPECULATION_JOIN_TIMEOUT", "30"))
+
+def _speculative_analysis(cache_key: str, image_data) -> str:
+    with instrumentation.span("speculative.analysis"):
+        detailed_description_from_image = ANALYSIS_CACHE.get(cache_key)
+        if detailed_description_from_image is None:
+            detailed_description_from_image, _ = SINGLE_FLIGHT["analysis"].do(
+                cache_key, _analyze_and_cache, get_text_model(), image_data, cache_key
+            )
+        return detailed_description_from_image
+
+def _forget_speculation(cache_key: str, future):
+    with _speculations_lock:
+        if _speculations.get(cache_key) is future:
+            del _speculations[cache_key]
+
+def start_image_analysis(image_data):
+    """
+    Starts analysing an uploaded image in the background, ahead of the generation request.
+
     Args:
-        product_input: Text description of the product
-        image_data: Binary image data if an image was uploaded
-        image_style: "Artistic Lifestyle" or "Clean Studio Background"
-        regenerate_image_only: If True, only regenerate the image
-        regenerate_desc_only: If True, only regenerate the product description
-        regenerate_posts_only: If True, only regenerate the social media posts
+        image_data: The uploaded image bytes
+
+    Returns:
+        A Future for the detailed description (shared with any run already going for the same image),
+        or None if speculative analysis is disabled
     """
+    if not SPECULATIVE_ANALYSIS or not image_data:
+        return None
+    cache_key = _analysis_cache_key(image_data)
+    with _speculations_lock:
+        future = _speculations.get(cache_key)
+        if future is not None and not future.cancelled():
+            return future
+        # In the caller's context, so the analysis span joins the request's trace
+        future = _speculation_executor.submit(contextvars.copy_context().run, _speculative_analysis, cache_key, image_data)
+        _speculations[cache_key] = future
+        _speculation_stats["started"] += 1
+    # Outside the lock: the callback runs at once if the analysis has already finished
+    future.add_done_callback(lambda done: _forget_speculation(cache_key, done))
+    return future
+
+def cancel_image_analysis(future) -> bool:
+    """
+    Cancels a speculative analysis whose upload was replaced or removed.
+
+    Returns:
+        True if it had not started yet. A run already talking to Gemini cannot be stopped; it
+        finishes and leaves its result in the analysis cache.
+    """
+    if future is None or not future.cancel():
+        return False
+    with _speculations_lock:
+        _speculation_stats["cancelled"] += 1
+    return True
+
+def _join_speculative_analysis(cache_key: str):
+    """
+    Waits for a speculative analysis of the same image, if one is running.
+
+    An analysis still queued behind other sessions' uploads is cancelled rather than waited for: the
+    generation is on the critical path, so it analyses the image itself straight away.
+
+    Returns:
+        Its description, or None if there is none, it had not started, it failed or it took longer than
+        SPECULATION_JOIN_TIMEOUT (the caller then analyses the image itself)
+    """
+    with _speculations_lock:
+        future = _speculations.get(cache_key)
+    if future is None:
+        return None
+    if future.cancel():
+        instrumentation.set_attribute("speculative", "preempted")
+        with _speculations_lock:
+            _speculation_stats["preempted"] += 1
+        return None
+    instrumentation.set_attribute("speculative", "ready" if future.done() else "waited")
     try:
-        text_model = GenerativeModel("gemini-2.5-flash")
-        
-        # --- Step 1: Analyze the Input (Text or Image) ---
-        if image_data:
-            try:
-                image_part = Part.from_data(data=image_data, mime_type="image/jpeg")
-                
-                # First, we ask Gemini to create a very detailed description of the uploaded image.
-                detailed_desc_prompt = [
-                    "You are a meticulous product photographer's assistant. "
-                    "Describe the following image of a handcrafted product in extreme detail. "
-                    "Mention the exact type of product, "
-                    "the precise colors, the style of any patterns or designs, the material texture, "
-                    "and the overall aesthetic. Be very specific.",
-                    image_part
-                ]
-                response = text_model.generate_content(detailed_desc_prompt)
-                detailed_description_from_image = response.text.strip()
-                
-                # Use this as the base for generating content
-                base_content = detailed_description_from_image
-            except Exception as e:
-                error_msg = f"Error processing image: {str(e)}"
-                print(error_msg)
-                if 'st' in globals():
-                    st.error(error_msg)
-                # Fall back to text input if image processing fails
-                if product_input:
-                    base_content = product_input
-                    if 'st' in globals():
-                        st.warning("Image processing failed. Using text description instead.")
-                else:
-                    if 'st' in globals():
-                        st.error("Unable to process input. Please try again with a different image or text description.")
-                    return {
-                        "description": "Error: Unable to process input",
-                        "social_posts": "Error: Unable to process input",
-                        "image": None
-                    }
-        else:
-            # Use the user's text input as the source
-            base_content = product_input
+        detailed_description_from_image = future.result(timeout=SPECULATION_JOIN_TIMEOUT)
+    except Exception as e:
+        # Includes CancelledError, when the session that started it moved on to another upload, and
+        # TimeoutError
+        with _speculations_lock:
+            _speculation_stats["failed"] += 1
+        print(f"Speculative image analysis unavailable ({type(e).__name__}), analysing again")
+        return None
+    with _speculations_lock:
+        _speculation_stats["joined"] += 1
+    return detailed_description_from_image
 
-        # --- Step 2: Generate Product Description (Separate Call) ---
-        description = "Not regenerated"
-        if not regenerate_image_only and not regenerate_posts_only:
-            try:
-                desc_prompt = f"""
+def get_speculation_stats() -> dict:
+    """
+    Returns counts of speculative analyses started, cancelled, joined by a generation, preempted by a
+    generation that found them still queued, and failed.
+    """
+    with _speculations_lock:
+        stats = dict(_speculation_stats)
+        stats["in_flight"] = len(_speculations)
+    return stats
+
+def _generate_description(text_model, base_content: str, on_chunk=None) -> str:
+    """
+    Generates the e-commerce product description.
+    """
+    desc_prompt = f"""
                 You are a marketing expert for handcrafted Indian products. 
                 Based on this product: "{base_content}"
                 
@@ -267,21 +1105,14 @@ def generate_all_content(product_input: str, image_data=None, image_style="Artis
                 Make it warm, evocative, and appreciative of traditional craftsmanship.
                 Do not include any introductory text or task labels - just provide the pure product description.
                 """
-                
-                description_response = text_model.generate_content([desc_prompt])
-                description = description_response.text.strip()
-            except Exception as e:
-                error_msg = f"Error generating product description: {str(e)}"
-                print(error_msg)
-                if 'st' in globals():
-                    st.error(error_msg)
-                description = "Error: Unable to generate product description"
-
-        # --- Step 3: Generate Social Media Posts (Separate Call) ---
-        social_posts = "Not regenerated"
-        if not regenerate_image_only and not regenerate_desc_only:
-            try:
-                social_prompt = f"""
+    
+    return _complete_text(text_model, desc_prompt, on_chunk)
+
+def _generate_social_posts(text_model, base_content: str, on_chunk=None) -> str:
+    """
+    Generates three Instagram post ideas in Markdown.
+    """
+    social_prompt = f"""
                 You are a social media manager for Indian handicraft brands.
                 Based on this product: "{base_content}"
                 
@@ -311,20 +1142,33 @@ def generate_all_content(product_input: str, image_data=None, image_style="Artis
 
 Do not include any introductory text or task labels - start directly with the first post idea.
                 """
-                
-                social_response = text_model.generate_content([social_prompt])
-                social_posts = social_response.text.strip()
-            except Exception as e:
-                error_msg = f"Error generating social media posts: {str(e)}"
-                print(error_msg)
-                if 'st' in globals():
-                    st.error(error_msg)
-                social_posts = "Error: Unable to generate social media posts"
-
-        # --- Step 4: Identify Product Category for Scene-Aware Background ---
-        product_category = "other"  # Default fallback
-        try:
-            category_prompt = f"""
+    
+    return _complete_text(text_model, social_prompt, on_chunk)
+
+# --- Local Category Classifier ---
+# The category only picks the background scene, so a keyword/TF-IDF classifier answers when it is
+# confident (see category_classifier.py) and Gemini is asked only below its thresholds. Gemini's
+# answers are recorded as training samples when KALACONNECT_CACHE_DIR is set.
+LOCAL_CATEGORY = os.getenv("KALACONNECT_LOCAL_CATEGORY", "1") == "1"
+CATEGORY_CLASSIFIER = CategoryClassifier(
+    os.path.join(_cache_dir, "category_samples.jsonl") if _cache_dir else None,
+    threshold=float(os.getenv("KALACONNECT_CATEGORY_THRESHOLD", "0.5")),
+    tfidf_threshold=float(os.getenv("KALACONNECT_CATEGORY_TFIDF_THRESHOLD", "0.7"))
+)
+
+def _identify_product_category(text_model, base_content: str) -> str:
+    """
+    Returns the product category used to pick the background scene, from the local classifier when
+    it is confident and from Gemini otherwise.
+    """
+    if LOCAL_CATEGORY:
+        category, confidence, source = CATEGORY_CLASSIFIER.classify(base_content)
+        instrumentation.set_attribute("category_confidence", round(confidence, 3))
+        if category is not None:
+            instrumentation.set_attribute("category_source", source)
+            return category
+    instrumentation.set_attribute("category_source", "gemini")
+    category_prompt = f"""
             Based on the following product description, what is the single best category for this item?
             Also specify if it's a fabric pattern/swatch, small textile item, or full garment.
             Choose from: Pottery, Jewelry, Textile-Pattern, Textile-Small, Textile-Garment, Painting, Woodcraft, Metalwork, Other.
@@ -332,42 +1176,155 @@ Do not include any introductory text or task labels - start directly with the fi
             
             Respond with just the category name.
             """
-            category_response = text_model.generate_content([category_prompt])
-            product_category = category_response.text.strip().lower()
-        except Exception as e:
-            print(f"Error identifying product category: {str(e)}")
-            # Continue with default category
+    product_category = _complete_text(text_model, category_prompt).lower()
+    if LOCAL_CATEGORY:
+        CATEGORY_CLASSIFIER.record(base_content, product_category)
+    return product_category
 
-        # --- Step 5: Select an Artistic Background Scene ---
-        # Based on the category, we choose a beautiful, relevant setting.
-        background_scene = "in a beautifully styled lifestyle setting that complements its colors and textures"  # Default
-        
-        if "pottery" in product_category:
-            background_scene = "on a rustic wooden table, next to a window with soft, diffused morning light streaming in. A few dried flowers are artfully placed nearby"
-        elif "jewelry" in product_category:
-            background_scene = "delicately displayed on a natural piece of slate or dark marble, with a soft, out-of-focus background"
-        elif "textile-pattern" in product_category or "textile-small" in product_category:
-            background_scene = "professionally styled on a dress form mannequin in a bright, modern photography studio with clean white backdrop and professional lighting"
-        elif "textile-garment" in product_category:  # Full garments like sarees, dresses
-            background_scene = "beautifully styled on an elegant fashion mannequin in a sophisticated photography studio with soft, professional lighting and a clean, minimalist background"
-        elif "painting" in product_category:
-            background_scene = "hanging on a tastefully decorated, neutral-colored wall in a modern, minimalist living room, with a soft spotlight highlighting its details"
-        elif "woodcraft" in product_category:
-            background_scene = "placed on a clean, light-colored surface, with soft shadows and a hint of green foliage in the background"
-        elif "metalwork" in product_category:
-            background_scene = "artfully arranged on a textured stone surface with warm, golden lighting that highlights the metal's finish"
-
-        # --- Step 6: Construct the Final Image Prompt Based on Selected Style ---
-        if image_style == "Artistic Lifestyle":
-            final_image_prompt = f"""
+# --- Single-Shot Copy Generation ---
+# Optionally, description, social posts and category come from one JSON-schema-constrained Gemini
+# call, so the (often long) base content is sent once instead of three times. Each field is
+# validated; only the fields that fail fall back to their own per-field call.
+SINGLE_SHOT = os.getenv("KALACONNECT_SINGLE_SHOT", "0") == "1"
+
+PRODUCT_CATEGORIES = ["Pottery", "Jewelry", "Textile-Pattern", "Textile-Small", "Textile-Garment",
+                      "Painting", "Woodcraft", "Metalwork", "Other"]
+
+KIT_COPY_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "description": {"type": "string"},
+        "social_posts": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "title": {"type": "string"},
+                    "caption": {"type": "string"},
+                    "hashtags": {"type": "array", "items": {"type": "string"}}
+                },
+                "required": ["title", "caption", "hashtags"]
+            }
+        },
+        "category": {"type": "string", "enum": PRODUCT_CATEGORIES}
+    },
+    "required": ["description", "social_posts", "category"]
+}
+
+KIT_COPY_FIELDS = ("description", "social_posts", "category")
+
+def _kit_copy_generation_config():
+    """
+    Returns the JSON-mode generation config for the single-shot call. It has to be a GenerationConfig:
+    the SDK passes a plain dict straight to the request proto, which rejects the schema's type names.
+    """
+    from vertexai.generative_models import GenerationConfig
+
+    return GenerationConfig(response_mime_type="application/json", response_schema=KIT_COPY_SCHEMA)
+
+def _generate_kit_copy(text_model, base_content: str) -> dict:
+    """
+    Asks Gemini for the description, three social posts and the category in one JSON response.
+    Returns the parsed object; raises if the response is not JSON.
+    """
+    kit_prompt = f"""
+                You are a marketing expert and social media manager for handcrafted Indian products.
+                Based on this product: "{base_content}"
+                
+                Respond with a JSON object with these fields:
+                - "description": a compelling and beautiful product description (around 100-150 words) for an
+                  e-commerce website. Make it warm, evocative, and appreciative of traditional craftsmanship.
+                  Just the pure product description, with no introductory text or task labels.
+                - "social_posts": exactly 3 Instagram post ideas, each with a creative "title", an engaging
+                  "caption" and a list of relevant "hashtags".
+                - "category": the single best category for this item, one of: {", ".join(PRODUCT_CATEGORIES)}.
+                  Textile-Pattern is a fabric pattern/swatch, Textile-Small a small textile item and
+                  Textile-Garment a full garment.
+                """
+    text = _complete_text(text_model, kit_prompt, generation_config=_kit_copy_generation_config())
+    # Tolerate a Markdown code fence around the JSON
+    text = re.sub(r"^```(?:json)?\s*|\s*```$", "", text)
+    return json.loads(text)
+
+def _format_social_posts(posts: list) -> str:
+    """
+    Renders structured posts in the same Markdown layout the per-field social posts prompt asks for.
+    """
+    blocks = []
+    for number, post in enumerate(posts, start=1):
+        hashtags = " ".join(tag if tag.startswith("#") else f"#{tag}" for tag in (tag.strip() for tag in post["hashtags"]) if tag)
+        blocks.append(
+            f"## Instagram Post Idea {number}: {post['title'].strip()}\n\n"
+            f"**Caption:** {post['caption'].strip()}\n\n"
+            f"**Hashtags:** {hashtags}"
+        )
+    return "\n\n---\n\n".join(blocks)
+
+def _validate_kit_copy(data) -> dict:
+    """
+    Returns the fields of a single-shot response that pass validation, converted to the values the
+    per-field steps produce (Markdown posts, lower-case category). Invalid fields are left out.
+    """
+    valid = {}
+    if not isinstance(data, dict):
+        return valid
+
+    description = data.get("description")
+    if isinstance(description, str) and len(description.split()) >= 10:
+        valid["description"] = description.strip()
+
+    posts = data.get("social_posts")
+    if isinstance(posts, list) and len(posts) == 3 and all(
+        isinstance(post, dict)
+        and isinstance(post.get("title"), str) and post["title"].strip()
+        and isinstance(post.get("caption"), str) and post["caption"].strip()
+        and isinstance(post.get("hashtags"), list) and post["hashtags"]
+        and all(isinstance(tag, str) for tag in post["hashtags"])
+        for post in posts
+    ):
+        valid["social_posts"] = _format_social_posts(posts)
+
+    category = data.get("category")
+    if isinstance(category, str) and category.strip().lower() in (name.lower() for name in PRODUCT_CATEGORIES):
+        valid["category"] = category.strip().lower()
+    return valid
+
+def _select_background_scene(product_category: str) -> str:
+    """
+    Based on the category, we choose a beautiful, relevant setting.
+    """
+    background_scene = "in a beautifully styled lifestyle setting that complements its colors and textures"  # Default
+    
+    if "pottery" in product_category:
+        background_scene = "on a rustic wooden table, next to a window with soft, diffused morning light streaming in. A few dried flowers are artfully placed nearby"
+    elif "jewelry" in product_category:
+        background_scene = "delicately displayed on a natural piece of slate or dark marble, with a soft, out-of-focus background"
+    elif "textile-pattern" in product_category or "textile-small" in product_category:
+        background_scene = "professionally styled on a dress form mannequin in a bright, modern photography studio with clean white backdrop and professional lighting"
+    elif "textile-garment" in product_category:  # Full garments like sarees, dresses
+        background_scene = "beautifully styled on an elegant fashion mannequin in a sophisticated photography studio with soft, professional lighting and a clean, minimalist background"
+    elif "painting" in product_category:
+        background_scene = "hanging on a tastefully decorated, neutral-colored wall in a modern, minimalist living room, with a soft spotlight highlighting its details"
+    elif "woodcraft" in product_category:
+        background_scene = "placed on a clean, light-colored surface, with soft shadows and a hint of green foliage in the background"
+    elif "metalwork" in product_category:
+        background_scene = "artfully arranged on a textured stone surface with warm, golden lighting that highlights the metal's finish"
+    return background_scene
+
+def _build_image_prompt(base_content: str, background_scene: str, image_style: str) -> str:
+    """
+    Constructs the final Imagen prompt based on the selected style.
+    """
+    if image_style == "Artistic Lifestyle":
+        return f"""
             A hyper-realistic, artistic lifestyle photograph of: {base_content}.
             The product is featured {background_scene}.
             The image should have a shallow depth of field, making the product the sharp focus.
             The mood is warm, serene, and authentic.
             Photographed with a professional DSLR camera, cinematic quality, 8k resolution.
             """
-        else:  # Clean Studio Background
-            final_image_prompt = f"""
+    else:  # Clean Studio Background
+        return f"""
             A clean, professional product photography of: {base_content}.
             The product is centered on a simple white or light gray background with subtle shadows.
             The lighting is bright, even, and highlights all details and textures of the product.
@@ -375,31 +1332,433 @@ Do not include any introductory text or task labels - start directly with the fi
             Commercial product photography style, perfect for e-commerce, 8k resolution.
             """
 
-        # --- Step 7: Generate Image (Unless skipping for regenerate options) ---
-        generated_image_bytes = None
-        if not regenerate_desc_only and not regenerate_posts_only:
-            generated_image_bytes = _generate_product_image(final_image_prompt)
+# --- Generation Step Graph ---
+# analysis -> description / social_posts / category -> image_prompt -> image
+# Steps raise on failure; errors are reported from the calling thread.
+def _analysis_step(inputs: dict) -> str:
+    if inputs["image_data"]:
+        return _cached_image_analysis(inputs["text_model"], inputs["image_data"])
+    # Use the user's text input as the source
+    return inputs["product_input"]
+
+def _analysis_fallback(inputs: dict, error: Exception) -> str:
+    # Fall back to text input if image processing fails
+    if inputs["product_input"]:
+        return inputs["product_input"]
+    raise error
+
+def _image_prompt_step(inputs: dict) -> str:
+    background_scene = _select_background_scene(inputs["category"])
+    return _build_image_prompt(inputs["analysis"], background_scene, inputs["image_style"])
+
+def _chunk_sink(inputs: dict, field: str):
+    """
+    Returns a callable forwarding streamed text for `field`, or None when the run is not streaming.
+    """
+    on_chunk = inputs.get("on_chunk")
+    if on_chunk is None:
+        return None
+    return lambda text: on_chunk(field, text)
+
+GENERATION_PIPELINE = Pipeline([
+    Step("analysis", instrumentation.traced("analysis")(_analysis_step), fallback=_analysis_fallback),
+    Step("description", instrumentation.traced("description")(
+        lambda inputs: _generate_description(inputs["text_model"], inputs["analysis"], _chunk_sink(inputs, "description"))),
+         requires=["analysis"]),
+    Step("social_posts", instrumentation.traced("social_posts")(
+        lambda inputs: _generate_social_posts(inputs["text_model"], inputs["analysis"], _chunk_sink(inputs, "social_posts"))),
+         requires=["analysis"]),
+    Step("category", instrumentation.traced("category")(
+        lambda inputs: _identify_product_category(inputs["text_model"], inputs["analysis"])),
+         requires=["analysis"], fallback=lambda inputs, error: "other"),  # Continue with default category
+    Step("image_prompt", instrumentation.traced("image_prompt")(_image_prompt_step), requires=["analysis", "category"]),
+    Step("image", instrumentation.traced("image")(
+        lambda inputs: _request_product_images(inputs["image_prompt"], inputs["number_of_images"], inputs.get("image_model"))),
+         requires=["image_prompt"]),
+])
+
+def _kit_copy_step(inputs: dict) -> dict:
+    valid = _validate_kit_copy(_generate_kit_copy(inputs["text_model"], inputs["analysis"]))
+    instrumentation.set_attribute("invalid_fields", ",".join(field for field in KIT_COPY_FIELDS if field not in valid))
+    return valid
+
+def _from_kit_copy(field: str, generate):
+    """
+    Returns a step using the single-shot value for `field`, or `generate` if it failed validation.
+    """
+    def step(inputs):
+        value = inputs["kit_copy"].get(field)
+        if value is not None:
+            return value
+        instrumentation.set_attribute("fallback", True)
+        return generate(inputs)
+    return instrumentation.traced(field)(step)
+
+# Same graph with description, social posts and category taken from one structured call
+SINGLE_SHOT_PIPELINE = Pipeline([
+    GENERATION_PIPELINE.steps["analysis"],
+    # Falls back to an empty result, so every field uses its per-field call
+    Step("kit_copy", instrumentation.traced("kit_copy")(_kit_copy_step), requires=["analysis"],
+         fallback=lambda inputs, error: {}),
+    Step("description", _from_kit_copy("description", lambda inputs: _generate_description(
+        inputs["text_model"], inputs["analysis"], _chunk_sink(inputs, "description"))),
+         requires=["analysis", "kit_copy"]),
+    Step("social_posts", _from_kit_copy("social_posts", lambda inputs: _generate_social_posts(
+        inputs["text_model"], inputs["analysis"], _chunk_sink(inputs, "social_posts"))),
+         requires=["analysis", "kit_copy"]),
+    Step("category", _from_kit_copy("category", lambda inputs: _identify_product_category(
+        inputs["text_model"], inputs["analysis"])),
+         requires=["analysis", "kit_copy"], fallback=lambda inputs, error: "other"),  # Continue with default category
+    GENERATION_PIPELINE.steps["image_prompt"],
+    GENERATION_PIPELINE.steps["image"],
+])
+
+def _generation_pipeline(outputs: list, single_shot=None) -> Pipeline:
+    """
+    Returns the single-shot graph when it is enabled and both text fields are wanted; partial
+    regenerations keep their cheaper per-field calls.
+    """
+    single_shot = SINGLE_SHOT if single_shot is None else single_shot
+    if single_shot and "description" in outputs and "social_posts" in outputs:
+        return SINGLE_SHOT_PIPELINE
+    return GENERATION_PIPELINE
+
+def _requested_outputs(regenerate_image_only=False, regenerate_desc_only=False, regenerate_posts_only=False) -> list:
+    """
+    Maps the regenerate flags to the pipeline steps whose results are returned.
+    """
+    outputs = []
+    if not regenerate_image_only and not regenerate_posts_only:
+        outputs.append("description")
+    if not regenerate_image_only and not regenerate_desc_only:
+        outputs.append("social_posts")
+    if not regenerate_desc_only and not regenerate_posts_only:
+        outputs.append("image")
+    return outputs
+
+def plan_generation_steps(regenerate_image_only=False, regenerate_desc_only=False, regenerate_posts_only=False,
+                          single_shot=None) -> list:
+    """
+    Returns the pipeline steps generate_all_content would run for the given flags, in order.
+    
+    For example, regenerate_desc_only=True plans ["analysis", "description"] and never classifies the category.
+    """
+    outputs = _requested_outputs(regenerate_image_only, regenerate_desc_only, regenerate_posts_only)
+    return _generation_pipeline(outputs, single_shot).plan(outputs)
+
+def _step_outcome(name: str, run) -> tuple:
+    """
+    Maps a settled step to the value returned to callers and the messages to report.
+    
+    Returns:
+        (value, messages) where messages is a list of (level, text) with level "error", "warning" or "log"
+    """
+    error = run.errors.get(name)
+    if name == "analysis":
+        if error is None:
+            return run.results["analysis"], []
+        messages = [("error", f"Error processing image: {str(error)}")]
+        if run.ok("analysis"):
+            messages.append(("warning", "Image processing failed. Using text description instead."))
+            return run.results["analysis"], messages
+        messages.append(("error", "Unable to process input. Please try again with a different image or text description."))
+        return "Error: Unable to process input", messages
+    if name == "category":
+        messages = [("log", f"Error identifying product category: {str(error)}")] if error is not None else []
+        return run.results.get("category"), messages
+    if name == "kit_copy":
+        messages = [("log", f"Single-shot generation failed, using per-field calls: {str(error)}")] if error is not None else []
+        return run.results.get("kit_copy"), messages
+    if run.ok(name):
+        return run.results[name], []
+    if name == "description":
+        return "Error: Unable to generate product description", [("error", f"Error generating product description: {str(error)}")]
+    if name == "social_posts":
+        return "Error: Unable to generate social media posts", [("error", f"Error generating social media posts: {str(error)}")]
+    if name == "image":
+        return None, [("error", f"Image generation failed: {str(error)}")]
+    return run.results.get(name), []
+
+def _report(level: str, message: str, on_message=None):
+    """
+    Prints a step message and passes errors and warnings to on_message, if given.
+    """
+    if level != "warning":
+        print(message)
+    if on_message is not None and level in ("error", "warning"):
+        on_message(level, message)
+
+def _new_results() -> dict:
+    return {
+        "description": "Not regenerated",
+        "social_posts": "Not regenerated",
+        "image": None,
+        "image_variants": [],
+        "image_prompt": None,
+        "category": None
+    }
+
+def _error_results(message: str) -> dict:
+    results = _new_results()
+    results["description"] = message
+    results["social_posts"] = message
+    return results
+
+def _apply_outcome(results: dict, name: str, value, outputs: list):
+    """
+    Stores a step's value in the result dict. The image step yields a list of candidates.
+    """
+    if name == "image":
+        results["image_variants"] = value or []
+        results["image"] = results["image_variants"][0] if results["image_variants"] else None
+    elif name in ("image_prompt", "category"):
+        results[name] = value
+    elif name in outputs:
+        results[name] = value
+
+def _generation_inputs(product_input: str, image_data, image_style: str, number_of_images: int = 1, on_chunk=None,
+                       text_model=None, image_model=None) -> dict:
+    return {
+        "text_model": text_model or get_text_model(),
+        "image_model": image_model,
+        "product_input": product_input,
+        "image_data": image_data,
+        "image_style": image_style,
+        "number_of_images": number_of_images,
+        "on_chunk": on_chunk
+    }
+
+def _is_full_kit(outputs: list) -> bool:
+    return set(outputs) == {"description", "social_posts", "image"}
+
+def _cached_kit(cache_key: str, number_of_images: int = 1):
+    """
+    Returns a result dict for a cached kit with at least `number_of_images` images, or None.
+    """
+    cached = KIT_CACHE.get(cache_key)
+    if cached is not None and len(cached["image_variants"]) < number_of_images:
+        cached = None
+    instrumentation.set_attribute("kit_cache", "hit" if cached is not None else "miss")
+    instrumentation.add_to_span("cache_hits" if cached is not None else "cache_misses")
+    if cached is None:
+        return None
+    results = _new_results()
+    results.update({field: cached[field] for field in KIT_CACHE_FIELDS})
+    results["image_variants"] = list(cached["image_variants"][:number_of_images])
+    results["image"] = results["image_variants"][0]
+    return results
+
+def _store_kit(cache_key: str, results: dict, messages: list):
+    """
+    Caches a full kit, unless any step failed or fell back (reported as an error or warning).
+    """
+    if not results["image_variants"] or any(level != "log" for level, _ in messages):
+        return
+    KIT_CACHE.set(cache_key, {field: results[field] for field in KIT_CACHE_FIELDS})
+
+# --- Streamlit-Free Generation Core ---
+def run_generation(product_input: str, image_data=None, image_style="Artistic Lifestyle",
+                   regenerate_image_only=False, regenerate_desc_only=False, regenerate_posts_only=False,
+                   parallel=False, step_timeouts=None, number_of_images=1, text_model=None, image_model=None,
+                   single_shot=None, force_fresh=False):
+    """
+    Runs the generation pipeline and returns its messages instead of showing them, so it can be
+    used outside Streamlit (see service.py). Raises only for errors outside the steps.
+    
+    Args:
+        text_model: Optional model to use instead of the shared Gemini model
+        image_model: Optional model to use instead of the shared Imagen model
+        (the other arguments are the same as generate_all_content)
+    
+    Full kits are served from and stored in KIT_CACHE unless force_fresh is set.
+    
+    Returns:
+        (results, messages) where results is generate_all_content's dict and messages is a list of
+        (level, text) with level "error", "warning" or "log", in plan order
+    """
+    outputs = _requested_outputs(regenerate_image_only, regenerate_desc_only, regenerate_posts_only)
+    
+    pipeline = _generation_pipeline(outputs, single_shot)
+    cache_key = kit_cache_key(product_input, image_data, image_style)
+    
+    with instrumentation.span("generate", outputs=",".join(outputs), parallel=parallel,
+                              single_shot=pipeline is SINGLE_SHOT_PIPELINE, force_fresh=force_fresh):
+        if _is_full_kit(outputs) and not force_fresh:
+            cached = _cached_kit(cache_key, number_of_images)
+            if cached is not None:
+                return cached, [("log", "Kit served from cache")]
+        elif force_fresh:
+            # The caller wants a different version of part of this kit; stop serving the cached one
+            KIT_CACHE.delete(cache_key)
+        run = pipeline.run(
+            outputs,
+            _generation_inputs(product_input, image_data, image_style, number_of_images,
+                               text_model=text_model, image_model=image_model),
+            parallel=parallel,
+            timeouts={**STEP_TIMEOUTS, **(step_timeouts or {})}
+        )
+
+    # Steps 1-7: collect each planned step's value and its messages, in plan order
+    results = _new_results()
+    messages = []
+    for name in run.plan:
+        value, step_messages = _step_outcome(name, run)
+        messages.extend(step_messages)
+        if name == "analysis" and not run.ok("analysis"):
+            return _error_results(value), messages
+        _apply_outcome(results, name, value, outputs)
+    if _is_full_kit(outputs):
+        _store_kit(cache_key, results, messages)
+    return results, messages
+
+# --- Main Orchestration Function (Now with two-step prompting for better image accuracy) ---
+def generate_all_content(product_input: str, image_data=None, image_style="Artistic Lifestyle", 
+                        regenerate_image_only=False, regenerate_desc_only=False, regenerate_posts_only=False,
+                        parallel=False, step_timeouts=None, number_of_images=1, single_shot=None, force_fresh=False,
+                        on_message=None):
+    """
+    Generates all content based on text and/or an uploaded image using two-step prompting for better accuracy.
+    Only the steps needed for the requested outputs are run (see plan_generation_steps).
+    
+    Args:
+        product_input: Text description of the product
+        image_data: Binary image data if an image was uploaded
+        image_style: "Artistic Lifestyle" or "Clean Studio Background"
+        regenerate_image_only: If True, only regenerate the image
+        regenerate_desc_only: If True, only regenerate the product description
+        regenerate_posts_only: If True, only regenerate the social media posts
+        parallel: If True, run independent steps (description, social posts, category -> image) in parallel
+        step_timeouts: Optional per-step timeout overrides in seconds (see STEP_TIMEOUTS), parallel mode only
+        number_of_images: Number of image candidates to request from Imagen in one call (1-4)
+        single_shot: If True, get description, social posts and category from one structured Gemini
+                     call when both text fields are requested (default: KALACONNECT_SINGLE_SHOT)
+        force_fresh: If True, bypass KIT_CACHE and drop any kit cached for these inputs
+                     (used by the regenerate buttons)
+        on_message: Optional callable(level, text) that shows the errors and warnings to the user
+                    ("error" or "warning"); they are printed either way
+    
+    Returns:
+        Dictionary with 'description', 'social_posts' and 'image' (the first candidate), plus
+        'image_variants' (all candidates), 'image_prompt' (reusable with generate_image_variants)
+        and 'category' (when it was classified)
+    """
+    try:
+        results, messages = run_generation(
+            product_input, image_data, image_style,
+            regenerate_image_only=regenerate_image_only,
+            regenerate_desc_only=regenerate_desc_only,
+            regenerate_posts_only=regenerate_posts_only,
+            parallel=parallel,
+            step_timeouts=step_timeouts,
+            number_of_images=number_of_images,
+            single_shot=single_shot,
+            force_fresh=force_fresh
+        )
+        for level, message in messages:
+            _report(level, message, on_message)
 
         # --- Step 8: Return all results ---
-        return {
-            "description": description,
-            "social_posts": social_posts,
-            "image": generated_image_bytes
-        }
+        return results
         
     except Exception as e:
         error_msg = f"Error in content generation: {str(e)}"
-        print(error_msg)
-        if 'st' in globals():
-            st.error(error_msg)
-            st.error("Please check your Google Cloud credentials and try again.")
+        _report("error", error_msg, on_message)
+        _report("error", "Please check your Google Cloud credentials and try again.", on_message)
         
         # Return a consistent response structure even on error
-        return {
-            "description": "Error: Unable to generate content",
-            "social_posts": "Error: Unable to generate content",
-            "image": None
-        }
+        return _error_results("Error: Unable to generate content")
+
+# --- Streaming Orchestration ---
+def stream_all_content(product_input: str, image_data=None, image_style="Artistic Lifestyle",
+                       regenerate_image_only=False, regenerate_desc_only=False, regenerate_posts_only=False,
+                       step_timeouts=None, number_of_images=1, single_shot=None, force_fresh=False):
+    """
+    Streams the marketing kit as it is generated: partial text from Gemini's streaming responses and
+    each finished artifact as soon as it is ready, while the image is still being generated.
+    
+    Takes the same arguments as generate_all_content and always runs independent steps in parallel.
+    Messages are yielded rather than shown, so the caller decides how to render them.
+    In single-shot mode, and for kits served from KIT_CACHE, the text fields arrive as whole artifacts,
+    without chunks.
+    
+    Yields dicts with a "type" key:
+        {"type": "chunk", "field": "description" | "social_posts", "text": str}
+        {"type": "artifact", "field": "description" | "social_posts" | "image", "value": str | bytes | None}
+            (for "image", the value is the first candidate; all of them are in the final results)
+        {"type": "message", "level": "error" | "warning", "text": str}
+        {"type": "done", "results": dict}  (same dict as generate_all_content, always last)
+    """
+    outputs = _requested_outputs(regenerate_image_only, regenerate_desc_only, regenerate_posts_only)
+    pipeline = _generation_pipeline(outputs, single_shot)
+    cache_key = kit_cache_key(product_input, image_data, image_style)
+    events = queue.Queue()
+    results = _new_results()
+    step_messages = []
+
+    def on_chunk(field, text):
+        events.put({"type": "chunk", "field": field, "text": text})
+
+    def on_step_done(name, run):
+        value, messages = _step_outcome(name, run)
+        step_messages.extend(messages)
+        for level, message in messages:
+            if level == "log":
+                print(message)
+            else:
+                events.put({"type": "message", "level": level, "text": message})
+        if name == "analysis" and not run.ok("analysis"):
+            results.update(_error_results(value))
+            return
+        _apply_outcome(results, name, value, outputs)
+        if name in outputs:
+            events.put({"type": "artifact", "field": name, "value": results[name]})
+
+    def worker():
+        try:
+            with instrumentation.span("generate", outputs=",".join(outputs), parallel=True, streamed=True,
+                                      single_shot=pipeline is SINGLE_SHOT_PIPELINE, force_fresh=force_fresh):
+                cached = None
+                if _is_full_kit(outputs) and not force_fresh:
+                    cached = _cached_kit(cache_key, number_of_images)
+                elif force_fresh:
+                    KIT_CACHE.delete(cache_key)
+                if cached is not None:
+                    print("Kit served from cache")
+                    results.update(cached)
+                    for name in outputs:
+                        events.put({"type": "artifact", "field": name, "value": results[name]})
+                else:
+                    run = pipeline.run(
+                        outputs,
+                        _generation_inputs(product_input, image_data, image_style, number_of_images, on_chunk=on_chunk),
+                        parallel=True,
+                        timeouts={**STEP_TIMEOUTS, **(step_timeouts or {})},
+                        on_step_done=on_step_done
+                    )
+                    if _is_full_kit(outputs) and run.ok("analysis"):
+                        _store_kit(cache_key, results, step_messages)
+        except Exception as e:
+            error_msg = f"Error in content generation: {str(e)}"
+            print(error_msg)
+            events.put({"type": "message", "level": "error", "text": error_msg})
+            results.update(_error_results("Error: Unable to generate content"))
+        events.put(None)
+
+    # The worker runs in a copy of this context so its spans join the caller's trace
+    threading.Thread(target=contextvars.copy_context().run, args=(worker,), name="kalaconnect-stream", daemon=True).start()
+    while True:
+        event = events.get()
+        if event is None:
+            break
+        yield event
+    yield {"type": "done", "results": results}
+
+# --- Record/Replay ---
+# KALACONNECT_REPLAY_MODE=record saves every model and Translate response to KALACONNECT_REPLAY_DIR;
+# =replay serves them back without Google Cloud, so the app, batch mode and this file's test run offline.
+if os.getenv("KALACONNECT_REPLAY_MODE"):
+    import replay
+    replay.install_from_env(sys.modules[__name__])
 
 # --- For Testing ---
 if __name__ == '__main__':
@@ -0,0 +1,252 @@
+"""
+Batch catalog mode: generate marketing kits for a whole folder of images or a CSV/JSONL of products.
+
+Usage:
+    python batch.py products/ --out catalog_out
+    python batch.py products.csv --out catalog_out --concurrency 8 --rate 2
+    python batch.py products.jsonl --out catalog_out --fake   # offline, against local fake models
+
+CSV/JSONL rows accept the keys: id, description, image (path, relative to the file), style.
+Results are appended to <out>/manifest.jsonl and images written to <out>/images/. Re-running with
+the same --out skips products already marked "ok", so interrupted runs resume where they stopped.
+Model calls run at batch priority (see scheduler.py), behind any interactive requests in the process.
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import backend
+import scheduler
+from cache import content_hash
+from image_utils import FILE_EXTENSIONS, sniff_mime_type
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+class RateLimiter:
+    """
+    Spaces out calls so that at most `rate` start per second across all threads.
+    """
+
+    def __init__(self, rate: float = None):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        time.sleep(max(0.0, start - now))
+
+
+def load_items(source: str) -> list:
+    """
+    Reads products from a directory of images or a .csv/.jsonl file.
+
+    Returns:
+        List of dicts with "id", "description", "image_path" and "style" keys
+    """
+    items = []
+    if os.path.isdir(source):
+        for name in sorted(os.listdir(source)):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                items.append({
+                    "id": os.path.splitext(name)[0],
+                    "description": "",
+                    "image_path": os.path.join(source, name),
+                    "style": None
+                })
+        return items
+
+    base_dir = os.path.dirname(os.path.abspath(source))
+    with open(source, "r", encoding="utf-8", newline="") as f:
+        if source.lower().endswith(".csv"):
+            rows = list(csv.DictReader(f))
+        else:
+            rows = [json.loads(line) for line in f if line.strip()]
+
+    for index, row in enumerate(rows):
+        image = (row.get("image") or "").strip()
+        items.append({
+            "id": str(row.get("id") or index + 1),
+            "description": (row.get("description") or "").strip(),
+            "image_path": os.path.join(base_dir, image) if image else None,
+            "style": (row.get("style") or "").strip() or None
+        })
+    return items
+
+
+def image_file_name(item_id: str, image_data: bytes) -> str:
+    """
+    Returns the file name for an item's image inside <out>/images/. Characters other than letters,
+    digits, "-", "_" and "." are replaced, and a short hash of the id is added when that changed it, so
+    ids like "../x" stay inside the directory and "a/b" and "a_b" get different files. The extension
+    comes from the image's actual format.
+    """
+    stem = re.sub(r"[^A-Za-z0-9_.-]", "_", item_id).strip(".")
+    if stem != item_id:
+        stem = f"{stem or 'item'}-{content_hash(item_id)[:8]}"
+    return f"{stem}.{FILE_EXTENSIONS.get(sniff_mime_type(image_data, default='image/png'), 'png')}"
+
+
+def load_completed(manifest_path: str) -> set:
+    """
+    Returns the ids already generated successfully according to the manifest.
+    """
+    completed = set()
+    if not os.path.exists(manifest_path):
+        return completed
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # A line cut short by an interrupted run
+                continue
+            if entry.get("status") == "ok":
+                completed.add(entry["id"])
+    return completed
+
+
+def _kit_failures(results: dict) -> list:
+    """
+    Returns the names of the kit fields that came back as errors.
+    """
+    failures = [field for field in ("description", "social_posts") if str(results[field]).startswith("Error:")]
+    if results["image"] is None:
+        failures.append("image")
+    return failures
+
+
+def _process_item(item: dict, output_dir: str, image_style: str, limiter: RateLimiter,
+                  retries: int, backoff: float) -> dict:
+    """
+    Generates one kit, retrying with exponential backoff and jitter while any field fails.
+    """
+    started = time.monotonic()
+    entry = {"id": item["id"], "status": "failed", "attempts": 0}
+    try:
+        image_data = None
+        if item["image_path"]:
+            with open(item["image_path"], "rb") as f:
+                image_data = f.read()
+
+        for attempt in range(retries + 1):
+            if attempt:
+                time.sleep(backoff * (2 ** (attempt - 1)) * (1 + random.random()))
+            limiter.wait()
+            entry["attempts"] = attempt + 1
+            results = backend.generate_all_content(
+                item["description"], image_data, image_style=item["style"] or image_style, parallel=True
+            )
+            failures = _kit_failures(results)
+            if not failures:
+                break
+
+        entry["description"] = results["description"]
+        entry["social_posts"] = results["social_posts"]
+        entry["image_path"] = None
+        if results["image"] is not None:
+            image_path = os.path.join("images", image_file_name(item["id"], results["image"]))
+            with open(os.path.join(output_dir, image_path), "wb") as f:
+                f.write(results["image"])
+            entry["image_path"] = image_path
+        entry["status"] = "ok" if not failures else "failed"
+        if failures:
+            entry["error"] = f"Failed fields: {', '.join(failures)}"
+    except Exception as e:
+        entry["error"] = str(e)
+    entry["elapsed"] = round(time.monotonic() - started, 3)
+    return entry
+
+
+def run_batch(items: list, output_dir: str, image_style: str = "Artistic Lifestyle", concurrency: int = 4,
+              rate: float = None, retries: int = 2, backoff: float = 1.0, progress=None) -> dict:
+    """
+    Generates marketing kits for `items` (see load_items) and appends them to <output_dir>/manifest.jsonl.
+
+    Args:
+        items: Products to generate
+        output_dir: Directory for the manifest and images; existing "ok" entries are skipped
+        image_style: Default image style for rows without one
+        concurrency: Maximum number of kits generated at the same time
+        rate: Maximum number of kit generations started per second (None for unlimited)
+        retries: Extra attempts for kits with failed fields
+        backoff: Base delay in seconds between attempts, doubled each time
+        progress: Optional callable(entry) invoked after each kit
+
+    Returns:
+        Summary dict with counts and throughput
+    """
+    os.makedirs(os.path.join(output_dir, "images"), exist_ok=True)
+    manifest_path = os.path.join(output_dir, "manifest.jsonl")
+    completed = load_completed(manifest_path)
+    pending = [item for item in items if item["id"] not in completed]
+
+    limiter = RateLimiter(rate)
+    manifest_lock = threading.Lock()
+    summary = {"total": len(items), "skipped": len(items) - len(pending), "ok": 0, "failed": 0}
+    started = time.monotonic()
+
+    def work(item):
+        # Batch priority: interactive users of the same process get the models first
+        with scheduler.priority("batch"):
+            entry = _process_item(item, output_dir, image_style, limiter, retries, backoff)
+        with manifest_lock:
+            # Checkpoint every kit as soon as it finishes
+            with open(manifest_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                f.flush()
+            summary[entry["status"]] += 1
+            if progress:
+                progress(entry)
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        list(executor.map(work, pending))
+
+    summary["elapsed"] = round(time.monotonic() - started, 3)
+    summary["kits_per_minute"] = round(60 * len(pending) / summary["elapsed"], 2) if summary["elapsed"] else 0.0
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", help="Directory of product images, or a .csv/.jsonl file of products")
+    parser.add_argument("--out", required=True, help="Output directory for manifest.jsonl and images/")
+    parser.add_argument("--style", default="Artistic Lifestyle", choices=["Artistic Lifestyle", "Clean Studio Background"])
+    parser.add_argument("--concurrency", type=int, default=4, help="Kits generated at the same time")
+    parser.add_argument("--rate", type=float, default=None, help="Maximum kits started per second")
+    parser.add_argument("--retries", type=int, default=2, help="Extra attempts for kits with failed fields")
+    parser.add_argument("--backoff", type=float, default=1.0, help="Base retry delay in seconds")
+    parser.add_argument("--fake", action="store_true", help="Use local fake models instead of Vertex AI")
+    parser.add_argument("--fake-text-latency", type=float, default=0.5)
+    parser.add_argument("--fake-image-latency", type=float, default=2.0)
+    args = parser.parse_args()
+
+    if args.fake:
+        from fake_models import fake_model_classes
+        text_model_cls, image_model_cls = fake_model_classes(args.fake_text_latency, args.fake_image_latency)
+        backend.configure_models(text_factory=text_model_cls, image_factory=image_model_cls.from_pretrained)
+
+    items = load_items(args.source)
+
+    def progress(entry):
+        print(f"[{entry['status']}] {entry['id']} ({entry['attempts']} attempt(s), {entry['elapsed']}s)")
+
+    summary = run_batch(items, args.out, image_style=args.style, concurrency=args.concurrency,
+                        rate=args.rate, retries=args.retries, backoff=args.backoff, progress=progress)
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Accuracy, coverage and latency of the local category classifier on a labelled sample set.
+
+"local" is the share of samples answered without Gemini at that confidence threshold and
+"accuracy" the share of those answered correctly. TF-IDF rows are cross-validated: each fold is
+classified by a model trained on the other folds. The bundled sample set is small; the TF-IDF stage
+is meant for the samples recorded from Gemini's answers (category_samples.jsonl in the cache dir).
+
+Usage:
+    python benchmarks/bench_category.py
+    python benchmarks/bench_category.py --samples .kalaconnect_cache/category_samples.jsonl --folds 5
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from category_classifier import CategoryClassifier
+
+DEFAULT_SAMPLES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "category_samples.jsonl")
+
+
+def _cross_validated(samples: list, folds: int, predict) -> list:
+    """
+    Returns predict(classifier, text) for every sample, each fold using a model trained on the others.
+    """
+    predictions = [None] * len(samples)
+    for fold in range(folds):
+        classifier = CategoryClassifier(min_samples=1)
+        classifier.train([sample for index, sample in enumerate(samples) if index % folds != fold], validate=False)
+        for index in range(fold, len(samples), folds):
+            predictions[index] = predict(classifier, samples[index][0])
+    return predictions
+
+
+def _row(name: str, samples: list, predictions: list):
+    answered = [(category, predicted) for (_, category), (predicted, _) in zip(samples, predictions)
+                if predicted is not None]
+    correct = sum(1 for category, predicted in answered if category == predicted)
+    accuracy = correct / len(answered) if answered else 0.0
+    print(f"{name:34} {len(answered) / len(samples):7.0%} {accuracy:9.0%}")
+
+
+def _thresholded(predictions: list, threshold: float) -> list:
+    return [(category if confidence >= threshold else None, confidence) for category, confidence in predictions]
+
+
+def _latency_us(predict, samples: list, repeat: int = 20) -> float:
+    timings = []
+    for _ in range(repeat):
+        for text, _ in samples:
+            start = time.perf_counter()
+            predict(text)
+            timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", default=DEFAULT_SAMPLES, help="JSON lines of {\"text\", \"category\"}")
+    parser.add_argument("--folds", type=int, default=5)
+    args = parser.parse_args()
+
+    samples = CategoryClassifier(args.samples).load_samples()
+    lexicon = CategoryClassifier(use_tfidf=False)
+    print(f"{len(samples)} labelled samples from {args.samples}")
+    print(f"{'classifier':34} {'local':>7} {'accuracy':>9}")
+
+    lexicon_predictions = [lexicon.predict_lexicon(text) for text, _ in samples]
+    for threshold in (0.0, 0.4, 0.5, 0.6):
+        _row(f"lexicon, confidence >= {threshold}", samples, _thresholded(lexicon_predictions, threshold))
+    tfidf_predictions = _cross_validated(samples, args.folds, lambda classifier, text: classifier.predict_tfidf(text))
+    for threshold in (0.0, 0.5, 0.7):
+        _row(f"tf-idf (cv), confidence >= {threshold}", samples, _thresholded(tfidf_predictions, threshold))
+    _row("two-stage (cv), default thresholds", samples,
+         [result[:2] for result in _cross_validated(samples, args.folds,
+                                                   lambda classifier, text: classifier.classify(text))])
+
+    trained = CategoryClassifier(min_samples=1)
+    trained.train(samples, validate=False)
+    print(f"median latency per text: lexicon {_latency_us(lexicon.predict_lexicon, samples):.0f}us, "
+          f"tf-idf {_latency_us(trained.predict_tfidf, samples):.0f}us, two-stage {_latency_us(trained.classify, samples):.0f}us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Per-session memory and per-rerun image payload with images kept as bytes in the session (before)
+and as image store references rendered through previews (after).
+
+A kit of `--variants` synthetic Imagen-sized photos (1024x1024 PNG with photo-like noise) plus an
+uploaded photo is put into a session store each way. "session bytes" is the pickled size of the
+session store; "rerun payload" is what st.image sends for the selected image and the gallery.
+
+Usage:
+    python benchmarks/bench_image_delivery.py --variants 4 --upload-edge 3000
+"""
+import argparse
+import io
+import os
+import pickle
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageFilter
+
+import image_store
+from session_store import SessionArtifactStore
+
+
+def _photo(edge: int, seed: int, format: str = "PNG") -> bytes:
+    """
+    Returns a photo-like image: a smooth colour gradient with fine noise, which compresses about as
+    badly as a real photograph.
+    """
+    gradient = Image.linear_gradient("L").resize((edge, edge)).rotate(seed * 37 % 360)
+    noise = Image.effect_noise((edge, edge), 48).filter(ImageFilter.GaussianBlur(0.6))
+    image = Image.merge("RGB", (gradient, noise, Image.eval(gradient, lambda value: (value + seed * 40) % 256)))
+    buffer = io.BytesIO()
+    image.save(buffer, format=format, **({"quality": 90} if format == "JPEG" else {}))
+    return buffer.getvalue()
+
+
+def _rerun_payload(kit, store) -> int:
+    """
+    Bytes passed to st.image on one rerun of the results section: selected image plus gallery.
+    """
+    images = [kit.image] + (list(kit.images) if len(kit.images) > 1 else [])
+    if store is None:
+        return sum(len(image) for image in images)
+    return sum(len(store.preview(ref)) for ref in images)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--variants", type=int, default=4, help="Generated images per kit")
+    parser.add_argument("--upload-edge", type=int, default=3000, help="Longest edge of the uploaded photo")
+    parser.add_argument("--edge", type=int, default=1024, help="Longest edge of the generated images")
+    args = parser.parse_args()
+
+    images = [_photo(args.edge, seed) for seed in range(args.variants)]
+    upload = _photo(args.upload_edge, 99, format="JPEG")
+    results = {"description": "A blue pottery mug", "social_posts": "Posts", "image": images[0],
+               "image_variants": images, "image_prompt": "A blue pottery mug on a table"}
+    inputs = {"product_input": "Blue pottery mug", "image_data": upload, "image_style": "Artistic Lifestyle"}
+
+    with tempfile.TemporaryDirectory() as directory:
+        image_store._store = image_store.ImageStore(directory)
+        store = image_store.get_image_store()
+
+        before = SessionArtifactStore()
+        before_kit = before.put_kit("kit", results, inputs)
+
+        start = time.perf_counter()
+        after = SessionArtifactStore(store_images=True)
+        after_kit = after.put_kit("kit", results, inputs)
+        store_seconds = time.perf_counter() - start
+
+        rows = [
+            ("session bytes", len(pickle.dumps(before)), len(pickle.dumps(after))),
+            ("rerun payload", _rerun_payload(before_kit, None), _rerun_payload(after_kit, store)),
+        ]
+        download = store.original(after_kit.image)
+        assert download == images[0], "download must be the original"
+        mime_type = after_kit.image.mime_type
+        preview_type = after_kit.image.preview_mime_type
+
+    print(f"{args.variants} generated {args.edge}px images ({sum(map(len, images)) // 1024} KB), "
+          f"{args.upload_edge}px upload ({len(upload) // 1024} KB)")
+    print(f"{'':16} {'before':>10} {'after':>10} {'saved':>7}")
+    for name, old, new in rows:
+        print(f"{name:16} {old // 1024:8d}KB {new // 1024:8d}KB {1 - new / old:7.0%}")
+    print(f"storing the kit (originals + {preview_type} previews): {store_seconds * 1000:.0f}ms; "
+          f"download served as {mime_type}, byte-identical to the original")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Bytes and time saved per image by preprocessing uploads before the Gemini vision call.
+
+Reports, for each image, the upload size before/after preprocess_image, the time spent
+preprocessing and the estimated upload time saved at the given uplink bandwidth.
+
+Usage:
+    python benchmarks/bench_image_preprocessing.py photo1.jpg photo2.png --uplink-mbps 10
+    python benchmarks/bench_image_preprocessing.py            # synthetic 12 MP phone-style photos
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+
+from image_utils import IMAGE_MAX_EDGE, preprocess_image
+
+
+def _synthetic_photos() -> list:
+    """
+    Builds 12 MP test photos: a noisy JPEG with an EXIF rotation and a large PNG screenshot.
+    """
+    photos = []
+    noisy = Image.effect_noise((4000, 3000), 40).convert("RGB")
+    exif = noisy.getexif()
+    exif[0x0112] = 6  # Rotated 90° as phones commonly store portraits
+    buffer = io.BytesIO()
+    noisy.save(buffer, format="JPEG", quality=95, exif=exif)
+    photos.append(("synthetic_phone.jpg", buffer.getvalue()))
+
+    buffer = io.BytesIO()
+    Image.linear_gradient("L").resize((4000, 3000)).convert("RGB").save(buffer, format="PNG")
+    photos.append(("synthetic_upload.png", buffer.getvalue()))
+    return photos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("images", nargs="*", help="Image files to preprocess (default: synthetic photos)")
+    parser.add_argument("--max-edge", type=int, default=IMAGE_MAX_EDGE)
+    parser.add_argument("--uplink-mbps", type=float, default=10.0, help="Uplink bandwidth used to estimate upload time")
+    args = parser.parse_args()
+
+    if args.images:
+        photos = []
+        for path in args.images:
+            with open(path, "rb") as f:
+                photos.append((os.path.basename(path), f.read()))
+    else:
+        photos = _synthetic_photos()
+
+    bytes_per_second = args.uplink_mbps * 1_000_000 / 8
+    print(f"{'image':<24}{'original':>12}{'processed':>12}{'saved':>8}{'prep ms':>10}{'upload saved ms':>17}")
+    for name, data in photos:
+        start = time.perf_counter()
+        processed, mime_type = preprocess_image(data, max_edge=args.max_edge)
+        prep_ms = (time.perf_counter() - start) * 1000
+        saved_ms = (len(data) - len(processed)) / bytes_per_second * 1000 - prep_ms
+        print(f"{name:<24}{len(data):>12,}{len(processed):>12,}{1 - len(processed) / len(data):>8.0%}"
+              f"{prep_ms:>10.0f}{saved_ms:>17.0f}  {mime_type}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Wall-clock benchmark for sequential vs. parallel generate_all_content, using local fake models.
+
+Usage:
+    python benchmarks/bench_parallel_generation.py --text-latency 0.5 --image-latency 2.0 --runs 3
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import backend
+from fake_models import fake_model_classes
+
+
+def _time_runs(runs: int, **kwargs) -> list:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = backend.generate_all_content("Blue pottery mug from Jaipur with floral designs", force_fresh=True, **kwargs)
+        timings.append(time.perf_counter() - start)
+        assert result["image"] is not None, "fake image generation failed"
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--text-latency", type=float, default=0.5, help="Fake Gemini latency per call (s)")
+    parser.add_argument("--image-latency", type=float, default=2.0, help="Fake Imagen latency per call (s)")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    text_model_cls, image_model_cls = fake_model_classes(args.text_latency, args.image_latency)
+    backend.configure_models(text_factory=text_model_cls, image_factory=image_model_cls.from_pretrained)
+
+    sequential = _time_runs(args.runs)
+    parallel = _time_runs(args.runs, parallel=True)
+
+    seq_median = statistics.median(sequential)
+    par_median = statistics.median(parallel)
+    print(f"text latency {args.text_latency:.2f}s, image latency {args.image_latency:.2f}s, {args.runs} runs")
+    print(f"sequential: median {seq_median:.2f}s")
+    print(f"parallel:   median {par_median:.2f}s")
+    print(f"speed-up:   {seq_median / par_median:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
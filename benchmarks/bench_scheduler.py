@@ -0,0 +1,120 @@
+"""
+Interactive latency and failures while a batch job shares the model quota, with and without the
+scheduler's priority queues and adaptive limits, against local fake models behind a fake quota
+that answers calls over it with 429s.
+
+"uncoordinated" lets every call through (as before the scheduler) and never lowers the limits;
+"scheduled" uses the configured limits, batch priority and quota-driven backoff.
+
+Usage:
+    python benchmarks/bench_scheduler.py --batch-items 12 --interactive 6 --image-quota 2 --text-quota 4
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import backend
+import batch
+from fake_models import FakeQuota, fake_model_classes
+
+
+def _interactive_requests(count: int, interval: float) -> list:
+    """
+    Sends `count` app-like kit requests, one every `interval` seconds, and returns (seconds, failed fields).
+    """
+    outcomes = []
+    lock = threading.Lock()
+
+    def request(index):
+        started = time.perf_counter()
+        results = backend.generate_all_content(f"Interactive request {index}: blue pottery mug", parallel=True,
+                                               force_fresh=True)
+        failed = [field for field in ("description", "social_posts") if results[field].startswith("Error:")]
+        if results["image"] is None:
+            failed.append("image")
+        with lock:
+            outcomes.append((time.perf_counter() - started, failed))
+
+    threads = []
+    for index in range(count):
+        thread = threading.Thread(target=request, args=(index,))
+        thread.start()
+        threads.append(thread)
+        time.sleep(interval)
+    for thread in threads:
+        thread.join()
+    return outcomes
+
+
+def run_scenario(name: str, args, limits: dict, adaptive: bool) -> dict:
+    text_quota = FakeQuota(max_concurrent=args.text_quota)
+    image_quota = FakeQuota(max_concurrent=args.image_quota)
+    text_model_cls, image_model_cls = fake_model_classes(args.text_latency, args.image_latency,
+                                                         text_quota=text_quota, image_quota=image_quota)
+    backend.configure_models(text_factory=text_model_cls, image_factory=image_model_cls.from_pretrained)
+    backend.configure_scheduler(limits, adaptive=adaptive)
+    backend.KIT_CACHE.clear()
+
+    items = [{"id": str(index), "description": f"Catalog item {index}: handwoven jute bag", "image_path": None,
+              "style": None} for index in range(args.batch_items)]
+    with tempfile.TemporaryDirectory() as output_dir:
+        batch_summary = {}
+        batch_thread = threading.Thread(target=lambda: batch_summary.update(
+            batch.run_batch(items, output_dir, concurrency=args.batch_concurrency, retries=0)))
+        batch_thread.start()
+        time.sleep(args.interactive_delay)
+        outcomes = _interactive_requests(args.interactive, args.interval)
+        batch_thread.join()
+
+    latencies = sorted(seconds for seconds, _ in outcomes)
+    stats = backend.get_scheduler_stats()
+    return {
+        "name": name,
+        "p50": statistics.median(latencies),
+        "p95": latencies[min(len(latencies) - 1, round(0.95 * (len(latencies) - 1)))],
+        "failed_requests": sum(1 for _, failed in outcomes if failed),
+        "batch_ok": batch_summary.get("ok", 0),
+        "batch_elapsed": batch_summary.get("elapsed", 0.0),
+        "rejected_429": text_quota.stats["rejected"] + image_quota.stats["rejected"],
+        "image_limit": stats["image"]["limit"],
+        "image_wait_p95": stats["image"]["wait"].get("interactive", {}).get("p95", 0.0)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-items", type=int, default=12)
+    parser.add_argument("--batch-concurrency", type=int, default=6)
+    parser.add_argument("--interactive", type=int, default=6, help="Interactive requests sent during the batch")
+    parser.add_argument("--interval", type=float, default=0.5, help="Seconds between interactive requests")
+    parser.add_argument("--interactive-delay", type=float, default=1.0, help="Seconds into the batch they start")
+    parser.add_argument("--text-latency", type=float, default=0.3)
+    parser.add_argument("--image-latency", type=float, default=1.0)
+    parser.add_argument("--text-quota", type=int, default=4, help="Fake Gemini calls allowed in flight")
+    parser.add_argument("--image-quota", type=int, default=2, help="Fake Imagen calls allowed in flight")
+    parser.add_argument("--text-limit", type=int, default=8, help="Scheduler limit (above the quota to show adaptation)")
+    parser.add_argument("--image-limit", type=int, default=4)
+    args = parser.parse_args()
+
+    rows = [
+        run_scenario("uncoordinated", args, {"text": 1000, "image": 1000, "translate": 1000}, adaptive=False),
+        run_scenario("scheduled", args, {"text": args.text_limit, "image": args.image_limit}, adaptive=True)
+    ]
+    print(f"{args.batch_items} batch kits (concurrency {args.batch_concurrency}) + {args.interactive} interactive "
+          f"requests; quota: text {args.text_quota}, image {args.image_quota} in flight")
+    print(f"{'scenario':14} {'p50':>7} {'p95':>7} {'failed':>7} {'batch ok':>9} {'batch s':>8} "
+          f"{'429s':>6} {'img limit':>10} {'img wait p95':>13}")
+    for row in rows:
+        print(f"{row['name']:14} {row['p50']:6.2f}s {row['p95']:6.2f}s {row['failed_requests']:7} "
+              f"{row['batch_ok']:9} {row['batch_elapsed']:8.1f} {row['rejected_429']:6} {row['image_limit']:10} "
+              f"{row['image_wait_p95']:12.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Tokens and latency of single-shot copy generation (one JSON-schema call for description, social
+posts and category) against the multi-call mode, using local fake models.
+
+The fake models count roughly four characters per token and, with --output-token-latency, take
+longer for longer responses, so one large structured response is not unrealistically cheap.
+
+Usage:
+    python benchmarks/bench_single_shot.py --runs 3 --text-latency 0.6 --output-token-latency 0.004
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import backend
+import instrumentation
+from fake_models import fake_model_classes
+
+# A long vision-style description, as produced by the analysis step for an uploaded photo
+BASE_CONTENT = " ".join([
+    "A hand-thrown ceramic mug from Jaipur in the blue pottery tradition, about 10 cm tall with a",
+    "slightly flared rim and a sturdy loop handle. The body is glazed in deep cobalt blue with",
+    "turquoise accents, painted by hand with a repeating pattern of five-petalled flowers and",
+    "curling vines in white and pale aqua. The glaze is glossy with small, even crackle lines near",
+    "the base, and the unglazed foot ring shows the warm off-white of the quartz-based body."
+] * 4)
+
+
+def _measure(runs: int, **kwargs) -> dict:
+    timings, calls, prompt_tokens, response_tokens = [], [], [], []
+    for _ in range(runs):
+        start = time.perf_counter()
+        results = backend.generate_all_content(BASE_CONTENT, force_fresh=True, **kwargs)
+        timings.append(time.perf_counter() - start)
+        assert not results["description"].startswith("Error:"), results["description"]
+        trace = instrumentation.last_trace()
+        totals = trace.totals()
+        calls.append(sum(1 for span in trace.spans if span.name == "gemini.generate_content"))
+        prompt_tokens.append(totals["prompt_tokens"])
+        response_tokens.append(totals["response_tokens"])
+    return {
+        "latency": statistics.median(timings),
+        "calls": statistics.median(calls),
+        "prompt_tokens": statistics.median(prompt_tokens),
+        "response_tokens": statistics.median(response_tokens)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--text-latency", type=float, default=0.6, help="Fake Gemini latency per call (s)")
+    parser.add_argument("--output-token-latency", type=float, default=0.004, help="Fake Gemini time per output token (s)")
+    parser.add_argument("--image-latency", type=float, default=0.0, help="Fake Imagen latency per call (s)")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    text_model_cls, image_model_cls = fake_model_classes(args.text_latency, args.image_latency, args.output_token_latency)
+    backend.configure_models(text_factory=text_model_cls, image_factory=image_model_cls.from_pretrained)
+
+    modes = [
+        ("multi-call, sequential", {"single_shot": False}),
+        ("multi-call, parallel", {"single_shot": False, "parallel": True}),
+        ("single-shot, sequential", {"single_shot": True}),
+        ("single-shot, parallel", {"single_shot": True, "parallel": True}),
+    ]
+    rows = [(name, _measure(args.runs, **kwargs)) for name, kwargs in modes]
+
+    # One field failing validation costs only that field's call
+    text_model_cls.single_shot_invalid = ("social_posts",)
+    rows.append(("single-shot, posts fall back", _measure(args.runs, single_shot=True, parallel=True)))
+
+    print(f"text latency {args.text_latency:.2f}s + {args.output_token_latency * 1000:.1f}ms/token, {args.runs} runs")
+    print(f"{'mode':30} {'latency':>8} {'calls':>6} {'prompt tok':>11} {'response tok':>13}")
+    for name, row in rows:
+        print(f"{name:30} {row['latency']:7.2f}s {row['calls']:6.0f} {row['prompt_tokens']:11.0f} {row['response_tokens']:13.0f}")
+    baseline = rows[0][1]["prompt_tokens"]
+    print(f"prompt tokens saved by single-shot: {1 - rows[2][1]['prompt_tokens'] / baseline:.0%}")
+
+
+if __name__ == "__main__":
+    main()
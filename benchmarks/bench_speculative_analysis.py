@@ -0,0 +1,103 @@
+"""
+Time from clicking Generate to a finished kit, with and without speculative image analysis, using
+local fake models. Each run "uploads" the image, waits --think-time seconds (the user typing a
+description and picking a style), then generates. The busy runs first start --busy-uploads analyses
+of other sessions' photos, so this upload's analysis is still queued when Generate is clicked.
+
+Usage:
+    python benchmarks/bench_speculative_analysis.py --think-time 3 --text-latency 1.5 --image-latency 2.0 --runs 3
+    python benchmarks/bench_speculative_analysis.py --busy-uploads 8 --text-latency 1 --image-latency 1
+"""
+import argparse
+import io
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+
+import backend
+from fake_models import FAKE_IMAGE_BYTES, fake_model_classes
+
+PRODUCT_TEXT = "Blue pottery mug from Jaipur with floral designs"
+
+
+def _time_runs(runs: int, think_time: float, speculate: bool) -> list:
+    timings = []
+    for _ in range(runs):
+        backend.ANALYSIS_CACHE.clear()
+        if speculate:
+            backend.start_image_analysis(FAKE_IMAGE_BYTES)
+        time.sleep(think_time)
+        start = time.perf_counter()
+        result = backend.generate_all_content(PRODUCT_TEXT, FAKE_IMAGE_BYTES, parallel=True, force_fresh=True)
+        timings.append(time.perf_counter() - start)
+        assert result["image"] is not None, "fake image generation failed"
+    return timings
+
+
+def _other_uploads(count: int) -> list:
+    """
+    Returns `count` distinct small photos, standing in for other sessions' uploads.
+    """
+    uploads = []
+    for index in range(count):
+        buffer = io.BytesIO()
+        Image.new("RGB", (64, 64), (index * 29 % 256, 90, 160)).save(buffer, format="PNG")
+        uploads.append(buffer.getvalue())
+    return uploads
+
+
+def _time_busy_runs(runs: int, busy_uploads: int, speculate: bool) -> list:
+    timings = []
+    for _ in range(runs):
+        backend.ANALYSIS_CACHE.clear()
+        for upload in _other_uploads(busy_uploads):
+            backend.start_image_analysis(upload)
+        if speculate:
+            backend.start_image_analysis(FAKE_IMAGE_BYTES)
+        start = time.perf_counter()
+        backend.generate_all_content(PRODUCT_TEXT, FAKE_IMAGE_BYTES, parallel=True, force_fresh=True)
+        timings.append(time.perf_counter() - start)
+        # Let the other sessions' analyses drain before the next run
+        while backend.get_speculation_stats()["in_flight"]:
+            time.sleep(0.05)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--think-time", type=float, default=3.0, help="Seconds between upload and Generate")
+    parser.add_argument("--text-latency", type=float, default=1.5, help="Fake Gemini latency per call (s)")
+    parser.add_argument("--image-latency", type=float, default=2.0, help="Fake Imagen latency per call (s)")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--busy-uploads", type=int, default=8,
+                        help="Other sessions' uploads being analysed when Generate is clicked (0 to skip)")
+    args = parser.parse_args()
+
+    text_model_cls, image_model_cls = fake_model_classes(args.text_latency, args.image_latency)
+    backend.configure_models(text_factory=text_model_cls, image_factory=image_model_cls.from_pretrained)
+
+    on_click = statistics.median(_time_runs(args.runs, args.think_time, speculate=False))
+    speculative = statistics.median(_time_runs(args.runs, args.think_time, speculate=True))
+    # Generate clicked right after the upload: the generation joins the analysis already under way
+    no_think = statistics.median(_time_runs(args.runs, 0.0, speculate=True))
+
+    print(f"think time {args.think_time:.1f}s, text latency {args.text_latency:.2f}s, "
+          f"image latency {args.image_latency:.2f}s, {args.runs} runs")
+    print(f"analysis on click:        median {on_click:.2f}s")
+    print(f"speculative analysis:     median {speculative:.2f}s ({on_click - speculative:.2f}s hidden)")
+    print(f"speculative, no think:    median {no_think:.2f}s")
+    if args.busy_uploads:
+        busy_on_click = statistics.median(_time_busy_runs(args.runs, args.busy_uploads, speculate=False))
+        busy_speculative = statistics.median(_time_busy_runs(args.runs, args.busy_uploads, speculate=True))
+        print(f"behind {args.busy_uploads} other uploads, on click:    median {busy_on_click:.2f}s")
+        print(f"behind {args.busy_uploads} other uploads, speculative: median {busy_speculative:.2f}s")
+    print(backend.get_speculation_stats())
+
+
+if __name__ == "__main__":
+    main()
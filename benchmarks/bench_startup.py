@@ -0,0 +1,80 @@
+"""
+Cold-start benchmark: time to `import backend` and to the first render of app.py, each measured in a
+fresh interpreter, plus the heavy SDK modules that got imported along the way (there should be none
+until the first model or Translate call).
+
+Usage:
+    python benchmarks/bench_startup.py --runs 5
+    python benchmarks/bench_startup.py --runs 5 --max-import-seconds 1.0   # exit 1 on regression
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ("vertexai", "google.cloud.translate", "google.cloud.aiplatform", "grpc", "google.api_core")
+
+IMPORT_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import backend
+elapsed = time.perf_counter() - start
+print(json.dumps({"seconds": elapsed, "loaded": [m for m in %r if m in sys.modules]}))
+""" % (HEAVY_MODULES,)
+
+# First render through Streamlit's test runner; no model is built unless warm-up is enabled
+RENDER_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file("app.py", default_timeout=120).run()
+elapsed = time.perf_counter() - start
+print(json.dumps({"seconds": elapsed, "loaded": [m for m in %r if m in sys.modules],
+                  "exception": bool(at.exception)}))
+""" % (HEAVY_MODULES,)
+
+
+def _probe(code: str) -> dict:
+    env = dict(os.environ, KALACONNECT_WARM_UP_MODELS="0")
+    output = subprocess.run([sys.executable, "-c", code], cwd=REPO_ROOT, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    # The probe's JSON is the last line; anything before it is startup logging
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def _summarise(samples: list) -> dict:
+    seconds = [sample["seconds"] for sample in samples]
+    return {
+        "median": round(statistics.median(seconds), 3),
+        "min": round(min(seconds), 3),
+        "max": round(max(seconds), 3),
+        "heavy_modules_loaded": sorted({module for sample in samples for module in sample["loaded"]})
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--skip-render", action="store_true", help="Only measure `import backend`")
+    parser.add_argument("--max-import-seconds", type=float, default=None,
+                        help="Fail (exit 1) if the median import time exceeds this")
+    args = parser.parse_args()
+
+    report = {"import_backend": _summarise([_probe(IMPORT_PROBE) for _ in range(args.runs)])}
+    if not args.skip_render:
+        renders = [_probe(RENDER_PROBE) for _ in range(args.runs)]
+        report["first_render"] = _summarise(renders)
+        report["first_render"]["exceptions"] = sum(render["exception"] for render in renders)
+    print(json.dumps(report, indent=2))
+
+    if args.max_import_seconds is not None and report["import_backend"]["median"] > args.max_import_seconds:
+        print(f"Import time regression: median {report['import_backend']['median']}s > {args.max_import_seconds}s")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
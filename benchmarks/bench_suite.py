@@ -0,0 +1,208 @@
+"""
+Offline benchmark suite for the whole pipeline, run against recorded responses (replay.py).
+
+Scenarios: cold and warm generation (sequential and parallel), a kit cache hit, time to first
+streamed chunk, partial regeneration, translation with a cold and a warm translation memory, and batch throughput.
+
+Usage:
+    # Replay recordings made with KALACONNECT_REPLAY_MODE=record against the real services
+    python benchmarks/bench_suite.py --recordings .kalaconnect_recordings
+    # Without --recordings, recordings are first made from local fake models
+    python benchmarks/bench_suite.py --runs 5
+    # Save results, then compare a later run against them
+    python benchmarks/bench_suite.py --json before.json
+    python benchmarks/bench_suite.py --compare before.json
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import backend
+import batch
+import replay
+from fake_models import FAKE_IMAGE_BYTES, fake_model_classes
+
+PRODUCT_TEXT = "Blue pottery mug from Jaipur with floral designs"
+LANGUAGES = ["Hindi", "Tamil", "Bengali"]
+BATCH_ITEMS = 8
+
+# Replay latency for recordings made from fakes, which are recorded without any delay
+FAKE_REPLAY_LATENCY = "text=0.5,image=2,translate=0.1"
+
+
+class FakeTranslateClient:
+    """
+    Local stand-in for TranslationServiceClient used when recording without Google Cloud.
+    """
+    transport = None
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def translate_text(self, request: dict, **kwargs):
+        time.sleep(self.latency)
+        code = request["target_language_code"]
+        return replay.ReplayTranslateResponse([f"[{code}] {text}" for text in request["contents"]])
+
+
+def _clear_caches():
+    backend.ANALYSIS_CACHE.clear()
+    backend.TRANSLATION_CACHE.clear()
+    backend.KIT_CACHE.clear()
+
+
+def _clear_kit_cache():
+    # Keeps the image analysis warm but makes the pipeline run again
+    backend.KIT_CACHE.clear()
+
+
+# --- Scenarios ---
+# Each returns a callable timed once per run; `setup` runs untimed before each run.
+def _generate(**kwargs):
+    def run():
+        results = backend.generate_all_content(PRODUCT_TEXT, FAKE_IMAGE_BYTES, **kwargs)
+        assert not results["description"].startswith("Error:"), results["description"]
+    return run
+
+
+def _first_chunk():
+    def run():
+        for event in backend.stream_all_content(PRODUCT_TEXT, FAKE_IMAGE_BYTES):
+            if event["type"] == "chunk":
+                return
+    return run
+
+
+def _translate():
+    content = backend.generate_all_content(PRODUCT_TEXT, FAKE_IMAGE_BYTES, parallel=True)
+
+    def run():
+        translated = backend.translate_content_multi(content, LANGUAGES)
+        assert set(translated) == set(LANGUAGES)
+    return run
+
+
+def _batch(concurrency: int, output_root: str):
+    # Distinct descriptions, so items are not served from each other's cached kits
+    items = [{"id": str(index), "description": f"{PRODUCT_TEXT}, design {index + 1}", "image_path": None, "style": None}
+             for index in range(BATCH_ITEMS)]
+
+    def run():
+        output_dir = tempfile.mkdtemp(dir=output_root)
+        summary = batch.run_batch(items, output_dir, concurrency=concurrency, retries=0)
+        assert summary["ok"] == BATCH_ITEMS, summary
+    return run
+
+
+def scenarios(output_root: str) -> list:
+    """
+    Returns (name, setup, make_run) tuples; make_run is called after the first setup.
+    """
+    return [
+        ("generate/cold/sequential", _clear_caches, lambda: _generate()),
+        ("generate/cold/parallel", _clear_caches, lambda: _generate(parallel=True)),
+        ("generate/warm/parallel", _clear_kit_cache, lambda: _generate(parallel=True)),
+        ("generate/kit_cache_hit", None, lambda: _generate(parallel=True)),
+        ("stream/first_chunk/warm", _clear_kit_cache, _first_chunk),
+        ("regenerate/description", None, lambda: _generate(regenerate_desc_only=True)),
+        ("regenerate/social_posts", None, lambda: _generate(regenerate_posts_only=True)),
+        ("regenerate/image", None, lambda: _generate(regenerate_image_only=True)),
+        ("translate/cold", backend.TRANSLATION_CACHE.clear, _translate),
+        ("translate/warm", None, _translate),
+        (f"batch/{BATCH_ITEMS}_items/concurrency_1", _clear_kit_cache, lambda: _batch(1, output_root)),
+        (f"batch/{BATCH_ITEMS}_items/concurrency_4", _clear_kit_cache, lambda: _batch(4, output_root)),
+    ]
+
+
+def _record_with_fakes(directory: str, output_root: str):
+    """
+    Records every scenario's calls from local fake models, without delays (see FAKE_REPLAY_LATENCY).
+    """
+    text_model_cls, image_model_cls = fake_model_classes(0.0, 0.0)
+    backend.configure_models(text_factory=text_model_cls, image_factory=image_model_cls.from_pretrained)
+    backend.configure_translate_client(lambda: FakeTranslateClient(0.0))
+    replay.install(backend, "record", directory)
+    for name, setup, make_run in scenarios(output_root):
+        if setup:
+            setup()
+        make_run()()
+    _clear_caches()
+
+
+def run_suite(runs: int, output_root: str) -> dict:
+    report = {}
+    for name, setup, make_run in scenarios(output_root):
+        if setup:
+            setup()
+        run = make_run()
+        timings = []
+        for _ in range(runs):
+            if setup:
+                setup()
+            start = time.perf_counter()
+            run()
+            timings.append(time.perf_counter() - start)
+        report[name] = {
+            "median": round(statistics.median(timings), 4),
+            "p95": round(sorted(timings)[min(len(timings) - 1, round(0.95 * (len(timings) - 1)))], 4),
+            "min": round(min(timings), 4)
+        }
+    return report
+
+
+def _print_report(report: dict, baseline: dict = None):
+    header = f"{'scenario':42} {'median':>9} {'p95':>9} {'min':>9}"
+    if baseline:
+        header += f" {'vs base':>9}"
+    print(header)
+    for name, row in report.items():
+        line = f"{name:42} {row['median']:9.3f} {row['p95']:9.3f} {row['min']:9.3f}"
+        if baseline and name in baseline and baseline[name]["median"]:
+            line += f" {row['median'] / baseline[name]['median']:8.2f}x"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--recordings", default=None, help="Directory of recordings; recorded from fakes if omitted")
+    parser.add_argument("--latency", default=None,
+                        help='Replay latency: "recorded", "recorded*0.5", "0" or "text=0.5,image=2,translate=0.1" '
+                             f'(default: "recorded" with --recordings, otherwise "{FAKE_REPLAY_LATENCY}")')
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--json", default=None, help="Write the results to this file")
+    parser.add_argument("--compare", default=None, help="Baseline results file from a previous --json run")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as output_root:
+        recordings = args.recordings
+        latency = args.latency or ("recorded" if recordings else FAKE_REPLAY_LATENCY)
+        if recordings is None:
+            recordings = os.path.join(output_root, "recordings")
+            print("Recording fake model responses...")
+            _record_with_fakes(recordings, output_root)
+
+        stores = replay.install(backend, "replay", recordings, replay.ReplayLatency.parse(latency))
+        report = run_suite(args.runs, output_root)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["scenarios"]
+    _print_report(report, baseline)
+    misses = sum(store.stats["missed"] for store in stores.values())
+    if misses:
+        print(f"Warning: {misses} call(s) had no recording; re-record with KALACONNECT_REPLAY_MODE=record")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"latency": latency, "runs": args.runs, "scenarios": report}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Time to render a sidebar language switch with and without background translation prefetch, and the
+prefetch hit rate against the translations made but never shown.
+
+A simulated user waits `--think-time` seconds after the kit appears, then switches through
+`--switches` languages (think time between each). Halfway through, the description is regenerated,
+which cancels the prefetch of the old text. Translate is a local function that sleeps
+`--translate-latency` seconds, so no Google Cloud access is needed.
+
+Usage:
+    python benchmarks/bench_translation_prefetch.py --translate-latency 0.8 --think-time 2
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend import LANGUAGE_CODES
+from session_store import SessionArtifactStore
+from translation_prefetch import TranslationPrefetcher
+
+
+def _fake_translate(latency: float):
+    def translate(content: dict, language: str) -> dict:
+        time.sleep(latency)
+        return {field: f"[{language}] {text}" for field, text in content.items()}
+    return translate
+
+
+def _session(args, prefetch: bool):
+    """
+    Runs one simulated session. Returns (switch latencies in seconds, prefetcher stats or None).
+    """
+    translate = _fake_translate(args.translate_latency)
+    store = SessionArtifactStore()
+    kit = store.put_kit("kit", {"description": "A blue pottery mug", "social_posts": "## Instagram Post"})
+    languages = [language for language in LANGUAGE_CODES if language != "English"]
+    prefetcher = TranslationPrefetcher(translate, languages, top=args.top, max_workers=args.workers) if prefetch else None
+
+    latencies = []
+    for index in range(args.switches):
+        if prefetcher is not None:
+            prefetcher.ensure(store, kit.fingerprint)
+        time.sleep(args.think_time)
+        if index == args.switches // 2:
+            if prefetcher is not None:
+                prefetcher.cancel(store)
+            store.replace_artifact(kit.fingerprint, "description", f"A blue pottery mug, take {index}")
+            if prefetcher is not None:
+                prefetcher.ensure(store, kit.fingerprint)
+            time.sleep(args.think_time)
+        language = languages[index % len(languages)]
+        start = time.perf_counter()
+        pending = [language] if kit.missing_translations(language) else []
+        if pending:
+            source = {field: kit.artifacts[field] for field in kit.missing_translations(language)}
+            store.set_translations(kit.fingerprint, language, translate(source, language))
+        latencies.append(time.perf_counter() - start)
+        if prefetcher is not None:
+            prefetcher.note_shown(store, kit.fingerprint, [language], pending)
+    if prefetcher is not None:
+        time.sleep(args.translate_latency * 2)  # let the last translations finish so they are counted
+    return latencies, prefetcher.stats() if prefetcher is not None else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--translate-latency", type=float, default=0.8, help="Seconds per Translate request")
+    parser.add_argument("--think-time", type=float, default=2.0, help="Seconds between language switches")
+    parser.add_argument("--switches", type=int, default=4, help="Language switches per session")
+    parser.add_argument("--workers", type=int, default=2, help="Prefetch concurrency")
+    parser.add_argument("--top", type=int, default=None, help="Prefetch only this many languages")
+    args = parser.parse_args()
+
+    print(f"{args.switches} language switches, {args.think_time}s think time, "
+          f"{args.translate_latency}s per translation, description regenerated halfway")
+    print(f"{'':14} {'switch p50':>11} {'switch max':>11}")
+    for name, prefetch in (("on demand", False), ("prefetch", True)):
+        latencies, stats = _session(args, prefetch)
+        print(f"{name:14} {statistics.median(latencies) * 1000:9.0f}ms {max(latencies) * 1000:9.0f}ms")
+    print(f"prefetch: hit rate {stats['hit_rate']:.0%} ({stats['hits']} hits / {stats['misses']} misses), "
+          f"{stats['translated']} translations made, {stats['wasted']} not shown "
+          f"({stats['discarded']} dropped as stale), {stats['cancelled']} cancelled before starting")
+
+
+if __name__ == "__main__":
+    main()
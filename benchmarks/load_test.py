@@ -0,0 +1,147 @@
+"""
+Load test for the HTTP entry point (server.py): concurrent POST /kit requests against local fake
+models, reporting latency percentiles and throughput.
+
+Usage:
+    # In-process, calling the ASGI app directly with stubbed models (no network, no Google Cloud)
+    python benchmarks/load_test.py --requests 200 --concurrency 32 --text-latency 0.3 --image-latency 1.5
+    # Against a running server (start it with the fake models however you deploy it)
+    python benchmarks/load_test.py --url http://127.0.0.1:8080 --requests 200 --concurrency 32
+    # Every request for the same product, as in a workshop demo: identical model calls are coalesced
+    python benchmarks/load_test.py --requests 200 --concurrency 32 --identical
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import backend
+import server
+import service
+from fake_models import fake_model_classes
+
+# force_fresh keeps every request on the models instead of the kit cache
+PAYLOAD = {"product_input": "Blue pottery mug from Jaipur with floral designs", "image_style": "Artistic Lifestyle",
+           "force_fresh": True}
+
+
+async def _call_in_process(body: bytes) -> int:
+    """
+    Sends one request straight to the ASGI app and returns the response status.
+    """
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "POST", "path": "/kit", "headers": []}
+    await server.app(scope, receive, send)
+    status = sent[0]["status"]
+    if status == 200 and json.loads(sent[1]["body"])["results"]["image"] is None:
+        return 0  # Served, but the kit has no image
+    return status
+
+
+async def _call_http(url: str, body: bytes) -> int:
+    def post():
+        request = urllib.request.Request(f"{url.rstrip('/')}/kit", data=body,
+                                         headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=300) as response:
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+    return await asyncio.get_running_loop().run_in_executor(None, post)
+
+
+def _percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _body(index: int, identical: bool) -> bytes:
+    payload = dict(PAYLOAD)
+    if not identical:
+        # Distinct products, so the requests do not share model calls (see singleflight.py)
+        payload["product_input"] = f"{PAYLOAD['product_input']}, design {index + 1}"
+    return json.dumps(payload).encode("utf-8")
+
+
+async def run_load(requests: int, concurrency: int, url: str = None, identical: bool = False) -> dict:
+    """
+    Sends `requests` kit requests with at most `concurrency` in flight.
+
+    Args:
+        identical: Send the same product in every request instead of distinct ones
+
+    Returns:
+        Summary dict with latency percentiles (seconds), throughput and status counts
+    """
+    gate = asyncio.Semaphore(concurrency)
+    latencies, statuses = [], {}
+
+    async def one(index: int):
+        body = _body(index, identical)
+        async with gate:
+            start = time.perf_counter()
+            status = await (_call_http(url, body) if url else _call_in_process(body))
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(index) for index in range(requests)))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "statuses": statuses,
+        "p50": round(_percentile(latencies, 0.50), 3),
+        "p95": round(_percentile(latencies, 0.95), 3),
+        "mean": round(statistics.mean(latencies), 3),
+        "rps": round(requests / elapsed, 2),
+        "elapsed": round(elapsed, 3)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--url", default=None, help="Base URL of a running server; in-process if omitted")
+    parser.add_argument("--text-latency", type=float, default=0.3, help="Fake Gemini latency per call (s)")
+    parser.add_argument("--image-latency", type=float, default=1.5, help="Fake Imagen latency per call (s)")
+    parser.add_argument("--text-concurrency", type=int, default=None, help="Gemini calls in flight (in-process)")
+    parser.add_argument("--image-concurrency", type=int, default=None, help="Imagen calls in flight (in-process)")
+    parser.add_argument("--identical", action="store_true", help="Send the same product in every request")
+    parser.add_argument("--no-single-flight", action="store_true", help="Do not coalesce identical calls (in-process)")
+    args = parser.parse_args()
+
+    if not args.url:
+        text_model_cls, image_model_cls = fake_model_classes(args.text_latency, args.image_latency)
+        backend.configure_models(text_factory=text_model_cls, image_factory=image_model_cls.from_pretrained)
+        for kind, limit in (("text", args.text_concurrency), ("image", args.image_concurrency)):
+            if limit:
+                backend.SCHEDULER.queue(kind).set_max_limit(limit)
+        backend.configure_single_flight(not args.no_single_flight)
+        service._service = service.KitService(max_workers=max(32, args.concurrency * 2))
+
+    summary = asyncio.run(run_load(args.requests, args.concurrency, args.url, args.identical))
+    if not args.url:
+        stats = service.get_service().stats()
+        summary["models"] = stats["models"]
+        summary["single_flight"] = stats["single_flight"]
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,434 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# --- Caching Helpers ---
+# Small, thread-safe caches shared by all Streamlit sessions in the process.
+
+
+def content_hash(*parts) -> str:
+    """
+    Returns a SHA-256 hex digest over the given str/bytes parts, used as a content-addressed key.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode("utf-8")
+        digest.update(len(part).to_bytes(8, "big"))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+class LRUCache:
+    """
+    In-memory least-recently-used cache with a fixed number of entries.
+    """
+
+    def __init__(self, maxsize: int = 128):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Returns the cached value or None, marking the entry as recently used.
+        """
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class DiskCache:
+    """
+    File-backed cache storing one JSON document per key in `directory`.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def set(self, key, value):
+        # Write to a temporary file first so readers never see a partial entry
+        tmp_path = f"{self._path(key)}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(value, f, ensure_ascii=False)
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            print(f"Failed to write cache entry {key}: {str(e)}")
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                os.remove(os.path.join(self.directory, name))
+
+
+class SQLiteCache:
+    """
+    SQLite-backed cache with a time-to-live and a total size budget, evicting least recently used entries.
+
+    Args:
+        path: Database file path
+        ttl: Seconds an entry stays valid after being written (None keeps entries until evicted)
+        max_bytes: Approximate budget for the stored values; older entries are evicted beyond it
+    """
+
+    def __init__(self, path: str, ttl: float = None, max_bytes: int = 50 * 1024 * 1024):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)")
+
+    def get(self, key):
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT value, created FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, created = row
+            if self.ttl is not None and now - created > self.ttl:
+                self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE cache SET accessed = ? WHERE key = ?", (now, key))
+        return json.loads(value)
+
+    def set(self, key, value):
+        encoded = json.dumps(value, ensure_ascii=False)
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, encoded, len(encoded.encode("utf-8")), now, now)
+            )
+            self._evict()
+
+    def _evict(self):
+        """
+        Drops expired entries, then the least recently used ones until the size budget is met.
+        """
+        if self.ttl is not None:
+            self._conn.execute("DELETE FROM cache WHERE created < ?", (time.time() - self.ttl,))
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute("SELECT key, size FROM cache ORDER BY accessed").fetchall():
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def delete(self, key):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM cache")
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+
+class BlobStore:
+    """
+    Content-addressed file store for binary values such as generated images, one file per SHA-256 digest.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.directory, digest)
+
+    def put(self, data: bytes) -> str:
+        """
+        Stores `data` (once per distinct content) and returns its digest.
+        """
+        digest = content_hash(data)
+        path = self._path(digest)
+        if os.path.exists(path):
+            # Storing it again counts as recent use for prune()
+            os.utime(path)
+        else:
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        return digest
+
+    def get(self, digest: str):
+        try:
+            with open(self._path(digest), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def delete(self, digest: str):
+        try:
+            os.remove(self._path(digest))
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            os.remove(os.path.join(self.directory, name))
+
+    def prune(self, max_bytes: int) -> int:
+        """
+        Deletes the least recently stored blobs until the store fits in `max_bytes`.
+
+        Returns:
+            Bytes freed
+        """
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.endswith(".tmp"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.name))
+        total = sum(size for _, size, _ in entries)
+        freed = 0
+        for _, size, digest in sorted(entries):
+            if total - freed <= max_bytes:
+                break
+            self.delete(digest)
+            freed += size
+        return freed
+
+
+class BlobSQLiteCache:
+    """
+    SQLite-backed cache for dict values whose bytes fields (or lists of bytes) are kept in a BlobStore,
+    evicting least recently used entries beyond `max_entries` or `max_bytes`.
+
+    Args:
+        path: Database file path for the metadata (the JSON-safe fields and blob digests)
+        blob_directory: Directory of the BlobStore
+        max_entries: Maximum number of entries
+        max_bytes: Approximate budget for metadata plus blobs; older entries are evicted beyond it
+    """
+
+    def __init__(self, path: str, blob_directory: str, max_entries: int = 256, max_bytes: int = 500 * 1024 * 1024):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.blobs = BlobStore(blob_directory)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS blob_refs (key TEXT NOT NULL, digest TEXT NOT NULL, "
+                "PRIMARY KEY (key, digest))"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS blob_refs_digest ON blob_refs (digest)")
+
+    def get(self, key):
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            stored = json.loads(row[0])
+            value = dict(stored["fields"])
+            for field, digests in stored["blob_fields"].items():
+                blobs = [self.blobs.get(digest) for digest in (digests if isinstance(digests, list) else [digests])]
+                if any(blob is None for blob in blobs):
+                    # A blob file went missing; the entry is unusable
+                    self._remove([key])
+                    return None
+                value[field] = blobs if isinstance(digests, list) else blobs[0]
+            self._conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (time.time(), key))
+        return value
+
+    def set(self, key, value: dict):
+        fields, blob_fields, blob_bytes = {}, {}, 0
+        with self._lock, self._conn:
+            # Blobs are written under the lock so eviction never removes one that is about to be referenced
+            for field, item in value.items():
+                if isinstance(item, bytes):
+                    blob_fields[field] = self.blobs.put(item)
+                    blob_bytes += len(item)
+                elif isinstance(item, list) and item and all(isinstance(part, bytes) for part in item):
+                    blob_fields[field] = [self.blobs.put(part) for part in item]
+                    blob_bytes += sum(len(part) for part in item)
+                else:
+                    fields[field] = item
+            encoded = json.dumps({"fields": fields, "blob_fields": blob_fields}, ensure_ascii=False)
+            now = time.time()
+            digests = {digest for digests in blob_fields.values()
+                       for digest in (digests if isinstance(digests, list) else [digests])}
+            # Replacing an entry must not delete the blobs the new value shares with the old one
+            self._remove([key], keep=digests)
+            self._conn.execute(
+                "INSERT INTO entries (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, encoded, len(encoded.encode("utf-8")) + blob_bytes, now, now)
+            )
+            self._conn.executemany("INSERT INTO blob_refs (key, digest) VALUES (?, ?)",
+                                   [(key, digest) for digest in digests])
+            self._evict()
+
+    def _remove(self, keys: list, keep=()):
+        """
+        Deletes entries and every blob no other entry references, except the digests in `keep`.
+        Call with the lock held.
+        """
+        orphans = set()
+        for key in keys:
+            digests = [row[0] for row in self._conn.execute("SELECT digest FROM blob_refs WHERE key = ?", (key,))]
+            self._conn.execute("DELETE FROM blob_refs WHERE key = ?", (key,))
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            orphans.update(digests)
+        for digest in orphans - set(keep):
+            if self._conn.execute("SELECT 1 FROM blob_refs WHERE digest = ? LIMIT 1", (digest,)).fetchone() is None:
+                self.blobs.delete(digest)
+
+    def _evict(self):
+        """
+        Drops the least recently used entries until both the entry limit and the size budget are met.
+        """
+        count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        evicted = []
+        for key, size in self._conn.execute("SELECT key, size FROM entries ORDER BY accessed").fetchall():
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            evicted.append(key)
+            count -= 1
+            total -= size
+        self._remove(evicted)
+
+    def delete(self, key):
+        with self._lock, self._conn:
+            self._remove([key])
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM blob_refs")
+            self._conn.execute("DELETE FROM entries")
+            self.blobs.clear()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+
+class TieredCache:
+    """
+    In-memory LRU in front of an optional on-disk layer (DiskCache, SQLiteCache or BlobSQLiteCache),
+    with hit/miss counters.
+    """
+
+    def __init__(self, memory: LRUCache, disk: DiskCache = None):
+        self.memory = memory
+        self.disk = disk
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is not None:
+            self._count("memory_hits")
+            return value
+        if self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                # Promote to memory so the next lookup is cheap
+                self.memory.set(key, value)
+                self._count("disk_hits")
+                return value
+        self._count("misses")
+        return None
+
+    def set(self, key, value):
+        self.memory.set(key, value)
+        if self.disk is not None:
+            self.disk.set(key, value)
+
+    def delete(self, key):
+        self.memory.delete(key)
+        if self.disk is not None:
+            self.disk.delete(key)
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+        with self._lock:
+            self._stats = {name: 0 for name in self._stats}
+
+    def stats(self) -> dict:
+        """
+        Returns hit/miss counters plus the overall hit rate and in-memory size.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hits"] = stats["memory_hits"] + stats["disk_hits"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        stats["size"] = len(self.memory)
+        return stats
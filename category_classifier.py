@@ -0,0 +1,279 @@
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+
+# --- Local Product Category Classifier ---
+# Picks the product category (which only selects the image background scene) from the base content
+# without a Gemini round trip. A keyword lexicon of the crafts KalaConnect covers scores each
+# category; when it is unsure, a small TF-IDF nearest-centroid model trained on categories Gemini
+# returned earlier (recorded as labelled samples) gets a say. Both give a confidence; below the
+# thresholds the caller asks Gemini instead, and that answer becomes a new sample.
+
+CATEGORIES = ("pottery", "jewelry", "textile-pattern", "textile-small", "textile-garment",
+              "painting", "woodcraft", "metalwork", "other")
+
+_TEXTILES = ("textile-pattern", "textile-small", "textile-garment")
+
+# term or two-word phrase -> {category: weight}. A term shared by several categories (e.g. "cotton"
+# for every textile, "silver" for jewelry and metalwork) adds evidence to each and lowers the margin.
+LEXICON = {}
+
+
+def _add_terms(category, weight: float, terms: str):
+    for term in terms.split(","):
+        for name in (category if isinstance(category, tuple) else (category,)):
+            LEXICON.setdefault(term.strip(), {})[name] = weight
+
+
+_add_terms("pottery", 3.0, "pottery,ceramic,ceramics,terracotta,stoneware,earthenware,porcelain,kulhad,"
+                           "blue pottery,wheel thrown,teapot,matka,surahi")
+_add_terms("pottery", 2.0, "clay,glaze,glazed,mug,vase,planter,crackle,kiln,fired,cup,teacup")
+_add_terms("pottery", 1.0, "bowl,jar,plate,pot,saucer,diya")
+_add_terms("jewelry", 3.0, "jewelry,jewellery,necklace,necklaces,earring,earrings,bracelet,bangle,bangles,"
+                           "pendant,anklet,jhumka,jhumkas,kundan,choker,brooch,nose pin,maang tikka,meenakari,payal")
+_add_terms("jewelry", 2.0, "beads,beaded,gemstone,gemstones,stud,studs,chain,clasp,hook,wearable")
+_add_terms("jewelry", 1.0, "ring,rings,pearl,pearls")
+_add_terms("textile-garment", 3.0, "saree,sarees,sari,kurta,kurti,dupatta,lehenga,blouse,garment,pallu,"
+                                   "dress,shirt,jacket,skirt,shawl,stole,sleeve,sleeves,neckline,salwar")
+_add_terms("textile-garment", 1.5, "wear,worn,drape,drapes,size")
+_add_terms("textile-small", 3.0, "cushion,cushion cover,pillow,pouch,tote,potli,handkerchief,placemat,placemats,"
+                                 "napkin,napkins,table runner,clutch,purse,wallet")
+_add_terms("textile-small", 2.0, "bag,scarf,coasters,runner")
+_add_terms("textile-pattern", 3.0, "swatch,yardage,per metre,per meter,fabric swatch,running fabric,bolt")
+_add_terms("textile-pattern", 2.0, "fabric,repeat,repeating pattern,unstitched")
+_add_terms(_TEXTILES, 1.0, "textile,textiles,cotton,silk,woven,weave,weaving,handloom,loom,embroidery,"
+                           "embroidered,ikat,bandhani,khadi,chanderi,kantha,phulkari,chikankari,batik,ajrakh,"
+                           "block printed,hand block,thread,threads,stitch,stitched,linen,wool,pashmina,zari")
+_add_terms("painting", 3.0, "painting,canvas,madhubani,warli,pattachitra,gond,pichwai,tanjore,kalighat,"
+                            "watercolor,watercolour,artwork,framed,wall art,brushstrokes,miniature painting")
+_add_terms("painting", 2.0, "acrylic,frame,portrait,scene,scenes,depicts,depicting")
+_add_terms("painting", 0.5, "painted,hand painted,paper")
+_add_terms("woodcraft", 3.0, "woodcraft,teak,sheesham,rosewood,sandalwood,channapatna,mango wood,wood carving,"
+                             "walnut wood,woodwork")
+_add_terms("woodcraft", 2.5, "wood,wooden")
+_add_terms("woodcraft", 2.0, "lacquer,lacquered,bamboo,grain,carving,toy,toys")
+_add_terms("metalwork", 3.0, "brass,copper,bronze,bidri,dhokra,pewter,metalwork,repousse,wrought iron,"
+                             "bell metal,metal")
+_add_terms("metalwork", 2.0, "iron,hammered,patina,engraved,cast,polished metal,lamp")
+_add_terms(("jewelry", "metalwork"), 1.0, "silver,gold,oxidised,oxidized,filigree")
+_add_terms(("woodcraft", "metalwork"), 0.5, "carved,inlay,inlaid")
+
+# Evidence no category explains: a single weak keyword is not enough for a confident answer
+LEXICON_PRIOR = 3.0
+
+_WORD = re.compile(r"[a-z]+")
+
+
+def tokenize(text: str) -> list:
+    """
+    Returns the lowercase words and two-word phrases of `text`.
+    """
+    words = _WORD.findall((text or "").casefold())
+    return words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+
+
+def normalize_category(text: str):
+    """
+    Maps a model answer such as "Textile-Garment." to a category name, or None if none is mentioned.
+    """
+    text = (text or "").strip().casefold()
+    # Longest first, so "textile-garment" is not read as some shorter name it contains
+    for category in sorted(CATEGORIES, key=len, reverse=True):
+        if category in text:
+            return category
+    return None
+
+
+class TfidfCategoryModel:
+    """
+    Nearest-centroid classifier over TF-IDF vectors of words and two-word phrases.
+
+    Args:
+        samples: (text, category) pairs
+        temperature: Sharpness of the softmax turning centroid similarities into probabilities
+    """
+
+    def __init__(self, samples: list, temperature: float = 12.0):
+        self.temperature = temperature
+        documents = [(Counter(tokenize(text)), category) for text, category in samples]
+        document_frequency = Counter(term for counts, _ in documents for term in counts)
+        total = len(documents)
+        self.idf = {term: math.log((1 + total) / (1 + frequency)) + 1.0
+                    for term, frequency in document_frequency.items()}
+        sums = {}
+        for counts, category in documents:
+            centroid = sums.setdefault(category, {})
+            for term, weight in self._vector(counts).items():
+                centroid[term] = centroid.get(term, 0.0) + weight
+        self.centroids = {category: self._normalized(centroid) for category, centroid in sums.items()}
+
+    @staticmethod
+    def _normalized(vector: dict) -> dict:
+        norm = math.sqrt(sum(weight * weight for weight in vector.values())) or 1.0
+        return {term: weight / norm for term, weight in vector.items()}
+
+    def _vector(self, counts: Counter) -> dict:
+        return self._normalized({term: (1.0 + math.log(count)) * self.idf[term]
+                                 for term, count in counts.items() if term in self.idf})
+
+    def probabilities(self, text: str) -> dict:
+        vector = self._vector(Counter(tokenize(text)))
+        similarities = {category: sum(weight * centroid.get(term, 0.0) for term, weight in vector.items())
+                        for category, centroid in self.centroids.items()}
+        peak = max(similarities.values())
+        exponentials = {category: math.exp(self.temperature * (similarity - peak))
+                        for category, similarity in similarities.items()}
+        total = sum(exponentials.values())
+        return {category: value / total for category, value in exponentials.items()}
+
+
+class CategoryClassifier:
+    """
+    Two-stage local classifier: the lexicon answers when it is confident enough; otherwise a TF-IDF
+    model trained on recorded Gemini answers may answer when it is. classify() returns no category
+    when neither is, and the caller asks Gemini.
+
+    Args:
+        samples_path: Optional JSON-lines file of {"text", "category"} samples; record() appends to it
+                      and the TF-IDF model is trained from it on first use
+        threshold: Lexicon confidence needed to answer locally
+        tfidf_threshold: TF-IDF confidence needed to answer locally
+        min_samples: Samples needed before a TF-IDF model is trained
+        min_accuracy: Cross-validated accuracy (on answers above tfidf_threshold) a TF-IDF model needs
+                      to be used at all
+        use_tfidf: If False, only the lexicon is used
+    """
+
+    def __init__(self, samples_path: str = None, threshold: float = 0.5, tfidf_threshold: float = 0.7,
+                 min_samples: int = 200, min_accuracy: float = 0.9, use_tfidf: bool = True):
+        self.samples_path = samples_path
+        self.threshold = threshold
+        self.tfidf_threshold = tfidf_threshold
+        self.min_samples = min_samples
+        self.min_accuracy = min_accuracy
+        self.use_tfidf = use_tfidf
+        self._model = None
+        self._model_loaded = False
+        self._lock = threading.Lock()
+
+    def lexicon_scores(self, text: str) -> dict:
+        scores = dict.fromkeys(CATEGORIES, 0.0)
+        for term, count in Counter(tokenize(text)).items():
+            for category, weight in LEXICON.get(term, {}).items():
+                scores[category] += weight * (1.0 + math.log(count))
+        return scores
+
+    def predict_lexicon(self, text: str) -> tuple:
+        """
+        Returns:
+            (category, confidence): the category's share of all keyword evidence plus LEXICON_PRIOR
+        """
+        scores = self.lexicon_scores(text)
+        category = max(scores, key=scores.get)
+        return category, scores[category] / (sum(scores.values()) + LEXICON_PRIOR)
+
+    def predict_tfidf(self, text: str):
+        """
+        Returns:
+            (category, confidence), or None without a trained model
+        """
+        model = self._tfidf()
+        if model is None:
+            return None
+        probabilities = model.probabilities(text)
+        category = max(probabilities, key=probabilities.get)
+        return category, probabilities[category]
+
+    def classify(self, text: str) -> tuple:
+        """
+        Returns:
+            (category, confidence, source) with source "lexicon" or "tfidf", or
+            (None, best confidence, None) when no stage is confident enough
+        """
+        category, confidence = self.predict_lexicon(text)
+        if confidence >= self.threshold:
+            return category, confidence, "lexicon"
+        tfidf = self.predict_tfidf(text)
+        if tfidf is not None and tfidf[1] >= self.tfidf_threshold:
+            return tfidf[0], tfidf[1], "tfidf"
+        return None, max(confidence, tfidf[1] if tfidf else 0.0), None
+
+    def cross_validate(self, samples: list, folds: int = 5) -> tuple:
+        """
+        Returns (coverage, accuracy) of TF-IDF models trained on all but one fold, counting only
+        answers above tfidf_threshold.
+        """
+        answered = correct = 0
+        for fold in range(folds):
+            train = [sample for index, sample in enumerate(samples) if index % folds != fold]
+            if not train:
+                continue
+            model = TfidfCategoryModel(train)
+            for text, category in samples[fold::folds]:
+                probabilities = model.probabilities(text)
+                predicted = max(probabilities, key=probabilities.get)
+                if probabilities[predicted] >= self.tfidf_threshold:
+                    answered += 1
+                    correct += predicted == category
+        return answered / len(samples) if samples else 0.0, correct / answered if answered else 0.0
+
+    def train(self, samples: list, validate: bool = True):
+        """
+        Trains the TF-IDF model from (text, category) pairs, replacing any earlier one. The model is
+        only kept if it has enough samples and (with `validate`) passes min_accuracy in cross-validation.
+        """
+        samples = [(text, category) for text, category in samples if category in CATEGORIES]
+        model = None
+        if len(samples) >= self.min_samples:
+            coverage, accuracy = self.cross_validate(samples) if validate else (1.0, 1.0)
+            if coverage and accuracy >= self.min_accuracy:
+                model = TfidfCategoryModel(samples)
+            else:
+                print(f"Category TF-IDF model not used: {accuracy:.0%} accurate on {coverage:.0%} of "
+                      f"{len(samples)} samples (needs {self.min_accuracy:.0%})")
+        with self._lock:
+            self._model = model
+            self._model_loaded = True
+
+    def load_samples(self) -> list:
+        """
+        Returns the (text, category) pairs recorded in samples_path.
+        """
+        if not self.samples_path or not os.path.exists(self.samples_path):
+            return []
+        samples = []
+        with open(self.samples_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    sample = json.loads(line)
+                    samples.append((sample["text"], sample["category"]))
+                except (ValueError, KeyError, TypeError):
+                    continue
+        return samples
+
+    def _tfidf(self):
+        if not self.use_tfidf:
+            return None
+        if not self._model_loaded:
+            # Trained once per process, on first use, so importing the backend stays fast
+            self.train(self.load_samples())
+        return self._model
+
+    def record(self, text: str, category: str):
+        """
+        Appends a labelled sample (e.g. Gemini's answer for this text) to samples_path.
+        """
+        category = normalize_category(category)
+        if not self.samples_path or category is None:
+            return
+        line = json.dumps({"text": text, "category": category}, ensure_ascii=False)
+        try:
+            with self._lock:
+                os.makedirs(os.path.dirname(self.samples_path) or ".", exist_ok=True)
+                with open(self.samples_path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+        except OSError as e:
+            print(f"Failed to record category sample: {str(e)}")
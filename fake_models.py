@@ -0,0 +1,224 @@
+import json
+import struct
+import threading
+import time
+import zlib
+from collections import deque
+from contextlib import contextmanager, nullcontext
+
+# --- Local Fake Models for Offline Benchmarks ---
+# Drop-in stand-ins for vertexai's GenerativeModel and ImageGenerationModel that sleep for
+# a configurable latency instead of calling Google Cloud, optionally behind a simulated quota.
+
+FAKE_DESCRIPTION = (
+    "Hand-thrown blue pottery mug from Jaipur, glazed in cobalt and turquoise with "
+    "delicate floral motifs painted by hand."
+)
+
+FAKE_SOCIAL_POSTS = """## Instagram Post Idea 1: Morning Rituals
+
+**Caption:** Start your day with a piece of Jaipur's heritage.
+
+**Hashtags:** #BluePottery #Handmade #Jaipur
+
+---
+
+## Instagram Post Idea 2: Painted by Hand
+
+**Caption:** Every petal is brushed on by a master artisan.
+
+**Hashtags:** #Craftsmanship #IndianArt #Handmade
+
+---
+
+## Instagram Post Idea 3: A Gift with a Story
+
+**Caption:** Gift a mug that carries centuries of tradition.
+
+**Hashtags:** #GiftIdeas #BluePottery #SupportArtisans"""
+
+FAKE_CATEGORY = "Pottery"
+
+# FAKE_SOCIAL_POSTS as the structured posts of a single-shot JSON response
+FAKE_POSTS = [
+    {"title": "Morning Rituals", "caption": "Start your day with a piece of Jaipur's heritage.",
+     "hashtags": ["#BluePottery", "#Handmade", "#Jaipur"]},
+    {"title": "Painted by Hand", "caption": "Every petal is brushed on by a master artisan.",
+     "hashtags": ["#Craftsmanship", "#IndianArt", "#Handmade"]},
+    {"title": "A Gift with a Story", "caption": "Gift a mug that carries centuries of tradition.",
+     "hashtags": ["#GiftIdeas", "#BluePottery", "#SupportArtisans"]}
+]
+
+
+def _solid_png(width: int = 64, height: int = 64, rgb=(30, 90, 160)) -> bytes:
+    """
+    Builds a small, valid PNG of a single colour without needing Pillow.
+    """
+    def chunk(tag, data):
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xffffffff)
+
+    row = b"\x00" + bytes(rgb) * width
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header)
+            + chunk(b"IDAT", zlib.compress(row * height)) + chunk(b"IEND", b""))
+
+
+FAKE_IMAGE_BYTES = _solid_png()
+
+
+class FakeUsageMetadata:
+    def __init__(self, prompt_token_count: int, candidates_token_count: int):
+        self.prompt_token_count = prompt_token_count
+        self.candidates_token_count = candidates_token_count
+        self.total_token_count = prompt_token_count + candidates_token_count
+
+
+def _token_count(text: str) -> int:
+    # Roughly four characters per token, like Gemini on English text
+    return max(1, len(text) // 4)
+
+
+class FakeResponse:
+    def __init__(self, text: str, usage_metadata: FakeUsageMetadata = None):
+        self.text = text
+        self.usage_metadata = usage_metadata
+
+
+class FakeGeneratedImage:
+    def __init__(self, image_bytes: bytes):
+        self._image_bytes = image_bytes
+
+
+class FakeQuotaError(Exception):
+    """
+    Stand-in for google.api_core.exceptions.ResourceExhausted (HTTP 429).
+    """
+    code = 429
+
+
+class FakeQuota:
+    """
+    Simulates the project quota of one model on the fake "server" side: calls beyond `max_concurrent`
+    in progress, or beyond `rate` started per second, fail at once with FakeQuotaError.
+    """
+
+    def __init__(self, max_concurrent: int = None, rate: float = None):
+        self.max_concurrent = max_concurrent
+        self.rate = rate
+        self._in_flight = 0
+        self._started = deque()
+        self._lock = threading.Lock()
+        self.stats = {"accepted": 0, "rejected": 0}
+
+    @contextmanager
+    def call(self):
+        with self._lock:
+            now = time.monotonic()
+            while self._started and now - self._started[0] > 1.0:
+                self._started.popleft()
+            if ((self.max_concurrent and self._in_flight >= self.max_concurrent)
+                    or (self.rate and len(self._started) >= self.rate)):
+                self.stats["rejected"] += 1
+                raise FakeQuotaError("429 Quota exceeded for aiplatform.googleapis.com")
+            self._in_flight += 1
+            self._started.append(now)
+            self.stats["accepted"] += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+
+def _quota_call(quota):
+    return quota.call() if quota is not None else nullcontext()
+
+
+class FakeGenerativeModel:
+    """
+    Mimics GenerativeModel.generate_content, answering each pipeline prompt after `latency` seconds
+    plus `output_token_latency` per response token.
+
+    With a JSON generation_config it answers the single-shot prompt; fields listed in
+    `single_shot_invalid` are returned in a shape that fails validation. With a FakeQuota in
+    `quota`, calls over the quota fail with FakeQuotaError.
+    """
+    latency = 0.5
+    output_token_latency = 0.0
+    stream_chunks = 8
+    single_shot_invalid = ()
+    quota = None
+
+    def __init__(self, model_name: str = "fake-gemini"):
+        self.model_name = model_name
+
+    def generate_content(self, contents, stream=False, generation_config=None, **kwargs):
+        prompt = " ".join(part for part in contents if isinstance(part, str))
+        if hasattr(generation_config, "to_dict"):
+            generation_config = generation_config.to_dict()
+        if (generation_config or {}).get("response_mime_type") == "application/json":
+            text = self._kit_copy_json()
+        elif "single best category" in prompt:
+            text = FAKE_CATEGORY
+        elif "Instagram post ideas" in prompt:
+            text = FAKE_SOCIAL_POSTS
+        else:
+            text = FAKE_DESCRIPTION
+        prompt_tokens = _token_count(prompt) + 258 * sum(1 for part in contents if not isinstance(part, str))
+        if stream:
+            return self._stream(text, prompt_tokens)
+        with _quota_call(self.quota):
+            time.sleep(self.latency + self.output_token_latency * _token_count(text))
+        return FakeResponse(text, FakeUsageMetadata(prompt_tokens, _token_count(text)))
+
+    def _stream(self, text: str, prompt_tokens: int):
+        """
+        Yields the response in `stream_chunks` pieces spread over the same total latency.
+        Like Gemini, each chunk's usage metadata holds the running totals.
+        """
+        size = max(1, -(-len(text) // self.stream_chunks))
+        with _quota_call(self.quota):
+            for start in range(0, len(text), size):
+                time.sleep(self.latency / self.stream_chunks + self.output_token_latency * _token_count(text[start:start + size]))
+                usage = FakeUsageMetadata(prompt_tokens, _token_count(text[:start + size]))
+                yield FakeResponse(text[start:start + size], usage)
+
+    def _kit_copy_json(self) -> str:
+        kit = {"description": FAKE_DESCRIPTION, "social_posts": FAKE_POSTS, "category": FAKE_CATEGORY}
+        invalid = {"description": "", "social_posts": FAKE_POSTS[:1], "category": "Spaceship"}
+        for field in self.single_shot_invalid:
+            kit[field] = invalid[field]
+        return json.dumps(kit)
+
+
+class FakeImageGenerationModel:
+    """
+    Mimics ImageGenerationModel, returning a small PNG after `latency` seconds.
+    """
+    latency = 2.0
+    quota = None
+
+    def __init__(self, model_name: str = "fake-imagen"):
+        self.model_name = model_name
+
+    @classmethod
+    def from_pretrained(cls, model_name: str):
+        return cls(model_name)
+
+    def generate_images(self, prompt: str, number_of_images: int = 1, **kwargs):
+        with _quota_call(self.quota):
+            time.sleep(self.latency)
+        return [FakeGeneratedImage(FAKE_IMAGE_BYTES) for _ in range(number_of_images)]
+
+
+def fake_model_classes(text_latency: float = 0.5, image_latency: float = 2.0, output_token_latency: float = 0.0,
+                       text_quota: FakeQuota = None, image_quota: FakeQuota = None):
+    """
+    Returns (GenerativeModel, ImageGenerationModel) fake classes with the given latencies in seconds
+    and, optionally, a FakeQuota each that answers calls over it with 429s.
+    """
+    text_cls = type("FakeGenerativeModel", (FakeGenerativeModel,),
+                    {"latency": text_latency, "output_token_latency": output_token_latency, "quota": text_quota})
+    image_cls = type("FakeImageGenerationModel", (FakeImageGenerationModel,),
+                     {"latency": image_latency, "quota": image_quota})
+    return text_cls, image_cls
@@ -0,0 +1,138 @@
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+from cache import BlobStore
+from image_utils import FILE_EXTENSIONS, make_preview, sniff_mime_type
+
+# --- Generated Image Store ---
+# Images (generated ones and uploads) are written once to a content-addressed blob store on local
+# disk, shared by every session in the process. Sessions keep only an ImageRef; the page shows a
+# downscaled preview and the full-resolution original is read back only when it is downloaded or
+# sent to a model again. This keeps per-session memory and the websocket payload of each rerun small.
+
+
+class ImageRef:
+    """
+    What session state holds instead of an image's bytes.
+
+    Attributes:
+        digest / mime_type / size: The original in the store
+        preview_digest / preview_mime_type / preview_size: Its display copy (the original itself when
+                                                            it is already small, or None if not rendered)
+    """
+
+    __slots__ = ("digest", "mime_type", "size", "preview_digest", "preview_mime_type", "preview_size")
+
+    def __init__(self, digest: str, mime_type: str, size: int, preview_digest: str = None,
+                 preview_mime_type: str = None, preview_size: int = 0):
+        self.digest = digest
+        self.mime_type = mime_type
+        self.size = size
+        self.preview_digest = preview_digest
+        self.preview_mime_type = preview_mime_type
+        self.preview_size = preview_size
+
+    @property
+    def extension(self) -> str:
+        return FILE_EXTENSIONS.get(self.mime_type, "bin")
+
+    def __eq__(self, other):
+        return isinstance(other, ImageRef) and other.digest == self.digest
+
+    def __hash__(self):
+        return hash(self.digest)
+
+    def __repr__(self):
+        return f"ImageRef({self.digest[:12]}, {self.mime_type}, {self.size} bytes)"
+
+
+class ImageStore:
+    """
+    Originals and display previews of images in a BlobStore.
+
+    Args:
+        directory: Blob directory
+        preview_max_edge: Longest edge of previews (default image_utils.PREVIEW_MAX_EDGE)
+        max_bytes: Disk budget; the oldest blobs are deleted beyond it, so a very old reference can
+                   go stale (original() and preview() then return None)
+        max_refs: References remembered in memory, so storing the same image again does not
+                  re-render its preview
+    """
+
+    def __init__(self, directory: str, preview_max_edge: int = None, max_bytes: int = 1024 * 1024 * 1024,
+                 max_refs: int = 1024):
+        self.preview_max_edge = preview_max_edge
+        self.max_bytes = max_bytes
+        self.max_refs = max_refs
+        self._blobs = BlobStore(directory)
+        self._refs = OrderedDict()  # digest -> ImageRef
+        self._lock = threading.Lock()
+        self._stats = {"stored": 0, "reused": 0, "original_bytes": 0, "preview_bytes": 0}
+
+    def put(self, image_data: bytes, preview: bool = True) -> ImageRef:
+        """
+        Stores an image (once per distinct content) and, with `preview`, its display copy.
+        """
+        digest = self._blobs.put(image_data)
+        with self._lock:
+            ref = self._refs.get(digest)
+            if ref is not None and (ref.preview_digest or not preview):
+                self._refs.move_to_end(digest)
+                self._stats["reused"] += 1
+                return ref
+        ref = ImageRef(digest, sniff_mime_type(image_data, default="application/octet-stream"), len(image_data))
+        if preview:
+            preview_data, preview_mime_type = make_preview(image_data, self.preview_max_edge)
+            ref.preview_digest = digest if preview_data is image_data else self._blobs.put(preview_data)
+            ref.preview_mime_type = preview_mime_type
+            ref.preview_size = len(preview_data)
+        with self._lock:
+            self._refs[digest] = ref
+            while len(self._refs) > self.max_refs:
+                self._refs.popitem(last=False)
+            self._stats["stored"] += 1
+            self._stats["original_bytes"] += ref.size
+            self._stats["preview_bytes"] += ref.preview_size
+            prune = self._stats["stored"] % 50 == 0
+        if prune:
+            self._blobs.prune(self.max_bytes)
+        return ref
+
+    def original(self, ref: ImageRef):
+        return self._blobs.get(ref.digest)
+
+    def preview(self, ref: ImageRef):
+        """
+        Returns the display copy, or the original if no preview was rendered.
+        """
+        return self._blobs.get(ref.preview_digest or ref.digest)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats)
+
+
+# --- Module-Level Default Store ---
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_image_store() -> ImageStore:
+    """
+    Returns the process-wide ImageStore, creating it on first use. It lives in
+    KALACONNECT_IMAGE_STORE_DIR, else <KALACONNECT_CACHE_DIR>/images, else the system temp directory.
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            cache_dir = os.getenv("KALACONNECT_CACHE_DIR")
+            directory = os.getenv("KALACONNECT_IMAGE_STORE_DIR") or (
+                os.path.join(cache_dir, "images") if cache_dir else os.path.join(tempfile.gettempdir(), "kalaconnect_images")
+            )
+            _store = ImageStore(
+                directory,
+                max_bytes=int(os.getenv("KALACONNECT_IMAGE_STORE_MAX_BYTES", str(1024 * 1024 * 1024)))
+            )
+        return _store
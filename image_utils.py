@@ -0,0 +1,137 @@
+import io
+import os
+
+from PIL import Image, ImageOps, features
+
+# --- Upload Preprocessing ---
+# Phone photos are often 5-12 MB. Before an upload is sent to Gemini it is rotated upright,
+# downscaled to IMAGE_MAX_EDGE and re-encoded, which keeps plenty of detail for the analysis prompt.
+IMAGE_MAX_EDGE = int(os.getenv("KALACONNECT_IMAGE_MAX_EDGE", "1536"))
+IMAGE_QUALITY = int(os.getenv("KALACONNECT_IMAGE_QUALITY", "85"))
+
+# --- Display Previews ---
+# Generated images are shown as downscaled WebP previews (JPEG where Pillow lacks a WebP encoder);
+# the full-resolution original is only read for downloads.
+PREVIEW_MAX_EDGE = int(os.getenv("KALACONNECT_PREVIEW_MAX_EDGE", "768"))
+PREVIEW_QUALITY = int(os.getenv("KALACONNECT_PREVIEW_QUALITY", "80"))
+
+MIME_TYPES = {
+    "JPEG": "image/jpeg",
+    "PNG": "image/png",
+    "WEBP": "image/webp",
+    "GIF": "image/gif",
+    "BMP": "image/bmp",
+    "TIFF": "image/tiff"
+}
+
+FILE_EXTENSIONS = {
+    "image/jpeg": "jpg",
+    "image/png": "png",
+    "image/webp": "webp",
+    "image/gif": "gif",
+    "image/bmp": "bmp",
+    "image/tiff": "tiff"
+}
+
+# Formats Gemini accepts as-is when no resizing or rotation is needed
+_PASSTHROUGH_FORMATS = {"JPEG", "PNG", "WEBP"}
+
+
+def sniff_mime_type(image_data: bytes, default: str = "image/jpeg") -> str:
+    """
+    Returns the MIME type from the image's magic bytes, or `default` if it is not recognised.
+    """
+    if image_data.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if image_data.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if image_data[:4] == b"RIFF" and image_data[8:12] == b"WEBP":
+        return "image/webp"
+    if image_data[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    return default
+
+
+def preprocess_image(image_data: bytes, max_edge: int = None, quality: int = None):
+    """
+    Prepares an uploaded image for the vision call: fixes EXIF orientation, downscales to
+    `max_edge` and re-encodes as JPEG, unless the original is already smaller.
+
+    Args:
+        image_data: Raw upload bytes (JPEG, PNG, WebP, ...)
+        max_edge: Longest edge in pixels after downscaling (default IMAGE_MAX_EDGE)
+        quality: JPEG quality for the re-encoded image (default IMAGE_QUALITY)
+
+    Returns:
+        (bytes, mime_type) ready for Part.from_data; the original bytes if the image cannot be decoded
+    """
+    max_edge = max_edge or IMAGE_MAX_EDGE
+    quality = quality or IMAGE_QUALITY
+    try:
+        with Image.open(io.BytesIO(image_data)) as original:
+            source_format = original.format
+            # 0x0112 is the EXIF Orientation tag; 1 means already upright
+            rotated = original.getexif().get(0x0112, 1) != 1
+            image = ImageOps.exif_transpose(original)
+            needs_resize = max(image.size) > max_edge
+            if needs_resize:
+                image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+
+            # Flatten transparency onto white; JPEG has no alpha channel
+            if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+                image = image.convert("RGBA")
+                background = Image.new("RGB", image.size, (255, 255, 255))
+                background.paste(image, mask=image.getchannel("A"))
+                image = background
+            elif image.mode != "RGB":
+                image = image.convert("RGB")
+
+            buffer = io.BytesIO()
+            image.save(buffer, format="JPEG", quality=quality, optimize=True, progressive=True)
+            processed = buffer.getvalue()
+    except Exception as e:
+        print(f"Image preprocessing failed, sending the original upload: {str(e)}")
+        return image_data, sniff_mime_type(image_data)
+
+    if not needs_resize and not rotated and source_format in _PASSTHROUGH_FORMATS and len(image_data) <= len(processed):
+        return image_data, MIME_TYPES[source_format]
+    return processed, "image/jpeg"
+
+
+def make_preview(image_data: bytes, max_edge: int = None, quality: int = None):
+    """
+    Renders a display copy of an image: upright, downscaled to `max_edge` and encoded as WebP
+    (or JPEG, flattened onto white, without WebP support).
+
+    Returns:
+        (bytes, mime_type); the original bytes and type if the image cannot be decoded or the
+        preview would not be smaller
+    """
+    max_edge = max_edge or PREVIEW_MAX_EDGE
+    quality = quality or PREVIEW_QUALITY
+    try:
+        with Image.open(io.BytesIO(image_data)) as original:
+            image = ImageOps.exif_transpose(original)
+            if max(image.size) > max_edge:
+                image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+            has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+            buffer = io.BytesIO()
+            if features.check("webp"):
+                image = image.convert("RGBA" if has_alpha else "RGB")
+                image.save(buffer, format="WEBP", quality=quality, method=0)
+                mime_type = "image/webp"
+            else:
+                if has_alpha:
+                    image = image.convert("RGBA")
+                    background = Image.new("RGB", image.size, (255, 255, 255))
+                    background.paste(image, mask=image.getchannel("A"))
+                    image = background
+                image.convert("RGB").save(buffer, format="JPEG", quality=quality, optimize=True, progressive=True)
+                mime_type = "image/jpeg"
+            preview = buffer.getvalue()
+    except Exception as e:
+        print(f"Preview rendering failed, showing the original image: {str(e)}")
+        return image_data, sniff_mime_type(image_data)
+    if len(preview) >= len(image_data):
+        return image_data, sniff_mime_type(image_data)
+    return preview, mime_type
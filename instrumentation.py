@@ -0,0 +1,349 @@
+import contextvars
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+# --- Pipeline Instrumentation ---
+# Timing spans for the generation steps, model calls and translations, with token counts, image
+# bytes and cache hits as span attributes. The outermost span of a request is its trace; when it
+# ends, the trace goes to every registered exporter. The current span lives in a context variable,
+# so spans opened inside worker threads nest correctly as long as the thread runs in a copy of the
+# caller's context (the pipeline, service and translation thread pools all do).
+
+# Estimated list prices in USD used by estimate_cost; edit to match your billing account
+PRICES = {
+    "text_input_per_million_tokens": float(os.getenv("KALACONNECT_PRICE_TEXT_INPUT", "0.30")),
+    "text_output_per_million_tokens": float(os.getenv("KALACONNECT_PRICE_TEXT_OUTPUT", "2.50")),
+    "image_per_image": float(os.getenv("KALACONNECT_PRICE_IMAGE", "0.04")),
+    "translate_per_million_characters": float(os.getenv("KALACONNECT_PRICE_TRANSLATE", "20.00"))
+}
+
+_current_span = contextvars.ContextVar("kalaconnect_current_span", default=None)
+
+
+class Span:
+    """
+    One timed operation. Attributes hold the measurements (tokens, bytes, cache hits, ...).
+    """
+
+    def __init__(self, name: str, trace, parent=None, attributes: dict = None):
+        self.name = name
+        self.trace = trace
+        self.parent = parent
+        self.span_id = uuid.uuid4().hex[:16]
+        self.attributes = dict(attributes or {})
+        self.status = "ok"
+        self.error = None
+        self.thread = threading.current_thread().name
+        self.start_wall = time.time()
+        self.start = time.perf_counter()
+        self.end = None
+
+    @property
+    def duration(self) -> float:
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def add(self, key: str, amount=1):
+        """
+        Adds to a numeric attribute, e.g. tokens accumulated over streamed chunks.
+        """
+        with self.trace.lock:
+            self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    def record_error(self, error: Exception):
+        self.status = "error"
+        self.error = f"{type(error).__name__}: {str(error)}"
+
+    def to_dict(self) -> dict:
+        """
+        Returns the span in an OpenTelemetry-like shape, with offsets relative to the trace start.
+        """
+        start_unix_nano = int(self.start_wall * 1e9)
+        return {
+            "trace_id": self.trace.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent.span_id if self.parent else None,
+            "name": self.name,
+            "start_time_unix_nano": start_unix_nano,
+            "end_time_unix_nano": start_unix_nano + int(self.duration * 1e9),
+            "offset": round(self.start - self.trace.root.start, 4),
+            "duration": round(self.duration, 4),
+            "status": self.status,
+            "error": self.error,
+            "thread": self.thread,
+            "attributes": dict(self.attributes)
+        }
+
+
+class Trace:
+    """
+    All spans of one request, in start order. The first span is the root.
+    """
+
+    def __init__(self):
+        self.trace_id = uuid.uuid4().hex
+        self.spans = []
+        self.lock = threading.Lock()
+
+    @property
+    def root(self):
+        return self.spans[0]
+
+    def add_span(self, span: Span):
+        with self.lock:
+            self.spans.append(span)
+
+    def totals(self) -> dict:
+        """
+        Sums the measurements of all spans: tokens, images, translated characters, cache hits and cost.
+        """
+        totals = {
+            "duration": round(self.root.duration, 4),
+            "errors": sum(1 for span in self.spans if span.status == "error"),
+            "prompt_tokens": 0,
+            "response_tokens": 0,
+            "images": 0,
+            "image_bytes": 0,
+            "translate_characters": 0,
+            "cache_hits": 0,
+            "cache_misses": 0
+        }
+        with self.lock:
+            for span in self.spans:
+                for key in ("prompt_tokens", "response_tokens", "images", "image_bytes",
+                            "translate_characters", "cache_hits", "cache_misses"):
+                    totals[key] += span.attributes.get(key, 0)
+        totals["estimated_cost_usd"] = estimate_cost(totals)
+        return totals
+
+    def to_dict(self) -> dict:
+        with self.lock:
+            spans = [span.to_dict() for span in self.spans]
+        return {"trace_id": self.trace_id, "name": self.root.name, "totals": self.totals(), "spans": spans}
+
+
+def estimate_cost(totals: dict) -> float:
+    """
+    Estimates the cost in USD of a trace's totals with the PRICES table.
+    """
+    cost = (totals["prompt_tokens"] * PRICES["text_input_per_million_tokens"]
+            + totals["response_tokens"] * PRICES["text_output_per_million_tokens"]
+            + totals["translate_characters"] * PRICES["translate_per_million_characters"]) / 1_000_000
+    cost += totals["images"] * PRICES["image_per_image"]
+    return round(cost, 6)
+
+
+# --- Exporters ---
+class InMemoryExporter:
+    """
+    Keeps the most recent traces in memory (used by the app's debug panel).
+    """
+
+    def __init__(self, max_traces: int = 50):
+        self._traces = deque(maxlen=max_traces)
+        self._lock = threading.Lock()
+
+    def export(self, trace: Trace):
+        with self._lock:
+            self._traces.append(trace)
+
+    def traces(self) -> list:
+        with self._lock:
+            return list(self._traces)
+
+    def last(self):
+        with self._lock:
+            return self._traces[-1] if self._traces else None
+
+    def get(self, trace_id: str):
+        with self._lock:
+            for trace in reversed(self._traces):
+                if trace.trace_id == trace_id:
+                    return trace
+        return None
+
+
+class LogExporter:
+    """
+    Writes each finished trace as structured JSON lines: one per span plus a summary line.
+
+    Args:
+        stream: File-like object to write to (default stderr)
+    """
+
+    def __init__(self, stream=None):
+        self.stream = stream
+        self._lock = threading.Lock()
+
+    def export(self, trace: Trace):
+        data = trace.to_dict()
+        lines = [json.dumps({"event": "span", **span}, default=str) for span in data["spans"]]
+        lines.append(json.dumps({"event": "trace", "trace_id": data["trace_id"], "name": data["name"],
+                                 **data["totals"]}))
+        stream = self.stream or sys.stderr
+        with self._lock:
+            stream.write("\n".join(lines) + "\n")
+            stream.flush()
+
+
+class OpenTelemetryExporter:
+    """
+    Replays finished traces into the OpenTelemetry SDK, so any configured OTel exporter receives them.
+    Requires the optional opentelemetry-api package.
+    """
+
+    def __init__(self, tracer=None):
+        try:
+            from opentelemetry import trace as otel_trace
+        except ImportError:
+            raise ImportError("OpenTelemetryExporter requires the opentelemetry-api package") from None
+        self._otel_trace = otel_trace
+        self.tracer = tracer or otel_trace.get_tracer("kalaconnect")
+
+    def export(self, trace: Trace):
+        otel_spans = {}
+        for span in list(trace.spans):
+            data = span.to_dict()
+            parent = otel_spans.get(data["parent_span_id"])
+            context = self._otel_trace.set_span_in_context(parent) if parent is not None else None
+            otel_span = self.tracer.start_span(
+                span.name, context=context, start_time=data["start_time_unix_nano"],
+                attributes={key: value for key, value in span.attributes.items()
+                            if isinstance(value, (str, bool, int, float))}
+            )
+            if span.status == "error":
+                otel_span.set_status(self._otel_trace.Status(self._otel_trace.StatusCode.ERROR, span.error))
+            otel_span.end(end_time=data["end_time_unix_nano"])
+            otel_spans[span.span_id] = otel_span
+
+
+RECENT_TRACES = InMemoryExporter()
+_exporters = [RECENT_TRACES]
+_exporters_lock = threading.Lock()
+
+
+def add_exporter(exporter):
+    with _exporters_lock:
+        _exporters.append(exporter)
+
+
+def remove_exporter(exporter):
+    with _exporters_lock:
+        if exporter in _exporters:
+            _exporters.remove(exporter)
+
+
+def _export(trace: Trace):
+    with _exporters_lock:
+        exporters = list(_exporters)
+    for exporter in exporters:
+        try:
+            exporter.export(trace)
+        except Exception as e:
+            print(f"Trace export failed: {str(e)}")
+
+
+def _configure_from_env():
+    """
+    Adds the exporters named in KALACONNECT_TRACE_EXPORT ("log", "otel", comma-separated).
+    """
+    for name in filter(None, (part.strip() for part in os.getenv("KALACONNECT_TRACE_EXPORT", "").split(","))):
+        try:
+            if name == "log":
+                add_exporter(LogExporter())
+            elif name == "otel":
+                add_exporter(OpenTelemetryExporter())
+            else:
+                print(f"Unknown trace exporter: {name}")
+        except ImportError as e:
+            print(f"Trace exporter {name} unavailable: {str(e)}")
+
+
+_configure_from_env()
+
+
+# --- Span API ---
+@contextmanager
+def span(name: str, **attributes):
+    """
+    Times the enclosed block as a child of the current span, or as the root of a new trace.
+    Exceptions are recorded on the span and re-raised.
+    """
+    parent = _current_span.get()
+    trace = parent.trace if parent is not None else Trace()
+    current = Span(name, trace, parent, attributes)
+    trace.add_span(current)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.record_error(e)
+        raise
+    finally:
+        current.end = time.perf_counter()
+        _current_span.reset(token)
+        if parent is None:
+            _export(trace)
+
+
+def traced(name: str):
+    """
+    Decorator running the function inside span(name).
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def current_span():
+    return _current_span.get()
+
+
+def set_attribute(key: str, value):
+    """
+    Sets an attribute on the current span; does nothing outside a span.
+    """
+    current = _current_span.get()
+    if current is not None:
+        current.set_attribute(key, value)
+
+
+def add_to_span(key: str, amount=1):
+    """
+    Adds to a numeric attribute of the current span; does nothing outside a span.
+    """
+    current = _current_span.get()
+    if current is not None:
+        current.add(key, amount)
+
+
+def record_usage(response):
+    """
+    Adds the prompt/response token counts from a Gemini response's usage metadata to the current span.
+    """
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return
+    add_to_span("prompt_tokens", getattr(usage, "prompt_token_count", 0) or 0)
+    add_to_span("response_tokens", getattr(usage, "candidates_token_count", 0) or 0)
+
+
+def last_trace():
+    return RECENT_TRACES.last()
+
+
+def get_trace(trace_id: str):
+    return RECENT_TRACES.get(trace_id)
@@ -0,0 +1,190 @@
+import concurrent.futures
+import contextvars
+import time
+
+# --- Lazily Evaluated Step Graph ---
+# A pipeline is a set of named steps with dependencies. Only the steps needed for the
+# requested targets are planned and run, either one after another or on a thread pool.
+
+
+class StepTimeoutError(TimeoutError):
+    """
+    Raised for a step that did not finish within its timeout.
+    """
+
+
+class DependencyError(RuntimeError):
+    """
+    Raised for a step whose required step failed without a fallback.
+    """
+
+
+class Step:
+    """
+    A named unit of work.
+
+    Args:
+        name: Unique step name, also the key of its result
+        func: Called with a dict of the run inputs plus the results of `requires`
+        requires: Names of the steps whose results this step needs
+        fallback: Optional callable (inputs, exception) -> value used when the step fails;
+                  it may re-raise to mark the step as failed
+    """
+
+    def __init__(self, name: str, func, requires=(), fallback=None):
+        self.name = name
+        self.func = func
+        self.requires = tuple(requires)
+        self.fallback = fallback
+
+
+class PipelineResult:
+    """
+    Outcome of a pipeline run: the executed plan, step results and step errors.
+
+    A step that failed but recovered through its fallback has both a result and an error.
+    """
+
+    def __init__(self, plan: list):
+        self.plan = plan
+        self.results = {}
+        self.errors = {}
+        self.on_step_done = None
+
+    def ok(self, name: str) -> bool:
+        return name in self.results
+
+
+class Pipeline:
+    def __init__(self, steps: list):
+        self.steps = {step.name: step for step in steps}
+
+    def plan(self, targets) -> list:
+        """
+        Returns the names of the steps needed for `targets`, in dependency order.
+        """
+        ordered = []
+        visiting = set()
+
+        def visit(name):
+            if name in ordered:
+                return
+            if name not in self.steps:
+                raise KeyError(f"Unknown pipeline step: {name}")
+            if name in visiting:
+                raise ValueError(f"Dependency cycle at pipeline step: {name}")
+            visiting.add(name)
+            for dependency in self.steps[name].requires:
+                visit(dependency)
+            visiting.discard(name)
+            ordered.append(name)
+
+        for target in targets:
+            visit(target)
+        return ordered
+
+    def run(self, targets, inputs: dict, parallel=False, timeouts=None, max_workers=4, on_step_done=None) -> PipelineResult:
+        """
+        Runs the steps needed for `targets`.
+
+        Args:
+            targets: Names of the steps whose results are wanted
+            inputs: Values available to every step
+            parallel: If True, run independent steps concurrently on a thread pool
+            timeouts: Optional {step name: seconds}, only enforced when parallel
+            max_workers: Thread pool size for parallel runs
+            on_step_done: Optional callable(name, result) invoked on the calling thread as each step settles
+        """
+        result = PipelineResult(self.plan(targets))
+        result.on_step_done = on_step_done
+        if parallel:
+            self._run_parallel(result, inputs, timeouts or {}, max_workers)
+        else:
+            for name in result.plan:
+                step = self.steps[name]
+                step_inputs = self._step_inputs(step, inputs, result)
+                if step_inputs is None:
+                    continue
+                try:
+                    self._succeed(step, result, step.func(step_inputs))
+                except Exception as e:
+                    self._fail(step, step_inputs, result, e)
+        return result
+
+    def _step_inputs(self, step: Step, inputs: dict, result: PipelineResult):
+        """
+        Returns the inputs for `step`, or None after recording a DependencyError.
+        """
+        missing = [name for name in step.requires if not result.ok(name)]
+        if missing:
+            result.errors[step.name] = DependencyError(f"required step failed: {', '.join(missing)}")
+            self._notify(step, result)
+            return None
+        step_inputs = dict(inputs)
+        for name in step.requires:
+            step_inputs[name] = result.results[name]
+        return step_inputs
+
+    def _succeed(self, step: Step, result: PipelineResult, value):
+        result.results[step.name] = value
+        self._notify(step, result)
+
+    def _fail(self, step: Step, step_inputs: dict, result: PipelineResult, error: Exception):
+        result.errors[step.name] = error
+        if step.fallback is not None:
+            try:
+                result.results[step.name] = step.fallback(step_inputs, error)
+            except Exception:
+                pass
+        self._notify(step, result)
+
+    def _notify(self, step: Step, result: PipelineResult):
+        if result.on_step_done is not None:
+            result.on_step_done(step.name, result)
+
+    def _run_parallel(self, result: PipelineResult, inputs: dict, timeouts: dict, max_workers: int):
+        pending = list(result.plan)
+        running = {}  # future -> (step, step inputs, deadline)
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="kalaconnect-step")
+        try:
+            while pending or running:
+                # Start every step whose dependencies have settled
+                for name in list(pending):
+                    step = self.steps[name]
+                    if any(dep not in result.results and dep not in result.errors for dep in step.requires):
+                        continue
+                    pending.remove(name)
+                    step_inputs = self._step_inputs(step, inputs, result)
+                    if step_inputs is None:
+                        continue
+                    timeout = timeouts.get(name)
+                    deadline = time.monotonic() + timeout if timeout is not None else None
+                    # Each step runs in a copy of the caller's context (e.g. the current trace span)
+                    future = executor.submit(contextvars.copy_context().run, step.func, step_inputs)
+                    running[future] = (step, step_inputs, deadline)
+
+                if not running:
+                    continue
+
+                deadlines = [deadline for _, _, deadline in running.values() if deadline is not None]
+                wait_for = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+                done, _ = concurrent.futures.wait(running, timeout=wait_for, return_when=concurrent.futures.FIRST_COMPLETED)
+
+                for future in done:
+                    step, step_inputs, _ = running.pop(future)
+                    try:
+                        value = future.result()
+                    except Exception as e:
+                        self._fail(step, step_inputs, result, e)
+                    else:
+                        self._succeed(step, result, value)
+
+                now = time.monotonic()
+                for future, (step, step_inputs, deadline) in list(running.items()):
+                    if deadline is not None and now >= deadline:
+                        running.pop(future)
+                        future.cancel()
+                        self._fail(step, step_inputs, result, StepTimeoutError(f"step timed out after {timeouts[step.name]}s"))
+        finally:
+            # Don't block on steps that timed out; their results are discarded
+            executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,340 @@
+import base64
+import json
+import os
+import threading
+import time
+
+from cache import DiskCache, content_hash
+from fake_models import FakeGeneratedImage, FakeResponse, FakeUsageMetadata
+
+# --- Record/Replay Layer ---
+# Sits behind the GenerativeModel, ImageGenerationModel and TranslationServiceClient calls.
+# In record mode, every real response is saved to disk, keyed by a hash of the request.
+# In replay mode, the saved responses are served back with a synthetic latency, so the whole
+# pipeline runs deterministically and offline, e.g. for the benchmark suite.
+#
+# Layout: <directory>/{text,image,translate}/<request hash>.json
+
+MODES = ("record", "replay")
+
+
+class ReplayMissError(KeyError):
+    """
+    Raised in replay mode for a request that was never recorded.
+    """
+
+
+class ReplayLatency:
+    """
+    Synthetic latency for replayed responses.
+
+    Args:
+        fixed: Optional {kind: seconds} per call ("text", "image", "translate"); kinds not listed
+               sleep for their recorded latency
+        scale: Multiplier applied to recorded latencies (0 for no delay at all)
+    """
+
+    def __init__(self, fixed: dict = None, scale: float = 1.0):
+        self.fixed = dict(fixed or {})
+        self.scale = scale
+
+    def seconds(self, kind: str, recorded: float) -> float:
+        if kind in self.fixed:
+            return self.fixed[kind]
+        return (recorded or 0.0) * self.scale
+
+    @classmethod
+    def parse(cls, spec: str):
+        """
+        Parses "recorded", "recorded*0.5", "0" or "text=0.5,image=2,translate=0.1".
+        """
+        spec = (spec or "recorded").strip()
+        if spec.startswith("recorded"):
+            scale = float(spec.split("*", 1)[1]) if "*" in spec else 1.0
+            return cls(scale=scale)
+        if "=" not in spec:
+            return cls(scale=0.0, fixed={kind: float(spec) for kind in ("text", "image", "translate")})
+        fixed = {}
+        for item in spec.split(","):
+            kind, seconds = item.split("=", 1)
+            fixed[kind.strip()] = float(seconds)
+        return cls(fixed=fixed)
+
+
+class RecordingStore:
+    """
+    Recorded responses for one kind of call, plus hit/miss/record counters.
+    """
+
+    def __init__(self, directory: str, kind: str):
+        self.kind = kind
+        self._cache = DiskCache(os.path.join(directory, kind))
+        self._lock = threading.Lock()
+        self.stats = {"recorded": 0, "replayed": 0, "missed": 0}
+
+    def _count(self, name: str):
+        with self._lock:
+            self.stats[name] += 1
+
+    def save(self, key: str, entry: dict):
+        self._cache.set(key, entry)
+        self._count("recorded")
+
+    def load(self, key: str, description: str) -> dict:
+        entry = self._cache.get(key)
+        if entry is None:
+            self._count("missed")
+            raise ReplayMissError(f"No {self.kind} recording for {description} ({key[:12]})")
+        self._count("replayed")
+        return entry
+
+
+def _part_key(part) -> str:
+    """
+    Returns a stable string for one generate_content part (text, or an image Part).
+    """
+    if isinstance(part, str):
+        return part
+    if isinstance(part, bytes):
+        return content_hash(part)
+    to_dict = getattr(part, "to_dict", None)
+    if to_dict is not None:
+        return json.dumps(to_dict(), sort_keys=True, default=str)
+    return repr(part)
+
+
+def text_request_key(model_name: str, contents) -> str:
+    if isinstance(contents, (str, bytes)) or not hasattr(contents, "__iter__"):
+        contents = [contents]
+    return content_hash(model_name, *(_part_key(part) for part in contents))
+
+
+def image_request_key(model_name: str, prompt: str, number_of_images: int) -> str:
+    return content_hash(model_name, prompt, str(number_of_images))
+
+
+def translate_request_key(request: dict) -> str:
+    return content_hash(
+        request.get("source_language_code", ""), request.get("target_language_code", ""),
+        request.get("mime_type", ""), *request.get("contents", [])
+    )
+
+
+def _usage_dict(response) -> dict:
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return None
+    return {
+        "prompt_token_count": getattr(usage, "prompt_token_count", 0) or 0,
+        "candidates_token_count": getattr(usage, "candidates_token_count", 0) or 0
+    }
+
+
+def _usage(entry_usage: dict):
+    if not entry_usage:
+        return None
+    return FakeUsageMetadata(entry_usage["prompt_token_count"], entry_usage["candidates_token_count"])
+
+
+# --- Text (Gemini) ---
+class RecordingTextModel:
+    """
+    Passes generate_content through to a real model and records each response.
+    """
+
+    def __init__(self, model, model_name: str, store: RecordingStore):
+        self._model = model
+        self.model_name = model_name
+        self._store = store
+
+    def generate_content(self, contents, stream=False, **kwargs):
+        key = text_request_key(self.model_name, contents)
+        if stream:
+            return self._record_stream(key, contents, **kwargs)
+        started = time.monotonic()
+        response = self._model.generate_content(contents, **kwargs)
+        self._store.save(key, {"text": response.text, "chunks": None, "usage": _usage_dict(response),
+                               "latency": round(time.monotonic() - started, 4)})
+        return response
+
+    def _record_stream(self, key: str, contents, **kwargs):
+        started = time.monotonic()
+        chunks, chunk = [], None
+        for chunk in self._model.generate_content(contents, stream=True, **kwargs):
+            chunks.append(chunk.text)
+            yield chunk
+        self._store.save(key, {"text": "".join(chunks), "chunks": chunks,
+                               "usage": _usage_dict(chunk) if chunk is not None else None,
+                               "latency": round(time.monotonic() - started, 4)})
+
+
+class ReplayTextModel:
+    """
+    Serves recorded generate_content responses, streamed or not, after a synthetic latency.
+    """
+
+    stream_chunks = 8
+
+    def __init__(self, model_name: str, store: RecordingStore, latency: ReplayLatency):
+        self.model_name = model_name
+        self._store = store
+        self._latency = latency
+
+    def generate_content(self, contents, stream=False, **kwargs):
+        entry = self._store.load(text_request_key(self.model_name, contents), f"{self.model_name} prompt")
+        delay = self._latency.seconds("text", entry.get("latency"))
+        if stream:
+            return self._stream(entry, delay)
+        time.sleep(delay)
+        return FakeResponse(entry["text"], _usage(entry.get("usage")))
+
+    def _stream(self, entry: dict, delay: float):
+        chunks = entry.get("chunks")
+        if not chunks:
+            text = entry["text"]
+            size = max(1, -(-len(text) // self.stream_chunks))
+            chunks = [text[start:start + size] for start in range(0, len(text), size)] or [""]
+        usage = _usage(entry.get("usage"))
+        for chunk in chunks:
+            time.sleep(delay / len(chunks))
+            yield FakeResponse(chunk, usage)
+
+
+# --- Images (Imagen) ---
+class RecordingImageModel:
+    """
+    Passes generate_images through to a real model and records the image bytes.
+    """
+
+    def __init__(self, model, model_name: str, store: RecordingStore):
+        self._model = model
+        self.model_name = model_name
+        self._store = store
+
+    def generate_images(self, prompt: str, number_of_images: int = 1, **kwargs):
+        started = time.monotonic()
+        response = self._model.generate_images(prompt=prompt, number_of_images=number_of_images, **kwargs)
+        images = [image._image_bytes for image in response]
+        self._store.save(image_request_key(self.model_name, prompt, number_of_images), {
+            "images": [base64.b64encode(image).decode("ascii") for image in images],
+            "latency": round(time.monotonic() - started, 4)
+        })
+        return response
+
+
+class ReplayImageModel:
+    """
+    Serves recorded generate_images responses after a synthetic latency.
+    """
+
+    def __init__(self, model_name: str, store: RecordingStore, latency: ReplayLatency):
+        self.model_name = model_name
+        self._store = store
+        self._latency = latency
+
+    def generate_images(self, prompt: str, number_of_images: int = 1, **kwargs):
+        entry = self._store.load(image_request_key(self.model_name, prompt, number_of_images),
+                                 f"{self.model_name} prompt with {number_of_images} image(s)")
+        time.sleep(self._latency.seconds("image", entry.get("latency")))
+        return [FakeGeneratedImage(base64.b64decode(image)) for image in entry["images"]]
+
+
+# --- Translation ---
+class ReplayTranslation:
+    def __init__(self, translated_text: str):
+        self.translated_text = translated_text
+
+
+class ReplayTranslateResponse:
+    def __init__(self, translations: list):
+        self.translations = [ReplayTranslation(text) for text in translations]
+
+
+class RecordingTranslateClient:
+    """
+    Passes translate_text through to a real client and records the translations.
+    """
+
+    def __init__(self, client, store: RecordingStore):
+        self._client = client
+        self._store = store
+        self.transport = getattr(client, "transport", None)
+
+    def translate_text(self, request: dict, **kwargs):
+        started = time.monotonic()
+        response = self._client.translate_text(request=request, **kwargs)
+        self._store.save(translate_request_key(request), {
+            "translations": [translation.translated_text for translation in response.translations],
+            "latency": round(time.monotonic() - started, 4)
+        })
+        return response
+
+
+class ReplayTranslateClient:
+    """
+    Serves recorded translate_text responses after a synthetic latency.
+    """
+
+    transport = None
+
+    def __init__(self, store: RecordingStore, latency: ReplayLatency):
+        self._store = store
+        self._latency = latency
+
+    def translate_text(self, request: dict, **kwargs):
+        entry = self._store.load(translate_request_key(request),
+                                 f"{len(request.get('contents', []))} text(s) to {request.get('target_language_code')}")
+        time.sleep(self._latency.seconds("translate", entry.get("latency")))
+        return ReplayTranslateResponse(entry["translations"])
+
+
+# --- Installation ---
+def install(target, mode: str, directory: str, latency: ReplayLatency = None) -> dict:
+    """
+    Puts the recorder or replayer behind the model registry and Translate client of `target`
+    (the backend module).
+
+    Args:
+        target: The backend module
+        mode: "record" (wrap the currently configured models and client) or "replay"
+        directory: Where recordings are written to / read from
+        latency: Synthetic latency for replay (default: the recorded latency of each call)
+
+    Returns:
+        {"text": store, "image": store, "translate": store}, each with a `stats` dict
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown replay mode: {mode} (expected one of {', '.join(MODES)})")
+    stores = {kind: RecordingStore(directory, kind) for kind in ("text", "image", "translate")}
+
+    if mode == "record":
+        text_factory = target.get_model_factory("text")
+        image_factory = target.get_model_factory("image")
+        translate_factory = target.get_translate_client_factory()
+        target.configure_models(
+            text_factory=lambda name: RecordingTextModel(text_factory(name), name, stores["text"]),
+            image_factory=lambda name: RecordingImageModel(image_factory(name), name, stores["image"])
+        )
+        target.configure_translate_client(lambda: RecordingTranslateClient(translate_factory(), stores["translate"]))
+    else:
+        latency = latency or ReplayLatency()
+        target.configure_models(
+            text_factory=lambda name: ReplayTextModel(name, stores["text"], latency),
+            image_factory=lambda name: ReplayImageModel(name, stores["image"], latency)
+        )
+        target.configure_translate_client(lambda: ReplayTranslateClient(stores["translate"], latency))
+    print(f"Model calls in {mode} mode ({directory})")
+    return stores
+
+
+def install_from_env(target) -> dict:
+    """
+    Installs the mode from KALACONNECT_REPLAY_MODE, the directory from KALACONNECT_REPLAY_DIR
+    (default .kalaconnect_recordings) and the latency from KALACONNECT_REPLAY_LATENCY (see ReplayLatency.parse).
+    """
+    return install(
+        target,
+        os.getenv("KALACONNECT_REPLAY_MODE"),
+        os.getenv("KALACONNECT_REPLAY_DIR", ".kalaconnect_recordings"),
+        ReplayLatency.parse(os.getenv("KALACONNECT_REPLAY_LATENCY", "recorded"))
+    )
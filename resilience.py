@@ -0,0 +1,358 @@
+import contextvars
+import random
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import instrumentation
+
+# --- Resilience Layer ---
+# Retries, hedging, circuit breaking and rate limiting around the upstream model calls (Gemini,
+# Imagen, Translate). Each upstream has one Upstream object shared by every Streamlit session and
+# API request in the process, so the breaker and rate limiter see the combined traffic.
+#
+# Retries use exponential backoff with full jitter and are capped by a retry budget, so an outage
+# or quota exhaustion does not multiply the load on the upstream. Errors are classified by their
+# status code (google.api_core exceptions carry an HTTP code, grpc errors a StatusCode), which keeps
+# the Google SDKs out of this module's imports.
+
+RETRYABLE_HTTP_CODES = {408, 429, 500, 502, 503, 504}
+RETRYABLE_GRPC_CODES = {"UNAVAILABLE", "RESOURCE_EXHAUSTED", "DEADLINE_EXCEEDED", "ABORTED", "INTERNAL"}
+
+
+class CircuitOpenError(RuntimeError):
+    """
+    Raised instead of calling an upstream whose circuit breaker is open.
+    """
+
+
+def is_retryable(error: Exception) -> bool:
+    """
+    Returns True for transient errors: timeouts, dropped connections, quota (429) and 5xx responses.
+    """
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    code = getattr(error, "code", None)
+    if callable(code):
+        # grpc.RpcError exposes the status as a method
+        try:
+            code = code()
+        except Exception:
+            return False
+        return getattr(code, "name", None) in RETRYABLE_GRPC_CODES
+    if isinstance(code, int):
+        return code in RETRYABLE_HTTP_CODES
+    return False
+
+
+def is_quota_error(error: Exception) -> bool:
+    """
+    Returns True for quota / rate limit errors (HTTP 429, gRPC RESOURCE_EXHAUSTED).
+    """
+    code = getattr(error, "code", None)
+    if callable(code):
+        try:
+            code = code()
+        except Exception:
+            return False
+        return getattr(code, "name", None) == "RESOURCE_EXHAUSTED"
+    return code == 429
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter: attempt n waits a random time up to base_delay * 2**n.
+
+    Args:
+        max_attempts: Attempts per call, including the first
+        base_delay: Backoff before the first retry, in seconds (upper bound of the jitter)
+        max_delay: Cap on any single backoff
+    """
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.5, max_delay: float = 8.0):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def backoff(self, retry: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** retry)))
+
+
+class RetryBudget:
+    """
+    Each first attempt earns `ratio` of a retry, up to `reserve` saved retries, so once the reserve
+    is spent a failing upstream gets at most (1 + ratio) times its normal load.
+    """
+
+    def __init__(self, ratio: float = 0.2, reserve: float = 10.0):
+        self.ratio = ratio
+        self.reserve = reserve
+        self._balance = reserve
+        self._lock = threading.Lock()
+
+    def record_request(self):
+        with self._lock:
+            self._balance = min(self._balance + self.ratio, self.reserve)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            if self._balance < 1.0:
+                return False
+            self._balance -= 1.0
+            return True
+
+
+class CircuitBreaker:
+    """
+    Stops calls to an upstream after `failure_threshold` consecutive transient failures (quota errors
+    do not count: the upstream is up, and the scheduler lowers its limit instead). After
+    `reset_timeout` seconds one trial call is let through (half-open); its outcome closes or reopens it.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+        self.times_opened = 0
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self._trial_in_flight = False
+            if self.state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def retry_after(self) -> float:
+        with self._lock:
+            return max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def release_trial(self):
+        """
+        Ends a half-open trial call without a verdict (e.g. it hit a quota error), so the next call
+        becomes the trial.
+        """
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == "half_open" or self._failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.times_opened += 1
+                self.state = "open"
+                self._opened_at = time.monotonic()
+                self._trial_in_flight = False
+
+
+class TokenBucket:
+    """
+    Rate limiter allowing `rate` calls per second on average with bursts of up to `burst` calls.
+    A rate of None or 0 disables it.
+    """
+
+    def __init__(self, rate: float = None, burst: int = None):
+        self.rate = rate or 0.0
+        self.capacity = float(burst or max(1, int(self.rate or 1)))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self) -> bool:
+        """
+        Takes a token if one is available right now.
+        """
+        if not self.rate:
+            return True
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return True
+            return False
+
+    def acquire(self) -> float:
+        """
+        Blocks until a token is available and returns the time spent waiting.
+        """
+        if not self.rate:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            # Reserve the token now (the balance may go negative) so waiters are served in order
+            self._tokens -= 1.0
+            wait_time = max(0.0, -self._tokens / self.rate)
+        time.sleep(wait_time)
+        return wait_time
+
+
+# Shared by all upstreams for the backup request of a hedged call
+_hedge_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="kalaconnect-hedge")
+
+
+class Upstream:
+    """
+    Calls one upstream model through its rate limiter, circuit breaker and retry policy, optionally
+    hedging slow calls with a second identical request.
+
+    Args:
+        name: Upstream name used in messages and span attributes ("text", "image", "translate")
+        retry: RetryPolicy for transient errors
+        breaker: CircuitBreaker shared by all calls to this upstream
+        bucket: TokenBucket shared by all calls to this upstream
+        budget: RetryBudget capping retries relative to first attempts
+        hedge_after: Seconds after which a hedged call sends a backup request, "p95" to use the 95th
+                     percentile of recent latencies, or None to never hedge
+        queue: Optional scheduler.ModelQueue each attempt takes a slot from
+    """
+
+    def __init__(self, name: str, retry: RetryPolicy = None, breaker: CircuitBreaker = None,
+                 bucket: TokenBucket = None, budget: RetryBudget = None, hedge_after=None, queue=None):
+        self.name = name
+        self.queue = queue
+        self.retry = retry or RetryPolicy()
+        self.breaker = breaker or CircuitBreaker()
+        self.bucket = bucket or TokenBucket()
+        self.budget = budget or RetryBudget()
+        self.hedge_after = hedge_after
+        self._latencies = deque(maxlen=100)
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "attempts": 0, "retries": 0, "failures": 0, "rejected": 0,
+                       "hedges": 0, "hedge_wins": 0, "rate_limited_seconds": 0.0}
+
+    def _count(self, name: str, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def _hedge_delay(self):
+        if self.hedge_after != "p95":
+            return self.hedge_after
+        with self._lock:
+            latencies = sorted(self._latencies)
+        if len(latencies) < 10:
+            return None
+        return latencies[int(0.95 * (len(latencies) - 1))]
+
+    def call(self, func, *args, hedge: bool = False, can_retry=None, **kwargs):
+        """
+        Calls func(*args, **kwargs), retrying transient errors.
+
+        Args:
+            hedge: Allow a backup request when the call is slower than hedge_after (only for
+                   idempotent calls whose result is used once, e.g. non-streamed text generation)
+            can_retry: Optional callable(error) -> bool vetoing a retry, e.g. once a stream has
+                       already passed chunks on
+
+        Raises:
+            CircuitOpenError if the breaker is open, otherwise the last error
+        """
+        self._count("calls")
+        self.budget.record_request()
+        for attempt in range(self.retry.max_attempts):
+            if not self.breaker.allow():
+                self._count("rejected")
+                raise CircuitOpenError(
+                    f"{self.name} model is failing; calls paused for {self.breaker.retry_after():.0f}s"
+                )
+            waited = self.bucket.acquire()
+            if waited:
+                self._count("rate_limited_seconds", waited)
+                instrumentation.add_to_span("rate_limited_seconds", round(waited, 4))
+            self._count("attempts")
+            started = time.monotonic()
+            try:
+                delay = self._hedge_delay() if hedge else None
+                with self.queue.slot() if self.queue is not None else nullcontext():
+                    result = self._hedged(delay, func, args, kwargs) if delay is not None else func(*args, **kwargs)
+            except Exception as e:
+                retryable = is_retryable(e)
+                if is_quota_error(e):
+                    # The upstream is up but over quota: the scheduler's limit backs off instead
+                    self.breaker.release_trial()
+                elif retryable:
+                    self.breaker.record_failure()
+                else:
+                    # The upstream answered (e.g. a bad request), so it is healthy
+                    self.breaker.record_success()
+                last_attempt = attempt == self.retry.max_attempts - 1
+                if (not retryable or last_attempt or (can_retry is not None and not can_retry(e))
+                        or not self.budget.try_spend()):
+                    self._count("failures")
+                    raise
+                backoff = self.retry.backoff(attempt)
+                print(f"{self.name} call failed ({type(e).__name__}: {str(e)}), retrying in {backoff:.1f}s")
+                self._count("retries")
+                instrumentation.add_to_span("retries")
+                time.sleep(backoff)
+                continue
+            self.breaker.record_success()
+            with self._lock:
+                self._latencies.append(time.monotonic() - started)
+            return result
+
+    def _hedged(self, delay: float, func, args: tuple, kwargs: dict):
+        """
+        Runs the call and, if it has not finished after `delay` seconds, a backup copy; returns the
+        first result. The slower request cannot be cancelled and its result is discarded.
+        """
+        # Run in copies of the caller's context so spans opened by func join the caller's trace
+        primary = _hedge_executor.submit(contextvars.copy_context().run, func, *args, **kwargs)
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+        # A backup request only goes out when the scheduler has a free slot and the rate limiter a token
+        slot = self.queue.try_acquire() if self.queue is not None else "unscheduled"
+        if slot is None:
+            return primary.result()
+        if not self.bucket.try_acquire():
+            if self.queue is not None:
+                self.queue.release(slot)
+            return primary.result()
+        self._count("hedges")
+        instrumentation.set_attribute("hedged", True)
+        backup = _hedge_executor.submit(contextvars.copy_context().run, func, *args, **kwargs)
+        if self.queue is not None:
+            # The backup may outlive this call, so its slot is freed when it finishes
+            backup.add_done_callback(lambda future: self.queue.release(slot, future.exception()))
+        pending = {primary, backup}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is backup:
+                        self._count("hedge_wins")
+                        instrumentation.set_attribute("hedge_won", True)
+                    return future.result()
+                error = error or future.exception()
+        raise error
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["rate_limited_seconds"] = round(stats["rate_limited_seconds"], 3)
+        stats["breaker"] = self.breaker.state
+        stats["breaker_opened"] = self.breaker.times_opened
+        return stats
@@ -0,0 +1,225 @@
+import contextvars
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import instrumentation
+from resilience import is_quota_error
+
+# --- Model Call Scheduler ---
+# Process-wide admission control for the upstream models. Every attempt of a Gemini, Imagen or
+# Translate call (see resilience.Upstream) takes a slot from its model's ModelQueue first, so all
+# Streamlit sessions, API requests and batch jobs share one concurrency limit per model.
+#
+# Waiting calls are queued by priority: interactive calls (the default) always go first, and while
+# there is interactive traffic, batch calls may only use part of the limit, so a catalog run cannot
+# starve the people using the app (a batch run on its own still gets the whole limit).
+# The limit adapts to the quota AIMD-style: it is cut by 30% when the model answers with a quota error
+# (429 / RESOURCE_EXHAUSTED) and grows back by about one slot per `limit` successful calls.
+
+PRIORITIES = ("interactive", "batch")
+
+_priority = contextvars.ContextVar("kalaconnect_priority", default="interactive")
+
+
+@contextmanager
+def priority(name: str):
+    """
+    Runs the enclosed block's model calls (including those made from pipeline worker threads) at
+    priority `name` ("interactive" or "batch").
+    """
+    if name not in PRIORITIES:
+        raise ValueError(f"Unknown priority: {name} (expected one of {', '.join(PRIORITIES)})")
+    token = _priority.set(name)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> str:
+    return _priority.get()
+
+
+class ModelQueue:
+    """
+    Priority queue and adaptive concurrency limit for one upstream model.
+
+    Args:
+        name: Model kind ("text", "image", "translate")
+        max_limit: Most calls allowed in flight at once
+        min_limit: The limit never drops below this
+        batch_share: Fraction of the current limit batch calls may use (at least one slot) while there is
+                     interactive traffic; with none in the last `interactive_window` seconds, batch
+                     calls may use the whole limit
+        decrease_factor: Multiplier applied to the limit on a quota error. Only calls admitted after
+                         the last decrease can lower it again, so a burst of calls that were already
+                         in flight under the old limit counts once.
+    """
+
+    def __init__(self, name: str, max_limit: int, min_limit: int = 1, batch_share: float = 0.5,
+                 decrease_factor: float = 0.7, interactive_window: float = 30.0):
+        self.name = name
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.batch_share = batch_share
+        self.decrease_factor = decrease_factor
+        self.interactive_window = interactive_window
+        self._last_interactive = float("-inf")
+        self.limit = float(self.max_limit)
+        self._condition = threading.Condition()
+        self._waiting = {name: deque() for name in PRIORITIES}
+        self._in_flight = {name: 0 for name in PRIORITIES}
+        self._waits = {name: deque(maxlen=500) for name in PRIORITIES}
+        self._last_decrease = 0.0
+        self._stats = {"calls": 0, "quota_errors": 0, "limit_decreases": 0, "max_queued": 0}
+
+    def set_max_limit(self, max_limit: int):
+        """
+        Changes the maximum (and current) limit, e.g. to match a new quota.
+        """
+        with self._condition:
+            self.max_limit = max(1, max_limit)
+            self.min_limit = min(self.min_limit, self.max_limit)
+            self.limit = float(self.max_limit)
+            self._condition.notify_all()
+
+    def _batch_cap(self) -> int:
+        if time.monotonic() - self._last_interactive > self.interactive_window:
+            return int(self.limit)
+        return max(1, int(int(self.limit) * self.batch_share))
+
+    def _can_start(self, ticket, priority_name: str) -> bool:
+        if sum(self._in_flight.values()) >= int(self.limit):
+            return False
+        if self._waiting[priority_name][0] is not ticket:
+            return False
+        if priority_name == "batch":
+            return not self._waiting["interactive"] and self._in_flight["batch"] < self._batch_cap()
+        return True
+
+    def acquire(self, priority_name: str = None) -> float:
+        """
+        Blocks until a slot is free for this priority and returns the time spent queued.
+        """
+        priority_name = priority_name or current_priority()
+        ticket = object()
+        started = time.monotonic()
+        with self._condition:
+            if priority_name == "interactive":
+                self._last_interactive = started
+            self._waiting[priority_name].append(ticket)
+            queued = sum(len(waiting) for waiting in self._waiting.values())
+            self._stats["max_queued"] = max(self._stats["max_queued"], queued)
+            while not self._can_start(ticket, priority_name):
+                self._condition.wait()
+            self._waiting[priority_name].popleft()
+            self._in_flight[priority_name] += 1
+            self._stats["calls"] += 1
+            waited = time.monotonic() - started
+            self._waits[priority_name].append(waited)
+            # Another waiter may be able to start as well (e.g. after the limit grew)
+            self._condition.notify_all()
+        return waited
+
+    def try_acquire(self, priority_name: str = None):
+        """
+        Takes a slot only if one is free and nobody of this priority or above is waiting.
+
+        Returns:
+            The priority the slot was taken at (pass it to release(), e.g. from another thread), or None
+        """
+        priority_name = priority_name or current_priority()
+        with self._condition:
+            blocked = self._waiting["interactive"] or (priority_name == "batch" and (
+                self._waiting["batch"] or self._in_flight["batch"] >= self._batch_cap()))
+            if blocked or sum(self._in_flight.values()) >= int(self.limit):
+                return None
+            self._in_flight[priority_name] += 1
+            self._stats["calls"] += 1
+            return priority_name
+
+    def release(self, priority_name: str = None, error: Exception = None, admitted_at: float = None):
+        """
+        Frees a slot and adapts the limit to the call's outcome. The limit only grows while calls
+        are queued for it, so a quiet period does not undo the backoff.
+
+        Args:
+            admitted_at: time.monotonic() when the call got its slot (None: treat as admitted now)
+        """
+        priority_name = priority_name or current_priority()
+        with self._condition:
+            saturated = any(self._waiting.values())
+            self._in_flight[priority_name] -= 1
+            if error is not None and is_quota_error(error):
+                self._stats["quota_errors"] += 1
+                now = time.monotonic()
+                admitted_at = now if admitted_at is None else admitted_at
+                if self.decrease_factor < 1.0 and admitted_at >= self._last_decrease:
+                    self._last_decrease = now
+                    self.limit = max(float(self.min_limit), self.limit * self.decrease_factor)
+                    self._stats["limit_decreases"] += 1
+                    print(f"{self.name} quota exceeded, limit lowered to {int(self.limit)}")
+            elif error is None and saturated and self.limit < self.max_limit:
+                self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+            self._condition.notify_all()
+
+    @contextmanager
+    def slot(self, priority_name: str = None):
+        """
+        Holds a slot for the enclosed call; an exception raised inside is passed to release().
+        """
+        priority_name = priority_name or current_priority()
+        waited = self.acquire(priority_name)
+        admitted_at = time.monotonic()
+        if waited > 0.001:
+            instrumentation.add_to_span("queue_wait", round(waited, 4))
+        error = None
+        try:
+            yield
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self.release(priority_name, error, admitted_at)
+
+    def stats(self) -> dict:
+        """
+        Returns the current limit, calls in flight and queued per priority, and queue wait percentiles.
+        """
+        with self._condition:
+            stats = dict(self._stats)
+            stats["limit"] = int(self.limit)
+            stats["max_limit"] = self.max_limit
+            stats["in_flight"] = dict(self._in_flight)
+            stats["queued"] = {name: len(waiting) for name, waiting in self._waiting.items()}
+            waits = {name: sorted(values) for name, values in self._waits.items()}
+        stats["wait"] = {}
+        for name, values in waits.items():
+            if values:
+                stats["wait"][name] = {
+                    "p50": round(values[len(values) // 2], 4),
+                    "p95": round(values[round(0.95 * (len(values) - 1))], 4),
+                    "max": round(values[-1], 4)
+                }
+        return stats
+
+
+class Scheduler:
+    """
+    One ModelQueue per upstream model.
+
+    Args:
+        limits: {model kind: maximum calls in flight}
+        batch_share: Fraction of each limit batch calls may use
+    """
+
+    def __init__(self, limits: dict, batch_share: float = 0.5):
+        self.queues = {kind: ModelQueue(kind, limit, batch_share=batch_share) for kind, limit in limits.items()}
+
+    def queue(self, kind: str) -> ModelQueue:
+        return self.queues[kind]
+
+    def stats(self) -> dict:
+        return {kind: queue.stats() for kind, queue in self.queues.items()}
@@ -0,0 +1,157 @@
+"""
+Thin HTTP entry point for the async service layer (service.py), for mobile and other API clients.
+
+Usage:
+    pip install uvicorn
+    uvicorn server:app --workers 1 --port 8080
+
+Routes (JSON in, JSON out; images are base64-encoded):
+    POST /kit        {"product_input", "image" (base64), "image_style", "number_of_images" (1-4),
+                      "regenerate": "image" | "description" | "social_posts", "force_fresh": bool}
+                     -> {"results": {...}, "messages": [...], "elapsed": s}
+    POST /translate  {"content": {"description", "social_posts"}, "languages": ["Hindi", ...]}
+                     -> {"translations": {...}, "messages": [...], "elapsed": s}
+    GET  /healthz    -> {"status": "ok"}
+    GET  /stats      -> per-model queues and limits, request, retry, kit cache and coalescing counters
+
+This is a plain ASGI callable, so any ASGI server can host it without a web framework.
+"""
+import base64
+import json
+
+import backend
+import service
+
+MAX_BODY_BYTES = 20 * 1024 * 1024
+REGENERATE_FLAGS = {
+    "image": "regenerate_image_only",
+    "description": "regenerate_desc_only",
+    "social_posts": "regenerate_posts_only"
+}
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def _encode_results(results: dict) -> dict:
+    encoded = dict(results)
+    encoded["image"] = base64.b64encode(results["image"]).decode("ascii") if results.get("image") else None
+    encoded["image_variants"] = [base64.b64encode(image).decode("ascii") for image in results.get("image_variants") or []]
+    return encoded
+
+
+async def _read_json(receive) -> dict:
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if len(body) > MAX_BODY_BYTES:
+            raise HTTPError(413, "Request body too large")
+        if not message.get("more_body"):
+            break
+    try:
+        payload = json.loads(body or b"{}")
+    except ValueError:
+        raise HTTPError(400, "Request body must be JSON")
+    if not isinstance(payload, dict):
+        raise HTTPError(400, "Request body must be a JSON object")
+    return payload
+
+
+async def _handle_kit(payload: dict) -> dict:
+    image_data = None
+    if payload.get("image"):
+        try:
+            image_data = base64.b64decode(payload["image"], validate=True)
+        except ValueError:
+            raise HTTPError(400, "image must be base64-encoded")
+    if not payload.get("product_input") and not image_data:
+        raise HTTPError(400, "Provide product_input or image")
+
+    flags = {}
+    if payload.get("regenerate"):
+        if payload["regenerate"] not in REGENERATE_FLAGS:
+            raise HTTPError(400, f"regenerate must be one of {', '.join(REGENERATE_FLAGS)}")
+        flags[REGENERATE_FLAGS[payload["regenerate"]]] = True
+    number_of_images = payload.get("number_of_images")
+    if number_of_images is None:
+        number_of_images = 1
+    elif type(number_of_images) is not int or not 1 <= number_of_images <= backend.MAX_IMAGE_VARIANTS:
+        raise HTTPError(400, f"number_of_images must be an integer from 1 to {backend.MAX_IMAGE_VARIANTS}")
+
+    response = await service.generate_kit(
+        payload.get("product_input", ""),
+        image_data,
+        payload.get("image_style") or "Artistic Lifestyle",
+        number_of_images=number_of_images,
+        force_fresh=bool(payload.get("force_fresh")),
+        **flags
+    )
+    response["results"] = _encode_results(response["results"])
+    return response
+
+
+async def _handle_translate(payload: dict) -> dict:
+    content = payload.get("content")
+    languages = payload.get("languages")
+    if not isinstance(content, dict) or not isinstance(languages, list):
+        raise HTTPError(400, "Provide content (object) and languages (list)")
+    unknown = [language for language in languages if language not in backend.LANGUAGE_CODES]
+    if unknown:
+        raise HTTPError(400, f"Unsupported languages: {', '.join(unknown)}")
+    return await service.translate_kit(content, languages)
+
+
+ROUTES = {
+    ("POST", "/kit"): _handle_kit,
+    ("POST", "/translate"): _handle_translate
+}
+
+
+async def _send_json(send, status: int, payload: dict):
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def app(scope, receive, send):
+    """
+    ASGI application serving the routes listed in the module docstring.
+    """
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                service.get_service().close()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    if scope["type"] != "http":
+        return
+
+    method, path = scope["method"], scope["path"].rstrip("/") or "/"
+    try:
+        if method == "GET" and path == "/healthz":
+            await _send_json(send, 200, {"status": "ok"})
+        elif method == "GET" and path == "/stats":
+            await _send_json(send, 200, service.get_service().stats())
+        elif (method, path) in ROUTES:
+            payload = await _read_json(receive)
+            await _send_json(send, 200, await ROUTES[(method, path)](payload))
+        else:
+            raise HTTPError(404, f"No route for {method} {path}")
+    except HTTPError as e:
+        await _send_json(send, e.status, {"error": e.message})
+    except Exception as e:
+        error_msg = f"Request failed: {str(e)}"
+        print(error_msg)
+        await _send_json(send, 500, {"error": error_msg})
@@ -0,0 +1,149 @@
+import asyncio
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import backend
+import instrumentation
+
+# --- Async Service Layer ---
+# An asyncio API over the generation pipeline for serving many clients at once (see server.py).
+# Nothing here calls Streamlit: step errors and translation failures come back in the response's
+# "messages" list. The Vertex AI and Translate SDK calls are blocking, so they run on a shared
+# thread pool; how many calls each upstream (Gemini, Imagen, Translate) gets at once is decided by
+# the process-wide scheduler (backend.SCHEDULER), shared with the Streamlit sessions and batch jobs.
+
+
+def _messages(pairs: list) -> list:
+    """
+    Converts (level, text) pairs to the response format, dropping console-only "log" messages.
+    """
+    return [{"level": level, "text": text} for level, text in pairs if level != "log"]
+
+
+class KitService:
+    """
+    Generates and translates marketing kits from asyncio code.
+
+    Args:
+        max_workers: Threads available for the blocking SDK calls
+    """
+
+    def __init__(self, max_workers: int = 32):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="kalaconnect-service")
+        self._requests = {"generate": 0, "translate": 0, "failed": 0}
+
+    async def _run_blocking(self, func, *args):
+        # Run in a copy of the caller's context so spans opened on the worker join its trace
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(self._executor, context.run, func, *args)
+
+    async def generate_kit(self, product_input: str, image_data=None, image_style="Artistic Lifestyle",
+                           regenerate_image_only=False, regenerate_desc_only=False, regenerate_posts_only=False,
+                           number_of_images=1, step_timeouts=None, single_shot=None, force_fresh=False) -> dict:
+        """
+        Generates a marketing kit; independent steps run in parallel.
+
+        Args:
+            (same as backend.generate_all_content)
+
+        Returns:
+            {"results": dict like generate_all_content's, "messages": [{"level", "text"}], "elapsed": seconds}
+        """
+        self._requests["generate"] += 1
+        started = time.monotonic()
+
+        def generate():
+            return backend.run_generation(
+                product_input, image_data, image_style,
+                regenerate_image_only=regenerate_image_only,
+                regenerate_desc_only=regenerate_desc_only,
+                regenerate_posts_only=regenerate_posts_only,
+                parallel=True,
+                step_timeouts=step_timeouts,
+                number_of_images=number_of_images,
+                single_shot=single_shot,
+                force_fresh=force_fresh
+            )
+
+        try:
+            results, messages = await self._run_blocking(generate)
+        except Exception as e:
+            self._requests["failed"] += 1
+            results = backend._error_results("Error: Unable to generate content")
+            messages = [("error", f"Error in content generation: {str(e)}")]
+        return {"results": results, "messages": _messages(messages), "elapsed": round(time.monotonic() - started, 3)}
+
+    async def translate_kit(self, content: dict, target_languages: list) -> dict:
+        """
+        Translates a kit's text fields into several languages concurrently.
+
+        Args:
+            content: Dictionary with 'description' and 'social_posts' (other keys are copied as-is)
+            target_languages: Target language names (e.g., ["Hindi", "Tamil"])
+
+        Returns:
+            {"translations": {language: content}, "messages": [{"level", "text"}], "elapsed": seconds}
+            A language that fails keeps the original text and adds a warning message.
+        """
+        self._requests["translate"] += 1
+        started = time.monotonic()
+        languages = list(dict.fromkeys(target_languages))
+
+        with instrumentation.span("translate_kit", languages=",".join(languages)):
+            outcomes = await asyncio.gather(
+                *(self._run_blocking(backend.translate_fields, content, language) for language in languages),
+                return_exceptions=True
+            )
+        translations, messages = {}, []
+        for language, outcome in zip(languages, outcomes):
+            if isinstance(outcome, Exception):
+                print(f"Translation failed: {str(outcome)}")
+                messages.append(("warning", f"Translation to {language} failed. Showing original text."))
+                outcome = dict(content)
+            translations[language] = outcome
+        return {"translations": translations, "messages": _messages(messages),
+                "elapsed": round(time.monotonic() - started, 3)}
+
+    def stats(self) -> dict:
+        return {
+            "requests": dict(self._requests),
+            "models": backend.get_scheduler_stats(),
+            "kit_cache": backend.get_kit_cache_stats(),
+            "single_flight": backend.get_single_flight_stats(),
+            "upstreams": backend.get_upstream_stats()
+        }
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+
+# --- Module-Level Default Service ---
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_service() -> KitService:
+    """
+    Returns the process-wide KitService, creating it on first use.
+    """
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = KitService()
+        return _service
+
+
+async def generate_kit(product_input: str, image_data=None, image_style="Artistic Lifestyle", **kwargs) -> dict:
+    """
+    Generates a marketing kit with the default service (see KitService.generate_kit).
+    """
+    return await get_service().generate_kit(product_input, image_data, image_style, **kwargs)
+
+
+async def translate_kit(content: dict, target_languages: list) -> dict:
+    """
+    Translates a kit with the default service (see KitService.translate_kit).
+    """
+    return await get_service().translate_kit(content, target_languages)
@@ -0,0 +1,223 @@
+import threading
+import time
+from collections import OrderedDict
+
+from cache import content_hash
+from image_store import get_image_store
+
+# --- Session Artifact Store ---
+# Holds the generated kits of one Streamlit session so reruns (any button click) render from memory.
+# Kits are keyed by an input fingerprint; translations are kept per language and per field, so
+# regenerating one artifact only invalidates that artifact's translations.
+# With store_images, images and the uploaded photo are kept as ImageRefs into the process-wide
+# image store (image_store.py) instead of as bytes.
+# Translations are also written by the background prefetcher (translation_prefetch.py), so every
+# change to them holds _translations_lock.
+
+_translations_lock = threading.Lock()
+
+TEXT_FIELDS = ("description", "social_posts")
+
+
+def input_fingerprint(product_input: str, image_data, image_style: str) -> str:
+    """
+    Returns a stable key for the generation inputs (text, image bytes hash and style).
+    """
+    return content_hash(
+        (product_input or "").strip(),
+        content_hash(image_data) if image_data else "",
+        image_style or ""
+    )
+
+
+class KitRecord:
+    """
+    One generated marketing kit with its translations, image gallery and regeneration history.
+    """
+
+    def __init__(self, fingerprint: str, results: dict, inputs: dict = None, store_images: bool = False):
+        self.fingerprint = fingerprint
+        self.store_images = store_images
+        self.inputs = dict(inputs or {})  # generate_all_content arguments, reused for regenerations
+        if store_images and isinstance(self.inputs.get("image_data"), bytes):
+            self.inputs["image_data"] = get_image_store().put(self.inputs["image_data"], preview=False)
+        self.artifacts = {field: results.get(field) for field in TEXT_FIELDS}
+        self.image_prompt = results.get("image_prompt")
+        self.images = []
+        self.add_images(results.get("image_variants") or ([results["image"]] if results.get("image") else []))
+        self.selected_image = 0
+        self.translations = {}  # language -> {field: translated text}
+        self.prefetched = set()  # languages with prefetched translations not shown yet
+        self.history = []  # [{"field", "previous", "replaced_at"}], oldest first
+        self.created_at = time.time()
+
+    @property
+    def image(self):
+        if not self.images:
+            return None
+        return self.images[min(self.selected_image, len(self.images) - 1)]
+
+    def add_images(self, images: list):
+        """
+        Appends images (bytes, stored as references when store_images is set).
+        """
+        if self.store_images:
+            images = [get_image_store().put(image) if isinstance(image, bytes) else image for image in images]
+        self.images.extend(images)
+
+    def generation_inputs(self) -> dict:
+        """
+        Returns the generate_all_content arguments with the uploaded photo read back from the image store,
+        or None if the store has deleted the photo since (regenerating without it would lose the product).
+        """
+        inputs = dict(self.inputs)
+        if inputs.get("image_data") is not None and not isinstance(inputs["image_data"], bytes):
+            inputs["image_data"] = get_image_store().original(inputs["image_data"])
+            if inputs["image_data"] is None:
+                return None
+        return inputs
+
+    def results(self) -> dict:
+        """
+        Returns the kit in the same shape as generate_all_content's result dict (with ImageRefs in
+        place of image bytes when store_images is set).
+        """
+        return {
+            "description": self.artifacts["description"],
+            "social_posts": self.artifacts["social_posts"],
+            "image": self.image,
+            "image_variants": list(self.images),
+            "image_prompt": self.image_prompt
+        }
+
+    def missing_translations(self, language: str) -> list:
+        """
+        Returns the text fields that still need translating into `language`.
+        """
+        translated = self.translations.get(language, {})
+        return [field for field in TEXT_FIELDS if field not in translated]
+
+    def translated_results(self, language: str) -> dict:
+        """
+        Returns the kit with every translated field for `language` swapped in.
+        """
+        results = self.results()
+        if language != "English":
+            results.update(self.translations.get(language, {}))
+        return results
+
+    def previous_version(self, field: str):
+        for entry in reversed(self.history):
+            if entry["field"] == field:
+                return entry["previous"]
+        return None
+
+
+class SessionArtifactStore:
+    """
+    The kits generated in one session, most recent last, with the current kit tracked separately.
+
+    Args:
+        max_kits: Number of kits kept; the least recently used one is dropped beyond it
+        max_history: Regeneration history entries kept per kit
+        store_images: Keep images as references into the image store instead of as bytes
+    """
+
+    def __init__(self, max_kits: int = 5, max_history: int = 10, store_images: bool = False):
+        self.max_kits = max_kits
+        self.max_history = max_history
+        self.store_images = store_images
+        self._kits = OrderedDict()
+        self.current = None
+
+    def get(self, fingerprint: str):
+        record = self._kits.get(fingerprint)
+        if record is not None:
+            self._kits.move_to_end(fingerprint)
+        return record
+
+    def current_kit(self):
+        return self.get(self.current) if self.current else None
+
+    def put_kit(self, fingerprint: str, results: dict, inputs: dict = None) -> KitRecord:
+        """
+        Stores a freshly generated kit and makes it the current one.
+        """
+        record = KitRecord(fingerprint, results, inputs, self.store_images)
+        self._kits[fingerprint] = record
+        self._kits.move_to_end(fingerprint)
+        while len(self._kits) > self.max_kits:
+            self._kits.popitem(last=False)
+        self.current = fingerprint
+        return record
+
+    def replace_artifact(self, fingerprint: str, field: str, value):
+        """
+        Replaces one regenerated text field, remembering the previous version and dropping
+        only that field's translations.
+        """
+        record = self._kits[fingerprint]
+        record.history.append({"field": field, "previous": record.artifacts[field], "replaced_at": time.time()})
+        del record.history[:-self.max_history]
+        with _translations_lock:
+            record.artifacts[field] = value
+            for translated in record.translations.values():
+                translated.pop(field, None)
+
+    def restore_previous(self, fingerprint: str, field: str) -> bool:
+        """
+        Swaps a field back to its most recent previous version. Returns False if there is none.
+        """
+        record = self._kits[fingerprint]
+        for index in range(len(record.history) - 1, -1, -1):
+            if record.history[index]["field"] == field:
+                previous = record.history.pop(index)["previous"]
+                with _translations_lock:
+                    record.artifacts[field] = previous
+                    for translated in record.translations.values():
+                        translated.pop(field, None)
+                return True
+        return False
+
+    def add_images(self, fingerprint: str, images: list, select: bool = True):
+        record = self._kits[fingerprint]
+        if select and images:
+            record.selected_image = len(record.images)
+        record.add_images(images)
+
+    def select_image(self, fingerprint: str, index: int):
+        self._kits[fingerprint].selected_image = index
+
+    def set_translations(self, fingerprint: str, language: str, translated_fields: dict):
+        with _translations_lock:
+            self._kits[fingerprint].translations.setdefault(language, {}).update(translated_fields)
+
+    def store_prefetched_translations(self, fingerprint: str, language: str, translated_fields: dict,
+                                      source: dict) -> bool:
+        """
+        Stores translations made in the background for the fields whose English text is still
+        `source[field]` and that are not translated yet. Returns False if none were stored.
+        """
+        with _translations_lock:
+            record = self._kits.get(fingerprint)
+            if record is None:
+                return False
+            translated = record.translations.get(language, {})
+            fresh = {field: text for field, text in translated_fields.items()
+                     if record.artifacts.get(field) == source[field] and field not in translated}
+            if not fresh:
+                return False
+            record.translations.setdefault(language, {}).update(fresh)
+            record.prefetched.add(language)
+            return True
+
+    def claim_prefetched(self, fingerprint: str, language: str) -> bool:
+        """
+        Returns True the first time a language with prefetched translations is shown.
+        """
+        with _translations_lock:
+            record = self._kits.get(fingerprint)
+            if record is None or language not in record.prefetched:
+                return False
+            record.prefetched.discard(language)
+            return True
@@ -0,0 +1,95 @@
+import threading
+from concurrent.futures import Future
+
+import instrumentation
+
+# --- Single-Flight Coalescing ---
+# Identical model calls that overlap in time share one upstream call: the first caller with a key
+# (the leader) runs it, and callers arriving while it is in flight wait for its outcome. Everyone
+# gets the same result or the same exception. Workshops and demos where many sessions submit the
+# same sample product, or a double-clicked regenerate button, cost one call instead of several.
+#
+# Nothing is kept once the call settles; the next caller with that key starts a new call (keeping
+# results is the job of the caches in cache.py).
+
+
+class Group:
+    """
+    Coalesces concurrent calls that have the same key.
+
+    Args:
+        name: Used in stats ("analysis", "text", "image", "translate")
+        enabled: If False, every call runs on its own (for comparisons)
+    """
+
+    def __init__(self, name: str, enabled: bool = True):
+        self.name = name
+        self.enabled = enabled
+        self._calls = {}  # key -> Future settled by the leader
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "executions": 0, "coalesced": 0, "errors": 0}
+
+    def do(self, key: str, func, *args, timeout: float = None, **kwargs):
+        """
+        Runs func(*args, **kwargs), or waits for the call already in flight with the same key.
+
+        Args:
+            key: Fingerprint of the call: its kind, model and full input
+            timeout: Seconds a waiting caller gives the leader before giving up (None: no limit);
+                     giving up does not affect the leader or the other waiters
+
+        Returns:
+            (result, shared) where shared is True when the result came from another caller's call
+
+        Raises:
+            The call's exception, in every caller; concurrent.futures.CancelledError in waiting
+            callers if the leader was interrupted (e.g. KeyboardInterrupt); TimeoutError for a
+            waiting caller whose timeout expired
+        """
+        with self._lock:
+            self._stats["calls"] += 1
+            future = self._calls.get(key) if self.enabled else None
+            leader = future is None
+            if leader:
+                future = Future()
+                self._stats["executions"] += 1
+                if self.enabled:
+                    self._calls[key] = future
+            else:
+                self._stats["coalesced"] += 1
+
+        if not leader:
+            instrumentation.set_attribute("coalesced", True)
+            return future.result(timeout), True
+
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            self._settle(key, future)
+            with self._lock:
+                self._stats["errors"] += 1
+            future.set_exception(e)
+            raise
+        except BaseException:
+            self._settle(key, future)
+            future.cancel()
+            raise
+        self._settle(key, future)
+        future.set_result(result)
+        return result, False
+
+    def _settle(self, key: str, future: Future):
+        # Forget the call before publishing its outcome, so later callers start a new one
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+
+    def stats(self) -> dict:
+        """
+        Returns call counts and the coalescing ratio (share of calls served by another caller's call).
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_flight"] = len(self._calls)
+        stats["coalescing_ratio"] = round(stats["coalesced"] / stats["calls"], 3) if stats["calls"] else 0.0
+        return stats
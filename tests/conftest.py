@@ -0,0 +1,37 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+
+def pytest_addoption(parser):
+    parser.addoption("--recordings", default=None,
+                     help="Directory of recordings to replay (recorded from the fake models if omitted)")
+    parser.addoption("--replay-latency", default="0",
+                     help='Replay latency for the pipeline tests, e.g. "recorded" or "text=0.5,image=2,translate=0.1"')
+
+
+@pytest.fixture(scope="session")
+def replayed_backend(request, tmp_path_factory):
+    """
+    The backend module answering every model and Translate call from recordings (replay.py).
+    Without --recordings, the calls of the benchmark suite's scenarios are first recorded from the
+    fake models. Returns (backend, replay stores).
+    """
+    import backend
+    import bench_suite
+    import replay
+
+    output_root = str(tmp_path_factory.mktemp("kits"))
+    recordings = request.config.getoption("--recordings")
+    if recordings is None:
+        recordings = str(tmp_path_factory.mktemp("recordings"))
+        bench_suite._record_with_fakes(recordings, output_root)
+    stores = replay.install(backend, "replay", recordings,
+                            replay.ReplayLatency.parse(request.config.getoption("--replay-latency")))
+    yield backend, stores
+    bench_suite._clear_caches()
@@ -0,0 +1,199 @@
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import pytest
+
+import replay
+from fake_models import FAKE_IMAGE_BYTES
+
+PRODUCT_TEXT = "Blue pottery mug from Jaipur with floral designs"
+
+
+def _replayed(stores) -> dict:
+    return {kind: store.stats["replayed"] for kind, store in stores.items()}
+
+
+def test_generates_a_complete_kit(replayed_backend):
+    backend, _ = replayed_backend
+    backend.KIT_CACHE.clear()
+    results = backend.generate_all_content(PRODUCT_TEXT, FAKE_IMAGE_BYTES, parallel=True)
+    assert not results["description"].startswith("Error:")
+    assert "Instagram" in results["social_posts"]
+    assert results["image"] == results["image_variants"][0]
+    assert results["image_prompt"]
+
+
+def test_kit_cache_hit_calls_no_model(replayed_backend):
+    backend, stores = replayed_backend
+    backend.KIT_CACHE.clear()
+    first = backend.generate_all_content(PRODUCT_TEXT, FAKE_IMAGE_BYTES, parallel=True)
+    before = _replayed(stores)
+    # Case and spacing of the product text do not matter
+    second = backend.generate_all_content(f"  {PRODUCT_TEXT.upper()} ", FAKE_IMAGE_BYTES, parallel=True)
+    assert _replayed(stores) == before
+    assert second["description"] == first["description"]
+
+
+def test_regenerating_the_description_calls_only_the_text_model(replayed_backend):
+    backend, stores = replayed_backend
+    backend.generate_all_content(PRODUCT_TEXT, FAKE_IMAGE_BYTES, parallel=True)
+    before = _replayed(stores)
+    results = backend.generate_all_content(PRODUCT_TEXT, FAKE_IMAGE_BYTES, regenerate_desc_only=True, force_fresh=True)
+    after = _replayed(stores)
+    assert not results["description"].startswith("Error:")
+    assert after["text"] > before["text"]
+    assert (after["image"], after["translate"]) == (before["image"], before["translate"])
+
+
+def test_step_errors_are_passed_to_on_message(replayed_backend):
+    backend, _ = replayed_backend
+    messages = []
+    results = backend.generate_all_content("A brass lamp that was never recorded", regenerate_desc_only=True,
+                                           force_fresh=True, on_message=lambda *message: messages.append(message))
+    assert results["description"].startswith("Error:")
+    assert [level for level, _ in messages] == ["error"]
+    assert messages[0][1].startswith("Error generating product description")
+
+
+def test_translates_into_several_languages(replayed_backend):
+    backend, _ = replayed_backend
+    content = backend.generate_all_content(PRODUCT_TEXT, FAKE_IMAGE_BYTES, parallel=True)
+    translated = backend.translate_content_multi(content, ["Hindi", "Tamil"])
+    assert set(translated) == {"Hindi", "Tamil"}
+    assert translated["Hindi"]["description"].startswith("[hi]")
+    assert translated["Tamil"]["description"] != content["description"]
+
+
+def test_single_shot_config_builds_a_gemini_request():
+    vertexai = pytest.importorskip("vertexai")
+    from google.auth.credentials import AnonymousCredentials
+    from vertexai.generative_models import GenerativeModel
+
+    import backend
+
+    vertexai.init(project="kalaconnect-test", location="us-central1", credentials=AnonymousCredentials())
+    request = GenerativeModel("gemini-test")._prepare_request(
+        ["prompt"], generation_config=backend._kit_copy_generation_config()
+    )
+    config = request.generation_config
+    assert config.response_mime_type == "application/json"
+    assert list(config.response_schema.required) == ["description", "social_posts", "category"]
+    assert list(config.response_schema.properties["category"].enum) == backend.PRODUCT_CATEGORIES
+
+
+class _FailingTranslateClient:
+    transport = None
+
+    def translate_text(self, request: dict, **kwargs):
+        raise ValueError("bad request")
+
+
+@pytest.fixture
+def failing_translate(replayed_backend):
+    backend, _ = replayed_backend
+    factory = backend.get_translate_client_factory()
+    backend.configure_translate_client(_FailingTranslateClient)
+    yield backend
+    backend.configure_translate_client(factory)
+
+
+def test_failed_translations_are_reported_separately(failing_translate):
+    backend = failing_translate
+    content = {"description": "A teak elephant carved in Kerala", "social_posts": "## Post\n\nCarved by hand"}
+    translated, failed = backend.translate_fields_multi(content, ["Hindi", "Urdu"])
+    assert translated == {}
+    assert set(failed) == {"Hindi", "Urdu"}
+    # The UI-facing variant falls back to the original text
+    assert backend.translate_content_multi(content, ["Hindi"])["Hindi"] == content
+
+
+def test_translation_without_a_client_raises(replayed_backend):
+    backend, _ = replayed_backend
+    factory = backend.get_translate_client_factory()
+    backend.configure_translate_client(lambda: None)
+    try:
+        with pytest.raises(RuntimeError):
+            backend.translate_fields({"description": "A brass diya from Moradabad"}, "Hindi")
+    finally:
+        backend.configure_translate_client(factory)
+
+
+def test_generation_preempts_a_queued_speculative_analysis():
+    import backend
+
+    future = Future()  # submitted but not started, like an analysis queued behind other uploads
+    backend._speculations["queued-key"] = future
+    preempted = backend.get_speculation_stats()["preempted"]
+    try:
+        assert backend._join_speculative_analysis("queued-key") is None
+    finally:
+        backend._speculations.pop("queued-key", None)
+    assert future.cancelled()
+    assert backend.get_speculation_stats()["preempted"] == preempted + 1
+
+
+def test_generation_waits_for_a_running_speculative_analysis_only_so_long(monkeypatch):
+    import backend
+
+    monkeypatch.setattr(backend, "SPECULATION_JOIN_TIMEOUT", 0.05)
+    running, finished = Future(), Future()
+    running.set_running_or_notify_cancel()
+    finished.set_result("A blue glazed mug")
+    backend._speculations.update({"running-key": running, "finished-key": finished})
+    try:
+        assert backend._join_speculative_analysis("running-key") is None
+        assert backend._join_speculative_analysis("finished-key") == "A blue glazed mug"
+    finally:
+        backend._speculations.pop("running-key", None)
+        backend._speculations.pop("finished-key", None)
+
+
+
+def test_speculative_analysis_joins_the_callers_trace(replayed_backend):
+    backend, _ = replayed_backend
+    import instrumentation
+
+    with instrumentation.span("request.upload") as request_span:
+        future = backend.start_image_analysis(FAKE_IMAGE_BYTES)
+        assert future.result(timeout=5)
+    assert "speculative.analysis" in [span.name for span in request_span.trace.spans]
+
+
+class _Transport:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class _BlockingTranslateClient:
+    def __init__(self):
+        self.transport = _Transport()
+        self.started, self.release = threading.Event(), threading.Event()
+
+    def translate_text(self, request: dict, **kwargs):
+        assert not self.transport.closed, "request sent on a closed channel"
+        self.started.set()
+        self.release.wait(5)
+        assert not self.transport.closed, "channel closed under an in-flight request"
+        return replay.ReplayTranslateResponse([f"[{request['target_language_code']}] {text}"
+                                               for text in request["contents"]])
+
+
+def test_recycled_translate_client_is_closed_after_its_requests_finish(replayed_backend):
+    backend, _ = replayed_backend
+    factory = backend.get_translate_client_factory()
+    client = _BlockingTranslateClient()
+    backend.configure_translate_client(lambda: client)
+    try:
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            request = executor.submit(backend.translate_fields, {"description": "A jute bag from Bengal"}, "Tamil")
+            assert client.started.wait(5)
+            backend.reset_translate_client()
+            assert not client.transport.closed
+            client.release.set()
+            assert request.result(5)["description"] == "[ta] A jute bag from Bengal"
+        assert client.transport.closed
+    finally:
+        backend.configure_translate_client(factory)
@@ -0,0 +1,34 @@
+import json
+import os
+
+import batch
+from fake_models import FAKE_IMAGE_BYTES
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\0" * 16
+JPEG = b"\xff\xd8\xff\xe0" + b"\0" * 16
+
+
+def test_image_file_names_stay_inside_the_images_directory():
+    names = [batch.image_file_name(item_id, PNG) for item_id in ("../x", "a/b", "a_b", "..", "mug-1")]
+    assert all(os.sep not in name and "/" not in name and not name.startswith(".") for name in names)
+    assert len(set(names)) == len(names)
+    assert names[-1] == "mug-1.png"
+
+
+def test_image_file_names_use_the_image_format():
+    assert batch.image_file_name("mug", JPEG) == "mug.jpg"
+    assert batch.image_file_name("mug", PNG) == "mug.png"
+
+
+def test_batch_writes_images_under_sanitised_names(replayed_backend, tmp_path):
+    description = "Blue pottery mug from Jaipur with floral designs, design 1"
+    items = [{"id": "../escape", "description": description, "image_path": None, "style": None}]
+    summary = batch.run_batch(items, str(tmp_path), concurrency=1, retries=0)
+    assert summary["ok"] == 1
+    with open(tmp_path / "manifest.jsonl", encoding="utf-8") as f:
+        entry = json.loads(f.readline())
+    assert entry["id"] == "../escape"
+    assert os.path.dirname(entry["image_path"]) == "images"
+    with open(tmp_path / entry["image_path"], "rb") as f:
+        assert f.read() == FAKE_IMAGE_BYTES
+    assert not (tmp_path.parent / "escape.png").exists()
@@ -0,0 +1,24 @@
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+import bench_suite
+
+SCENARIOS = [name for name, _, _ in bench_suite.scenarios("")]
+
+
+@pytest.mark.parametrize("name", SCENARIOS)
+def test_scenario(benchmark, replayed_backend, tmp_path, name):
+    """
+    Times each scenario of benchmarks/bench_suite.py on replayed responses. Compare runs with
+    pytest --benchmark-autosave, then --benchmark-compare.
+    """
+    _, stores = replayed_backend
+    setup, make_run = next((setup, make_run) for scenario, setup, make_run in bench_suite.scenarios(str(tmp_path))
+                           if scenario == name)
+    if setup:
+        setup()
+    run = make_run()
+    misses = sum(store.stats["missed"] for store in stores.values())
+    benchmark.pedantic(run, setup=setup, rounds=3)
+    assert sum(store.stats["missed"] for store in stores.values()) == misses, "a call had no recording"
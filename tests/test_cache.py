@@ -0,0 +1,84 @@
+import os
+import time
+
+from cache import BlobSQLiteCache, content_hash
+
+
+def _cache(tmp_path, **kwargs) -> BlobSQLiteCache:
+    return BlobSQLiteCache(str(tmp_path / "kits.sqlite"), str(tmp_path / "blobs"), **kwargs)
+
+
+def _blob_files(cache: BlobSQLiteCache) -> set:
+    return set(os.listdir(cache.blobs.directory))
+
+
+def test_round_trips_bytes_and_lists_of_bytes(tmp_path):
+    cache = _cache(tmp_path)
+    value = {"description": "A mug", "image": b"image", "image_variants": [b"image", b"variant"]}
+    cache.set("kit", value)
+    assert cache.get("kit") == value
+    # "image" and the first variant are the same content, stored once
+    assert len(_blob_files(cache)) == 2
+
+
+def test_shared_blob_survives_eviction_of_one_referencing_entry(tmp_path):
+    cache = _cache(tmp_path, max_entries=2)
+    cache.set("first", {"image": b"shared", "extra": b"first only"})
+    time.sleep(0.01)
+    cache.set("second", {"image": b"shared"})
+    time.sleep(0.01)
+    cache.set("third", {"image": b"third"})
+
+    assert cache.get("first") is None and len(cache) == 2
+    assert cache.get("second") == {"image": b"shared"}
+    # Only the blob no remaining entry references is deleted
+    assert _blob_files(cache) == {content_hash(b"shared"), content_hash(b"third")}
+
+
+def test_last_reference_removes_the_blob(tmp_path):
+    cache = _cache(tmp_path)
+    cache.set("a", {"image": b"shared"})
+    cache.set("b", {"image": b"shared"})
+    cache.delete("a")
+    assert len(_blob_files(cache)) == 1
+    cache.delete("b")
+    assert _blob_files(cache) == set()
+
+
+def test_overwriting_an_entry_releases_its_old_blobs(tmp_path):
+    cache = _cache(tmp_path)
+    cache.set("kit", {"image": b"old"})
+    cache.set("kit", {"image": b"new"})
+    assert cache.get("kit") == {"image": b"new"}
+    assert len(_blob_files(cache)) == 1
+
+
+def test_storing_the_same_key_and_bytes_again_keeps_the_blobs(tmp_path):
+    cache = _cache(tmp_path)
+    value = {"description": "A mug", "image": b"img1", "image_variants": [b"img1"]}
+    cache.set("kit", value)
+    cache.set("kit", value)
+    assert cache.get("kit") == value
+    assert _blob_files(cache) == {content_hash(b"img1")}
+
+
+def test_size_budget_evicts_least_recently_used(tmp_path):
+    cache = _cache(tmp_path, max_bytes=2500)
+    cache.set("a", {"image": b"a" * 1000})
+    time.sleep(0.01)
+    cache.set("b", {"image": b"b" * 1000})
+    time.sleep(0.01)
+    cache.get("a")  # a is now more recently used than b
+    time.sleep(0.01)
+    cache.set("c", {"image": b"c" * 1000})
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+
+
+def test_entry_with_missing_blob_is_dropped(tmp_path):
+    cache = _cache(tmp_path)
+    cache.set("kit", {"image": b"image"})
+    for name in _blob_files(cache):
+        os.remove(os.path.join(cache.blobs.directory, name))
+    assert cache.get("kit") is None
+    assert len(cache) == 0
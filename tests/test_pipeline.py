@@ -0,0 +1,71 @@
+import contextvars
+import threading
+import time
+
+import pytest
+
+from pipeline import DependencyError, Pipeline, Step, StepTimeoutError
+
+request_id = contextvars.ContextVar("request_id", default=None)
+
+
+def _pipeline(release: threading.Event = None) -> Pipeline:
+    def slow(inputs):
+        (release or threading.Event()).wait(5)
+        return "late"
+
+    return Pipeline([
+        Step("analysis", lambda inputs: inputs["text"].upper()),
+        Step("description", lambda inputs: f"description of {inputs['analysis']}", requires=["analysis"]),
+        Step("image", slow, requires=["analysis"], fallback=lambda inputs, error: "placeholder"),
+        Step("posts", slow, requires=["analysis"]),
+        Step("hashtags", lambda inputs: "#" + inputs["posts"], requires=["posts"]),
+    ])
+
+
+def test_plans_only_the_needed_steps_in_dependency_order():
+    pipeline = _pipeline()
+    assert pipeline.plan(["description"]) == ["analysis", "description"]
+    with pytest.raises(KeyError):
+        pipeline.plan(["video"])
+
+
+@pytest.mark.parametrize("parallel", [False, True])
+def test_runs_steps_with_their_dependencies(parallel):
+    result = _pipeline().run(["description"], {"text": "mug"}, parallel=parallel)
+    assert result.results == {"analysis": "MUG", "description": "description of MUG"}
+    assert result.errors == {}
+
+
+def test_timed_out_steps_fail_without_waiting_for_them():
+    release = threading.Event()
+    started = time.monotonic()
+    result = _pipeline(release).run(["description", "image", "hashtags"], {"text": "mug"}, parallel=True,
+                                    timeouts={"image": 0.05, "posts": 0.05})
+    elapsed = time.monotonic() - started
+    release.set()
+
+    assert elapsed < 1.0
+    assert result.results["description"] == "description of MUG"
+    # A timed-out step with a fallback has both its fallback value and the error
+    assert result.results["image"] == "placeholder"
+    assert isinstance(result.errors["image"], StepTimeoutError)
+    assert isinstance(result.errors["posts"], StepTimeoutError)
+    assert "posts" not in result.results
+    # Steps depending on a failed step are not run
+    assert isinstance(result.errors["hashtags"], DependencyError)
+
+
+def test_parallel_steps_run_in_the_callers_context():
+    pipeline = Pipeline([Step("read", lambda inputs: request_id.get())])
+    token = request_id.set("req-1")
+    try:
+        assert pipeline.run(["read"], {}, parallel=True).results["read"] == "req-1"
+    finally:
+        request_id.reset(token)
+
+
+def test_on_step_done_reports_each_step():
+    settled = []
+    _pipeline().run(["description"], {"text": "mug"}, on_step_done=lambda name, result: settled.append(name))
+    assert settled == ["analysis", "description"]
@@ -0,0 +1,124 @@
+import time
+
+import pytest
+
+from fake_models import FakeQuotaError
+from resilience import CircuitBreaker, CircuitOpenError, RetryBudget, RetryPolicy, Upstream
+
+
+class FakeServerError(Exception):
+    code = 503
+
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == "closed" and breaker.allow()
+    breaker.record_success()
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == "closed", "a success resets the failure count"
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+    assert breaker.times_opened == 1
+    assert 0 < breaker.retry_after() <= 60
+
+
+def test_half_open_lets_one_trial_through():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+    breaker.record_failure()
+    time.sleep(0.02)
+    assert breaker.allow(), "the first call after reset_timeout is the trial"
+    assert breaker.state == "half_open"
+    assert not breaker.allow(), "only one trial at a time"
+
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow()
+
+
+def test_quota_error_on_the_trial_lets_the_next_call_try():
+    upstream = Upstream("test", retry=RetryPolicy(max_attempts=1),
+                        breaker=CircuitBreaker(failure_threshold=1, reset_timeout=0.01))
+    with pytest.raises(FakeServerError):
+        upstream.call(_raise, FakeServerError("down"))
+    time.sleep(0.02)
+    with pytest.raises(FakeQuotaError):
+        upstream.call(_raise, FakeQuotaError("429"))
+    assert upstream.breaker.state == "half_open"
+    assert upstream.call(lambda: "ok") == "ok"
+    assert upstream.breaker.state == "closed"
+
+
+def test_failed_trial_reopens():
+    breaker = CircuitBreaker(failure_threshold=5, reset_timeout=0.01)
+    for _ in range(5):
+        breaker.record_failure()
+    time.sleep(0.02)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+    assert breaker.times_opened == 2
+
+
+def _raise(error: Exception):
+    raise error
+
+
+def _upstream(max_attempts: int = 3, **kwargs) -> Upstream:
+    return Upstream("test", retry=RetryPolicy(max_attempts=max_attempts, base_delay=0.0), **kwargs)
+
+
+def test_upstream_retries_transient_errors():
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise FakeServerError("unavailable")
+        return "ok"
+
+    upstream = _upstream()
+    assert upstream.call(flaky) == "ok"
+    stats = upstream.stats()
+    assert (stats["attempts"], stats["retries"], stats["failures"]) == (3, 2, 0)
+
+
+def test_upstream_does_not_retry_permanent_errors():
+    upstream, attempts = _upstream(), []
+
+    def bad_request():
+        attempts.append(1)
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        upstream.call(bad_request)
+    assert len(attempts) == 1
+    assert upstream.breaker.state == "closed"
+
+
+def test_open_breaker_rejects_without_calling():
+    upstream = _upstream(max_attempts=1, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60))
+    for _ in range(2):
+        with pytest.raises(FakeServerError):
+            upstream.call(_raise, FakeServerError("down"))
+    with pytest.raises(CircuitOpenError):
+        upstream.call(lambda: "not called")
+    assert upstream.stats()["rejected"] == 1
+
+
+def test_quota_errors_do_not_trip_the_breaker():
+    upstream = _upstream(breaker=CircuitBreaker(failure_threshold=1, reset_timeout=60))
+    with pytest.raises(FakeQuotaError):
+        upstream.call(_raise, FakeQuotaError("429"))
+    assert upstream.breaker.state == "closed"
+
+
+def test_retry_budget_caps_retries():
+    budget = RetryBudget(ratio=0.0, reserve=1.0)
+    upstream = _upstream(budget=budget, breaker=CircuitBreaker(failure_threshold=100))
+    for _ in range(2):
+        with pytest.raises(FakeServerError):
+            upstream.call(_raise, FakeServerError("down"))
+    # One saved retry in total: 2 attempts for the first call, 1 for the second
+    assert upstream.stats()["attempts"] == 3
@@ -0,0 +1,115 @@
+import threading
+import time
+
+import pytest
+
+import scheduler
+from fake_models import FakeQuotaError
+from scheduler import ModelQueue
+
+
+def _wait_until(condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not met in time"
+        time.sleep(0.001)
+
+
+def _start(queue: ModelQueue, priority_name: str, order: list):
+    def acquire():
+        queue.acquire(priority_name)
+        order.append(priority_name)
+
+    thread = threading.Thread(target=acquire, daemon=True)
+    thread.start()
+    return thread
+
+
+def test_interactive_waiters_go_before_earlier_batch_waiters():
+    queue, order = ModelQueue("test", max_limit=1), []
+    queue.acquire("interactive")
+    batch = _start(queue, "batch", order)
+    _wait_until(lambda: queue.stats()["queued"]["batch"] == 1)
+    interactive = _start(queue, "interactive", order)
+    _wait_until(lambda: queue.stats()["queued"]["interactive"] == 1)
+
+    queue.release("interactive")
+    interactive.join(5)
+    assert order == ["interactive"]
+    queue.release("interactive")
+    batch.join(5)
+    assert order == ["interactive", "batch"]
+
+
+def test_batch_share_applies_only_while_there_is_interactive_traffic():
+    queue = ModelQueue("test", max_limit=4, batch_share=0.5)
+    # No interactive call yet: batch work may use the whole limit
+    for _ in range(4):
+        assert queue.try_acquire("batch") == "batch"
+    for _ in range(4):
+        queue.release("batch")
+
+    queue.acquire("interactive")
+    queue.release("interactive")
+    assert queue.try_acquire("batch") == "batch"
+    assert queue.try_acquire("batch") == "batch"
+    assert queue.try_acquire("batch") is None
+    assert queue.try_acquire("interactive") == "interactive"
+
+
+def test_quota_errors_back_off_once_per_burst_and_recover_under_load():
+    queue = ModelQueue("test", max_limit=10, decrease_factor=0.5)
+    admitted_at = time.monotonic()
+    for _ in range(3):
+        queue.acquire("interactive")
+    # Three calls admitted under the old limit fail together: the limit is halved once
+    for _ in range(3):
+        queue.release("interactive", FakeQuotaError("429"), admitted_at)
+    stats = queue.stats()
+    assert (stats["limit"], stats["quota_errors"], stats["limit_decreases"]) == (5, 3, 1)
+
+    # A call admitted after the decrease lowers it again
+    queue.acquire("interactive")
+    queue.release("interactive", FakeQuotaError("429"), time.monotonic())
+    assert queue.stats()["limit"] == 2
+
+    # Successes grow the limit back only while calls are queued for it
+    queue.acquire("interactive")
+    queue.release("interactive")
+    assert queue.stats()["limit"] == 2
+    order = []
+    for _ in range(2):
+        queue.acquire("interactive")
+    waiter = _start(queue, "interactive", order)
+    _wait_until(lambda: queue.stats()["queued"]["interactive"] == 1)
+    queue.release("interactive")
+    waiter.join(5)
+    assert queue.limit > 2
+    assert queue.limit <= queue.max_limit
+
+
+def test_limit_never_drops_below_min_limit():
+    queue = ModelQueue("test", max_limit=2, min_limit=1, decrease_factor=0.1)
+    for _ in range(3):
+        queue.acquire("interactive")
+        queue.release("interactive", FakeQuotaError("429"), time.monotonic())
+    assert queue.stats()["limit"] == 1
+
+
+def test_priority_context():
+    assert scheduler.current_priority() == "interactive"
+    with scheduler.priority("batch"):
+        assert scheduler.current_priority() == "batch"
+    assert scheduler.current_priority() == "interactive"
+    with pytest.raises(ValueError):
+        with scheduler.priority("urgent"):
+            pass
+
+
+def test_slot_passes_errors_to_release():
+    queue = ModelQueue("test", max_limit=4, decrease_factor=0.5)
+    with pytest.raises(FakeQuotaError):
+        with queue.slot("interactive"):
+            raise FakeQuotaError("429")
+    stats = queue.stats()
+    assert (stats["limit"], stats["in_flight"]["interactive"]) == (2, 0)
@@ -0,0 +1,35 @@
+import asyncio
+import json
+
+import pytest
+
+import server
+
+
+def _post(path: str, payload: dict):
+    """
+    Sends one POST request through the ASGI app. Returns (status, JSON body).
+    """
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": json.dumps(payload).encode("utf-8")}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(server.app({"type": "http", "method": "POST", "path": path}, receive, send))
+    return sent[0]["status"], json.loads(sent[1]["body"])
+
+
+@pytest.mark.parametrize("number_of_images", ["two", 0, 5, 1.5, True])
+def test_invalid_number_of_images_is_a_bad_request(number_of_images):
+    status, body = _post("/kit", {"product_input": "Blue pottery mug", "number_of_images": number_of_images})
+    assert status == 400
+    assert "number_of_images" in body["error"]
+
+
+def test_unknown_regenerate_flag_is_a_bad_request():
+    status, body = _post("/kit", {"product_input": "Blue pottery mug", "regenerate": "everything"})
+    assert status == 400
+    assert "regenerate" in body["error"]
@@ -0,0 +1,39 @@
+import pytest
+
+import image_store
+from session_store import SessionArtifactStore
+
+RESULTS = {"description": "A blue pottery mug", "social_posts": "## Instagram Post", "image": b"image",
+           "image_variants": [b"image", b"variant"], "image_prompt": "A blue pottery mug on a table"}
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(image_store, "_store", image_store.ImageStore(str(tmp_path)))
+    return image_store.get_image_store()
+
+
+def test_images_are_kept_as_references(store):
+    kit = SessionArtifactStore(store_images=True).put_kit(
+        "kit", RESULTS, {"product_input": "", "image_data": b"upload", "image_style": "Studio"}
+    )
+    assert [store.original(ref) for ref in kit.images] == [b"image", b"variant"]
+    assert kit.generation_inputs()["image_data"] == b"upload"
+
+
+def test_generation_inputs_report_a_deleted_upload(store):
+    kit = SessionArtifactStore(store_images=True).put_kit(
+        "kit", RESULTS, {"product_input": "", "image_data": b"upload", "image_style": "Studio"}
+    )
+    store._blobs.delete(kit.inputs["image_data"].digest)
+    assert kit.generation_inputs() is None
+
+
+def test_regenerating_drops_only_that_fields_translations():
+    sessions = SessionArtifactStore()
+    kit = sessions.put_kit("kit", RESULTS)
+    sessions.set_translations("kit", "Hindi", {"description": "hi: mug", "social_posts": "hi: posts"})
+    sessions.replace_artifact("kit", "description", "A new description")
+    assert kit.missing_translations("Hindi") == ["description"]
+    assert sessions.restore_previous("kit", "description")
+    assert kit.artifacts["description"] == "A blue pottery mug"
@@ -0,0 +1,112 @@
+import threading
+import time
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+
+import pytest
+
+from singleflight import Group
+
+
+def _slow(value, started: threading.Event, release: threading.Event, calls: list):
+    calls.append(value)
+    started.set()
+    release.wait(5)
+    return value
+
+
+def _run_concurrently(group: Group, func, callers: int, key: str = "key"):
+    """
+    Starts `callers` identical calls and returns their futures once all but the leader are waiting.
+    """
+    executor = ThreadPoolExecutor(max_workers=callers)
+    futures = [executor.submit(group.do, key, func)]
+    deadline = time.monotonic() + 5
+    while group.stats()["in_flight"] == 0 and time.monotonic() < deadline:
+        time.sleep(0.001)
+    futures += [executor.submit(group.do, key, func) for _ in range(callers - 1)]
+    while group.stats()["coalesced"] < callers - 1 and time.monotonic() < deadline:
+        time.sleep(0.001)
+    executor.shutdown(wait=False)
+    return futures
+
+
+def test_identical_calls_share_one_execution():
+    group, calls = Group("test"), []
+    started, release = threading.Event(), threading.Event()
+    futures = _run_concurrently(group, lambda: _slow("result", started, release, calls), callers=5)
+    release.set()
+    outcomes = [future.result(5) for future in futures]
+
+    assert calls == ["result"]
+    assert [result for result, _ in outcomes] == ["result"] * 5
+    assert sorted(shared for _, shared in outcomes) == [False] + [True] * 4
+    stats = group.stats()
+    assert (stats["calls"], stats["executions"], stats["coalesced"], stats["in_flight"]) == (5, 1, 4, 0)
+    assert stats["coalescing_ratio"] == 0.8
+
+
+def test_error_reaches_every_caller_and_is_not_kept():
+    group, release = Group("test"), threading.Event()
+
+    def fail():
+        release.wait(5)
+        raise ValueError("upstream failed")
+
+    futures = _run_concurrently(group, fail, callers=3)
+    release.set()
+    for future in futures:
+        with pytest.raises(ValueError, match="upstream failed"):
+            future.result(5)
+    assert group.stats()["errors"] == 1
+
+    # The failure is not cached: the next call runs again
+    assert group.do("key", lambda: "recovered") == ("recovered", False)
+
+
+def test_interrupted_leader_cancels_waiters():
+    group, release = Group("test"), threading.Event()
+
+    def interrupted():
+        release.wait(5)
+        raise KeyboardInterrupt
+
+    leader, *waiters = _run_concurrently(group, interrupted, callers=3)
+    release.set()
+    with pytest.raises(KeyboardInterrupt):
+        leader.result(5)
+    for waiter in waiters:
+        with pytest.raises(CancelledError):
+            waiter.result(5)
+    assert group.stats()["in_flight"] == 0
+
+
+def test_waiter_timeout_leaves_the_leader_running():
+    group, calls = Group("test"), []
+    started, release = threading.Event(), threading.Event()
+    executor = ThreadPoolExecutor(max_workers=1)
+    leader = executor.submit(group.do, "key", _slow, "result", started, release, calls)
+    assert started.wait(5)
+
+    with pytest.raises(TimeoutError):
+        group.do("key", lambda: "unused", timeout=0.01)
+    release.set()
+    assert leader.result(5) == ("result", False)
+    executor.shutdown()
+
+
+def test_different_keys_and_disabled_group_run_separately():
+    group = Group("test")
+    assert group.do("a", lambda: 1) == (1, False)
+    assert group.do("b", lambda: 2) == (2, False)
+
+    disabled, calls = Group("test", enabled=False), []
+    started, release = threading.Event(), threading.Event()
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        futures = [executor.submit(disabled.do, "key", _slow, index, started, release, calls) for index in range(3)]
+        deadline = time.monotonic() + 5
+        while len(calls) < 3 and time.monotonic() < deadline:
+            time.sleep(0.001)
+        release.set()
+        assert all(not shared for _, shared in (future.result(5) for future in futures))
+    assert sorted(calls) == [0, 1, 2]
+    assert disabled.stats()["coalesced"] == 0
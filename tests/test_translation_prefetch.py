@@ -0,0 +1,85 @@
+import threading
+import time
+from concurrent.futures import wait
+
+import instrumentation
+from session_store import SessionArtifactStore
+from translation_prefetch import TranslationPrefetcher
+
+RESULTS = {"description": "A blue pottery mug", "social_posts": "## Instagram Post"}
+LANGUAGES = ["English", "Hindi", "Tamil", "Urdu"]
+
+
+def _translate(content: dict, language: str) -> dict:
+    return {field: f"[{language}] {text}" for field, text in content.items()}
+
+
+def _wait_for(prefetcher: TranslationPrefetcher, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while prefetcher.stats()["in_flight"]:
+        assert time.monotonic() < deadline, "prefetch did not finish"
+        time.sleep(0.005)
+
+
+def test_prefetched_languages_are_stored_and_counted_as_hits():
+    sessions = SessionArtifactStore()
+    kit = sessions.put_kit("kit", RESULTS)
+    prefetcher = TranslationPrefetcher(_translate, LANGUAGES)
+    assert prefetcher.ensure(sessions, "kit") == 3
+    _wait_for(prefetcher)
+    assert prefetcher.ensure(sessions, "kit") == 0, "the same text is not prefetched twice"
+
+    assert kit.translated_results("Tamil")["description"] == "[Tamil] A blue pottery mug"
+    prefetcher.note_shown(sessions, "kit", ["Tamil"], pending=[])
+    prefetcher.note_shown(sessions, "kit", ["Tamil"], pending=[])
+    stats = prefetcher.stats()
+    assert (stats["translated"], stats["hits"], stats["misses"], stats["wasted"]) == (3, 1, 0, 2)
+    assert prefetcher.likely_languages()[0] == "Tamil"
+
+
+def test_prefetch_spans_join_the_callers_trace():
+    sessions = SessionArtifactStore()
+    sessions.put_kit("kit", RESULTS)
+    prefetcher = TranslationPrefetcher(_translate, LANGUAGES, top=1)
+    with instrumentation.span("request.render") as request_span:
+        prefetcher.ensure(sessions, "kit")
+    _wait_for(prefetcher)
+    assert "prefetch.translate" in [span.name for span in request_span.trace.spans]
+
+
+def test_failed_translations_are_not_stored():
+    def failing(content: dict, language: str) -> dict:
+        raise RuntimeError("Translate client is not available")
+
+    sessions = SessionArtifactStore()
+    kit = sessions.put_kit("kit", RESULTS)
+    prefetcher = TranslationPrefetcher(failing, LANGUAGES, top=1)
+    assert prefetcher.ensure(sessions, "kit") == 1
+    _wait_for(prefetcher)
+    assert kit.translations == {}
+    assert prefetcher.stats()["failed"] == 1
+
+
+def test_translations_of_replaced_text_are_dropped():
+    started, release = threading.Event(), threading.Event()
+
+    def slow(content: dict, language: str) -> dict:
+        started.set()
+        release.wait(5)
+        return _translate(content, language)
+
+    sessions = SessionArtifactStore()
+    kit = sessions.put_kit("kit", RESULTS)
+    prefetcher = TranslationPrefetcher(slow, LANGUAGES, max_workers=1)
+    prefetcher.ensure(sessions, "kit")
+    futures = list(prefetcher._jobs[sessions].futures)
+    assert started.wait(5), "the first translation did not start"
+    prefetcher.cancel(sessions)
+    sessions.replace_artifact("kit", "description", "A green pottery mug")
+    release.set()
+    wait(futures, timeout=5)
+
+    stats = prefetcher.stats()
+    # The running translation finishes but is dropped; the queued ones never start
+    assert (stats["translated"], stats["discarded"], stats["cancelled"]) == (1, 1, 2)
+    assert kit.translations == {}
@@ -0,0 +1,193 @@
+import contextvars
+import os
+import threading
+import weakref
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import instrumentation
+from cache import content_hash
+from scheduler import priority
+from session_store import TEXT_FIELDS
+
+# --- Background Translation Prefetch ---
+# Once a kit's English text is on screen, the languages the user has not asked for yet are translated
+# in the background, a few at a time and at batch priority, so switching the sidebar language renders
+# from the session store instead of waiting on Translate. Only the current kit of each session is
+# prefetched: a new kit, a regeneration or an undo cancels the work queued for the old text, and a
+# translation that finishes after its text was replaced is dropped.
+
+
+class _Job:
+    """
+    The prefetch of one kit's text in one session.
+    """
+
+    def __init__(self, fingerprint: str, version: str):
+        self.fingerprint = fingerprint
+        self.version = version
+        self.cancelled = threading.Event()
+        self.futures = []
+
+    def cancel(self) -> int:
+        """
+        Cancels the translations that have not started. Returns how many were cancelled.
+        """
+        self.cancelled.set()
+        return sum(1 for future in self.futures if future.cancel())
+
+
+class TranslationPrefetcher:
+    """
+    Translates the current kit of each session into likely languages in the background.
+
+    Args:
+        translate: Called as translate(content, language) and returns the translated content
+                   (backend.translate_fields)
+        languages: Languages to prefetch, in order of preference
+        top: Prefetch only this many of them, the ones shown most often in this process first
+             (None for all)
+        max_workers: Translations running at once across all sessions
+    """
+
+    def __init__(self, translate, languages: list, top: int = None, max_workers: int = 2):
+        self.translate = translate
+        self.languages = [language for language in languages if language != "English"]
+        self.top = top
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="kalaconnect-prefetch")
+        self._jobs = weakref.WeakKeyDictionary()  # SessionArtifactStore -> _Job
+        self._shown = Counter()  # language -> times its translation was shown
+        self._lock = threading.Lock()
+        self._stats = {"scheduled": 0, "translated": 0, "failed": 0, "cancelled": 0, "discarded": 0,
+                       "hits": 0, "misses": 0}
+
+    def likely_languages(self) -> list:
+        """
+        Returns the languages to prefetch, most shown first (ties keep the configured order).
+        """
+        with self._lock:
+            ranked = sorted(self.languages, key=lambda language: -self._shown[language])
+        return ranked[:self.top] if self.top else ranked
+
+    def ensure(self, store, fingerprint: str) -> int:
+        """
+        Starts prefetching the kit's current text unless that is already done or under way, cancelling
+        the session's prefetch of any other kit or older text. Call it on every render of a kit.
+
+        Returns:
+            Number of translations scheduled
+        """
+        record = store.get(fingerprint)
+        if record is None:
+            return 0
+        version = content_hash(*(record.artifacts[field] or "" for field in TEXT_FIELDS))
+        with self._lock:
+            job = self._jobs.get(store)
+            if job is not None and job.fingerprint == fingerprint and job.version == version:
+                return 0
+        self.cancel(store)
+
+        job = _Job(fingerprint, version)
+        for language in self.likely_languages():
+            source = {field: record.artifacts[field] for field in record.missing_translations(language)}
+            if source:
+                # In the caller's context, so the prefetch spans join the request's trace
+                job.futures.append(self._executor.submit(
+                    contextvars.copy_context().run, self._run, job, store, language, source
+                ))
+        with self._lock:
+            self._jobs[store] = job
+            self._stats["scheduled"] += len(job.futures)
+        return len(job.futures)
+
+    def cancel(self, store) -> int:
+        """
+        Cancels the session's prefetch; call it before regenerating text. Returns how many queued
+        translations were cancelled (a running one finishes and its result is dropped).
+        """
+        with self._lock:
+            job = self._jobs.pop(store, None)
+        if job is None:
+            return 0
+        cancelled = job.cancel()
+        with self._lock:
+            self._stats["cancelled"] += cancelled
+        return cancelled
+
+    def _run(self, job: _Job, store, language: str, source: dict):
+        if job.cancelled.is_set():
+            with self._lock:
+                self._stats["cancelled"] += 1
+            return
+        try:
+            with priority("batch"), instrumentation.span("prefetch.translate", language=language, fields=len(source)):
+                translated = self.translate(source, language)
+        except Exception as e:
+            print(f"Translation prefetch to {language} failed: {e}")
+            with self._lock:
+                self._stats["failed"] += 1
+            return
+        stored = not job.cancelled.is_set() and store.store_prefetched_translations(
+            job.fingerprint, language, {field: translated[field] for field in source}, source
+        )
+        with self._lock:
+            self._stats["translated"] += 1
+            if not stored:
+                self._stats["discarded"] += 1
+
+    def note_shown(self, store, fingerprint: str, languages: list, pending: list):
+        """
+        Counts the languages shown for a kit: a language that still had to be translated is a miss,
+        the first showing of a prefetched one is a hit. Both rank the language for likely_languages.
+        """
+        hits = [language for language in languages
+                if language not in pending and store.claim_prefetched(fingerprint, language)]
+        misses = [language for language in languages if language in pending]
+        with self._lock:
+            self._stats["hits"] += len(hits)
+            self._stats["misses"] += len(misses)
+            self._shown.update(hits + misses)
+
+    def stats(self) -> dict:
+        """
+        Returns the counters with the hit rate (shown languages that were ready) and the wasted
+        translations (finished but not shown yet, including those dropped as stale).
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_flight"] = sum(1 for job in self._jobs.values() for future in job.futures if not future.done())
+        shown = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / shown if shown else 0.0
+        stats["wasted"] = max(0, stats["translated"] - stats["hits"])
+        return stats
+
+
+# --- Module-Level Default Prefetcher ---
+_prefetcher = None
+_prefetcher_lock = threading.Lock()
+
+
+def get_translation_prefetcher():
+    """
+    Returns the process-wide TranslationPrefetcher, or None unless KALACONNECT_PREFETCH_TRANSLATIONS
+    is set ("all", or a comma-separated list of languages). KALACONNECT_PREFETCH_TOP limits it to the
+    most shown languages and KALACONNECT_PREFETCH_WORKERS sets its concurrency (default 2).
+    """
+    global _prefetcher
+    setting = os.getenv("KALACONNECT_PREFETCH_TRANSLATIONS", "").strip()
+    if not setting or setting == "0":
+        return None
+    with _prefetcher_lock:
+        if _prefetcher is None:
+            from backend import LANGUAGE_CODES, translate_fields
+
+            if setting.lower() in ("1", "all"):
+                languages = list(LANGUAGE_CODES)
+            else:
+                languages = [language.strip() for language in setting.split(",") if language.strip() in LANGUAGE_CODES]
+            top = os.getenv("KALACONNECT_PREFETCH_TOP")
+            _prefetcher = TranslationPrefetcher(
+                translate_fields, languages, top=int(top) if top else None,
+                max_workers=int(os.getenv("KALACONNECT_PREFETCH_WORKERS", "2"))
+            )
+        return _prefetcher